@@ -0,0 +1,20 @@
+import argparse
+import datetime as dt
+
+from simple_trading_bot.lib.backtester import import_recorded_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Imports a session recorded by the bot into a tick store.')
+    parser.add_argument('record_path', help='Session recorded by the bot (see record_path argument).')
+    parser.add_argument('store_path', help='Tick store directory to write.')
+    parser.add_argument('start_time', help='When the session was recorded, i.e. 2021-01-04T11:00:00+00:00.')
+    parser.add_argument('--tickers', nargs='+', default=['GGAL', 'YPFD', 'PAMP', 'DO'])
+    args = parser.parse_args()
+    start_time = dt.datetime.fromisoformat(args.start_time).timestamp()
+    if not import_recorded_session(args.record_path, args.store_path, args.tickers, start_time):
+        parser.error(f'No reference data found in {args.record_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import simple_trading_bot.lib.sharded_trading_bot as stb
+
+
+def main():
+    tickers = ['GGAL', 'YPFD', 'PAMP', 'DO']
+    spot_update_frequency = 1.
+    stb.ShardedTradingBot(tickers, spot_update_frequency).launch()
+
+
+if __name__ == '__main__':
+    main()
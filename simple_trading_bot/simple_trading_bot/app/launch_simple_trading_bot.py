@@ -1,10 +1,12 @@
+import simple_trading_bot.conf.checkpoint as ck
 import simple_trading_bot.lib.trading_bot as tb
 
 
 def main():
     tickers = ['GGAL', 'YPFD', 'PAMP', 'DO']
     spot_update_frequency = 1.
-    tb.IRArbitrageTradingBot(tickers, spot_update_frequency).launch()
+    #Restarts on the same trading date resume from the last checkpoint.
+    tb.IRArbitrageTradingBot(tickers, spot_update_frequency, checkpoint_path=ck.PATH).launch()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,28 @@
+import argparse
+import itertools
+
+from simple_trading_bot.lib.backtester import BacktestRunner
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backtests the IR arbitrage strategy over a tick store, for every combination of parameters.')
+    parser.add_argument('store_path', help='Tick store directory (see import_session.py).')
+    parser.add_argument('--transaction-costs', nargs='+', type=float, default=[0.01])
+    parser.add_argument('--fill-ratios', nargs='+', type=float, default=[1.])
+    parser.add_argument('--vectorized-rates', action='store_true')
+    parser.add_argument('--cross-tenor', action='store_true')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default=None, help='JSON lines file where the results of each run are written.')
+    args = parser.parse_args()
+    parameter_sets = [dict(transaction_cost=transaction_cost, fill_ratio=fill_ratio,
+                           vectorized_rates=args.vectorized_rates, cross_tenor=args.cross_tenor)
+                      for transaction_cost, fill_ratio in itertools.product(args.transaction_costs, args.fill_ratios)]
+    results = BacktestRunner(args.store_path, parameter_sets, processes=args.processes, output_path=args.output).run()
+    for result in results:
+        print(result)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+import argparse
+
+from simple_trading_bot.lib.decoding_benchmark import DecodingBenchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the cost per market data message of the generic '
+                                                 'pyRofex handling against the fast decoder.')
+    parser.add_argument('--underliers', type=int, default=4)
+    parser.add_argument('--maturities', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    print(DecodingBenchmark(args.underliers, args.maturities, args.messages, args.depth, args.repeats).run())
+
+
+if __name__ == '__main__':
+    main()
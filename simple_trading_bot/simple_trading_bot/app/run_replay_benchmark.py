@@ -0,0 +1,22 @@
+import argparse
+
+from simple_trading_bot.lib.replay import ReplayBenchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the trading bot hot path over a recorded session.')
+    parser.add_argument('record_path', help='Session recorded by the bot (see record_path argument).')
+    parser.add_argument('--tickers', nargs='+', default=['GGAL', 'YPFD', 'PAMP', 'DO'])
+    parser.add_argument('--vectorized-rates', action='store_true')
+    parser.add_argument('--trace-allocations', action='store_true')
+    args = parser.parse_args()
+    report = ReplayBenchmark(
+        args.record_path,
+        args.tickers,
+        vectorized_rates=args.vectorized_rates,
+        trace_allocations=args.trace_allocations).run()
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import argparse
+
+from simple_trading_bot.lib.sharding_benchmark import ShardingBenchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks how the sharded trading bot scales with instrument count.')
+    parser.add_argument('--underliers', nargs='+', type=int, default=[4, 16, 64])
+    parser.add_argument('--maturities', type=int, default=8)
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=5000)
+    args = parser.parse_args()
+    results = ShardingBenchmark(args.underliers, args.maturities, args.workers, args.updates).run()
+    print(ShardingBenchmark.HEADER)
+    for result in results:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import time
+
+from simple_trading_bot.lib.shared_book_store import SharedBookStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints the top of books shared by a running trading bot.')
+    parser.add_argument('--path', default=SharedBookStore.default_path(),
+                        help='Book store shared by the bot (see book_store_path argument).')
+    parser.add_argument('--period', type=float, default=1.)
+    args = parser.parse_args()
+    book_store = SharedBookStore(args.path)
+    last_sequence = None
+    try:
+        while True:
+            if book_store.sequence() != last_sequence:
+                last_sequence = book_store.sequence()
+                for ticker in book_store.tickers():
+                    bid, ask, _ = book_store.read(ticker)
+                    print(f'{ticker:<12} {bid or "-"} {ask or "-"}')
+                print(flush=True)
+            time.sleep(args.period)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        book_store.close()
+
+
+if __name__ == '__main__':
+    main()
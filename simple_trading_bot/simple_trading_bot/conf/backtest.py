@@ -0,0 +1,4 @@
+#Rows read from the tick store memory maps at a time, which bounds the memory used by a backtest.
+CHUNK_ROWS = 65536
+#Share of the top of book size an order is filled up to, the rest is assumed taken by faster participants.
+FILL_RATIO = 1.
@@ -0,0 +1,7 @@
+import os
+
+PATH = os.path.join(os.path.expanduser('~'), '.simple_trading_bot', 'checkpoint.bin')
+#Seconds between checkpoints of the bot state (see Checkpointer), only written when the state changed.
+PERIOD = 1.
+#Bytes reserved at first for each checkpoint slot, the file grows when a checkpoint does not fit.
+INITIAL_CAPACITY = 1 << 16
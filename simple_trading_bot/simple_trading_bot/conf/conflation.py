@@ -0,0 +1,6 @@
+#How book updates are conflated before reaching the strategy: 'latest', 'window' or 'count' (see ConflatingBookCache).
+POLICY = 'latest'
+#Seconds the oldest pending update waits for a batch to be released ('window' and 'count' policies).
+WINDOW = 0.005
+#Pending updates releasing a batch ('count' policy).
+COUNT = 10
@@ -0,0 +1,8 @@
+#Seconds between checks of the websocket connection and of the quotes staleness.
+CHECK_PERIOD = 1.
+#Reconnection attempts are spaced MIN_BACKOFF seconds at first, doubling up to MAX_BACKOFF.
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 30.
+#Books with no data received for this many seconds are subscribed again, and invalidated if still silent
+#after as many seconds. None to keep them forever.
+STALE_QUOTE_TIMEOUT = 120.
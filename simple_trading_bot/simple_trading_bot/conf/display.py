@@ -0,0 +1,4 @@
+#Min seconds between rates table redraws, so presentation never keeps up with a busy book.
+REFRESH_PERIOD = 0.5
+#Redraw the table in place with ANSI escape codes: None to do it only when the output is a terminal.
+ANSI_REDRAW = None
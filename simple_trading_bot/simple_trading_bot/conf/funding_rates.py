@@ -0,0 +1,3 @@
+#Annualized rate at which cash can be lent/borrowed to bridge different maturities,
+#under the same convention as the implicit rates.
+FUNDING_RATE = 0.35
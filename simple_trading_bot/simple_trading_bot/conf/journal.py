@@ -0,0 +1,9 @@
+import logging
+
+#Min level of the events written to the journal file, and echoed to the console (None to disable it).
+#Market data receipts and decisions are journaled at DEBUG, rates, spot prices, trades and order reports at INFO.
+JOURNAL_LEVEL = logging.DEBUG
+CONSOLE_LEVEL = logging.INFO
+#Events waiting to be written above this count are dropped, instead of growing memory without bounds.
+QUEUE_CAPACITY = 2 ** 16
+FLUSH_INTERVAL = 0.05
@@ -0,0 +1,3 @@
+#Metrics are only served locally, scrape them from the same host (i.e. through a Prometheus agent).
+METRICS_HOST = '127.0.0.1'
+METRICS_PATH = '/metrics'
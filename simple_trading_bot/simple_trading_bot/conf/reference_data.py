@@ -0,0 +1,5 @@
+import os
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.simple_trading_bot', 'reference_data.json')
+#Seconds a cached reference data snapshot is valid for, as long as the trading date does not change.
+CACHE_TTL = 12 * 60 * 60
@@ -0,0 +1,7 @@
+#Max cash amount of a single order (price times size times contract size).
+MAX_ORDER_NOTIONAL = 5000000.
+#Max contracts held of each future, counting the orders still in flight.
+MAX_POSITION = 500
+#Orders sent per second on average, allowing bursts of up to ORDER_BURST orders.
+MAX_ORDERS_PER_SECOND = 10.
+ORDER_BURST = 20
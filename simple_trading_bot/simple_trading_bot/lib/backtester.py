@@ -0,0 +1,416 @@
+import datetime as dt
+import heapq
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyRofex
+
+import simple_trading_bot.conf.backtest as bt
+import simple_trading_bot.conf.transaction_costs as tc
+from simple_trading_bot.lib.data_update_watchman import DataUpdateWatchman
+from simple_trading_bot.lib.event_journal import EventJournal
+from simple_trading_bot.lib.instrument_expert import InstrumentExpert
+from simple_trading_bot.lib.ir_expert import IRExpert
+from simple_trading_bot.lib.market_data_feeds import OrderbookLevel
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder, read_records
+from simple_trading_bot.lib.opportunity_engine import OpportunityEngine
+from simple_trading_bot.lib.order_gateway import OrderGateway
+from simple_trading_bot.lib.replay import ReplayRofexProxy, ReplayYfinanceMDFeed, StubPyRofexWrapper
+from simple_trading_bot.lib.trader import Trader
+from simple_trading_bot.lib.vectorized_ir_expert import VectorizedIRExpert
+
+SECONDS_PER_DAY = 86400
+EPOCH = dt.date(1970, 1, 1)
+
+
+class TickStore:
+    """
+    Class to read historical futures top of books and spot prices from a columnar on disk layout.
+    A store is a directory holding the reference data (meta.json) and a flat file of fixed size records
+    for each of the books and spot prices, sorted by time (epoch seconds), as written by TickStoreWriter.
+    Files are read through NumPy memory maps a chunk at a time, so months of ticks are streamed
+    without loading them into memory.
+    """
+    META_FILE = 'meta.json'
+    BOOKS_FILE = 'books.bin'
+    SPOTS_FILE = 'spots.bin'
+    BOOKS = 'books'
+    SPOTS = 'spots'
+    #Missing sides are stored as NaN prices.
+    BOOK_DTYPE = np.dtype([('time', 'f8'), ('future', 'i4'), ('bid', 'f8'), ('bid_size', 'f8'),
+                           ('ask', 'f8'), ('ask_size', 'f8')])
+    SPOT_DTYPE = np.dtype([('time', 'f8'), ('underlier', 'i4'), ('price', 'f8')])
+
+    def __init__(self, path):
+        self._path = path
+        with open(os.path.join(path, self.META_FILE), encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        self._tickers = meta['tickers']
+        self._futures = meta['futures']
+        self._reference_data = meta['reference_data']
+
+    def tickers(self):
+        """Underlier tickers, indexed by the underlier column of the spot prices"""
+        return self._tickers
+
+    def futures(self):
+        """Futures tickers, indexed by the future column of the books"""
+        return self._futures
+
+    def reference_data(self):
+        """Instruments in the rest api detailed instruments format"""
+        return self._reference_data
+
+    def books(self):
+        return self._memmap(self.BOOKS_FILE, self.BOOK_DTYPE)
+
+    def spots(self):
+        return self._memmap(self.SPOTS_FILE, self.SPOT_DTYPE)
+
+    def ticks(self, chunk_rows=bt.CHUNK_ROWS):
+        """
+        Yields the (time, kind, row) ticks of both books and spot prices merged in time order,
+        rows being plain tuples in the dtype fields order. Spot prices go first on equal times.
+        """
+        spots = ((row[0], self.SPOTS, row) for row in self._rows(self.spots(), chunk_rows))
+        books = ((row[0], self.BOOKS, row) for row in self._rows(self.books(), chunk_rows))
+        return heapq.merge(spots, books, key=lambda tick: tick[0])
+
+    @staticmethod
+    def _rows(records, chunk_rows):
+        #Rows are converted to tuples a chunk at a time, which is much faster than reading scalars from the map.
+        for start in range(0, len(records), chunk_rows):
+            yield from records[start:start + chunk_rows].tolist()
+
+    def _memmap(self, file_name, dtype):
+        path = os.path.join(self._path, file_name)
+        #Empty files can not be mapped.
+        if os.path.getsize(path) < dtype.itemsize:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+
+class TickStoreWriter:
+    """
+    Class to write a TickStore. Rows must be written in time order, and are appended to disk a chunk at a time.
+    """
+
+    def __init__(self, path, tickers, rest_instruments, chunk_rows=bt.CHUNK_ROWS):
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        futures = [instrument['instrumentId']['symbol'] for instrument in rest_instruments['instruments']]
+        with open(os.path.join(path, TickStore.META_FILE), 'w', encoding='utf-8') as meta_file:
+            json.dump({'tickers': list(tickers), 'futures': futures, 'reference_data': rest_instruments}, meta_file)
+        self._future_index = {ticker: index for index, ticker in enumerate(futures)}
+        self._underlier_index = {ticker: index for index, ticker in enumerate(tickers)}
+        self._chunk_rows = chunk_rows
+        self._books_file = open(os.path.join(path, TickStore.BOOKS_FILE), 'wb')
+        self._spots_file = open(os.path.join(path, TickStore.SPOTS_FILE), 'wb')
+        self._book_rows = []
+        self._spot_rows = []
+
+    def path(self):
+        return self._path
+
+    def write_book(self, tick_time, ticker, bid=None, ask=None):
+        """bid/ask: OrderbookLevel of each side, None if it did not change"""
+        self._book_rows.append((tick_time, self._future_index[ticker],
+                                bid.price if bid else np.nan, bid.size if bid else 0.,
+                                ask.price if ask else np.nan, ask.size if ask else 0.))
+        if len(self._book_rows) >= self._chunk_rows:
+            self._flush_rows(self._book_rows, self._books_file, TickStore.BOOK_DTYPE)
+
+    def write_spot(self, tick_time, ticker, price):
+        self._spot_rows.append((tick_time, self._underlier_index[ticker], price))
+        if len(self._spot_rows) >= self._chunk_rows:
+            self._flush_rows(self._spot_rows, self._spots_file, TickStore.SPOT_DTYPE)
+
+    def close(self):
+        self._flush_rows(self._book_rows, self._books_file, TickStore.BOOK_DTYPE)
+        self._flush_rows(self._spot_rows, self._spots_file, TickStore.SPOT_DTYPE)
+        self._books_file.close()
+        self._spots_file.close()
+
+    @staticmethod
+    def _flush_rows(rows, rows_file, dtype):
+        if rows:
+            np.array(rows, dtype=dtype).tofile(rows_file)
+            rows.clear()
+
+
+def import_recorded_session(record_path, store_path, tickers, start_time):
+    """
+    Writes the session recorded by a MarketDataRecorder into a TickStore, keeping the top of books only.
+    start_time: epoch seconds when the session was recorded, as records only keep the elapsed seconds
+    """
+    writer = None
+    inverse_ticker_map = {}
+    for elapsed, kind, payload in read_records(record_path):
+        if kind == MarketDataRecorder.REFERENCE_DATA:
+            writer = TickStoreWriter(store_path, tickers, payload)
+            inverse_ticker_map = InstrumentExpert(tickers, rest_instruments=payload).inverse_yfinance_tickers_map()
+        elif writer is None:
+            raise ValueError(f'No reference data found before market data in {record_path}')
+        elif kind == MarketDataRecorder.MARKET_DATA:
+            market_data = payload['marketData']
+            bids = market_data.get(pyRofex.MarketDataEntry.BIDS.value)
+            asks = market_data.get(pyRofex.MarketDataEntry.OFFERS.value)
+            writer.write_book(start_time + elapsed, payload['instrumentId']['symbol'],
+                              OrderbookLevel(bids[0]['price'], bids[0]['size']) if bids else None,
+                              OrderbookLevel(asks[0]['price'], asks[0]['size']) if asks else None)
+        elif kind == MarketDataRecorder.SPOT_PRICES:
+            #Older sessions were recorded keyed by yfinance ticker.
+            for ticker, price in payload.items():
+                writer.write_spot(start_time + elapsed, inverse_ticker_map.get(ticker, ticker), price)
+    if writer:
+        writer.close()
+    return writer is not None
+
+
+class SimulatedClock:
+    """
+    Class to hold the date of the tick being backtested, taken as the current date by the strategy.
+    """
+
+    def __init__(self):
+        self._day = None
+        self._today = None
+
+    def set_time(self, tick_time):
+        """tick_time: epoch seconds of the tick being processed"""
+        day = int(tick_time // SECONDS_PER_DAY)
+        if day != self._day:
+            self._day = day
+            self._today = EPOCH + dt.timedelta(days=day)
+
+    def today(self):
+        return self._today
+
+
+class SimulatedFillModel:
+    """
+    Class to fill the orders of a backtest, and keep the resulting positions.
+    Immediate or cancel limit orders are filled against the top of book they were sent at, if their limit crosses it,
+    up to fill_ratio of the size displayed (the rest is assumed taken by faster participants).
+    Every contract filled is hedged with the underlier at its spot price, as the Trader trade info assumes.
+    """
+
+    def __init__(self, instrument_expert, spot_feed, fill_ratio=bt.FILL_RATIO):
+        self._futures_by_ticker = instrument_expert.rofex_instruments_by_ticker()
+        self._spot_feed = spot_feed
+        self._fill_ratio = fill_ratio
+        self._cash = 0.
+        self._positions = defaultdict(int)
+        self._underlier_positions = defaultdict(float)
+        self._fill_prices = {}
+        self.orders = 0
+        self.sent_contracts = 0
+        self.filled_contracts = 0
+
+    def fill(self, ticker, side, size, limit_price, level):
+        """Returns the contracts filled of the order, and their price, given the top of book level it hits"""
+        self.orders += 1
+        self.sent_contracts += size
+        if level is None or (limit_price < level.price if side == pyRofex.Side.BUY else limit_price > level.price):
+            return 0, None
+        filled_size = min(size, int(level.size * self._fill_ratio))
+        if not filled_size:
+            return 0, None
+        future = self._futures_by_ticker[ticker]
+        signed_size = filled_size if side == pyRofex.Side.BUY else -filled_size
+        underlier_units = signed_size * future.contract_size()
+        self._positions[ticker] += signed_size
+        self._underlier_positions[future.underlier_ticker()] -= underlier_units
+        self._cash += underlier_units * (self._spot_feed.price(future.underlier_ticker()) - level.price)
+        self._fill_prices[ticker] = level.price
+        self.filled_contracts += filled_size
+        return filled_size, level.price
+
+    def positions(self):
+        return {ticker: position for ticker, position in self._positions.items() if position}
+
+    def pnl(self, book_snapshot):
+        """Cash plus the positions marked at the mid (or last fill) prices of the futures and the spot prices"""
+        marked_value = 0.
+        for ticker, position in self._positions.items():
+            bid, ask = book_snapshot.bids.get(ticker), book_snapshot.asks.get(ticker)
+            if bid and ask:
+                mark = (bid.price + ask.price) * 0.5
+            else:
+                mark = (bid or ask).price if bid or ask else self._fill_prices[ticker]
+            marked_value += position * self._futures_by_ticker[ticker].contract_size() * mark
+        spot_prices = self._spot_feed.last_prices()
+        marked_value += sum(units * spot_prices.get(ticker, 0.) for ticker, units in self._underlier_positions.items())
+        return self._cash + marked_value
+
+
+class SimulatedRofexProxy(ReplayRofexProxy):
+    """
+    ReplayRofexProxy filling the orders sent through a SimulatedFillModel, reported as the exchange would do.
+    """
+
+    def __init__(self, instrument_expert, fill_model, journal=None):
+        super().__init__(instrument_expert, StubPyRofexWrapper(), journal=journal)
+        self._fill_model = fill_model
+
+    def place_order(self, **order):
+        order_info = self._pyrofex_wrapper.send_order(**order)
+        ticker, side, size = order['ticker'], order['side'], order['size']
+        snapshot = self._book_snapshot
+        level = (snapshot.asks if side == pyRofex.Side.BUY else snapshot.bids).get(ticker)
+        filled_size, fill_price = self._fill_model.fill(ticker, side, size, order['price'], level)
+        self._order_report_handler({'type': 'or', 'orderReport': {
+            'clOrdId': order_info['order']['clientId'],
+            'instrumentId': {'symbol': ticker},
+            'side': side.value,
+            'orderQty': size,
+            'cumQty': filled_size,
+            'leavesQty': 0,
+            'lastPx': fill_price,
+            'status': 'FILLED' if filled_size == size else 'CANCELLED'}})
+        return order_info
+
+    def replay_book(self, ticker, bid, bid_size, ask, ask_size):
+        """Replays a top of book row as a market data message, NaN prices meaning the side did not change"""
+        self.replay({
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [] if bid != bid else [{'price': bid, 'size': bid_size}],
+                pyRofex.MarketDataEntry.OFFERS.value: [] if ask != ask else [{'price': ask, 'size': ask_size}]}})
+
+
+class BacktestResult:
+    """
+    Class to hold the results of a single backtest run
+    """
+
+    def __init__(self, parameters, ticks, elapsed, opportunities, orders, sent_contracts, filled_contracts, pnl,
+                 positions):
+        self.parameters = parameters
+        self.ticks = ticks
+        self.elapsed = elapsed
+        self.opportunities = opportunities
+        self.orders = orders
+        self.sent_contracts = sent_contracts
+        self.filled_contracts = filled_contracts
+        self.pnl = pnl
+        self.positions = positions
+
+    def __str__(self):
+        return '\n'.join([
+            f'Parameters:              {self.parameters}',
+            f'Ticks:                   {self.ticks}',
+            f'Elapsed:                 {self.elapsed:.3f}s',
+            f'Opportunities traded:    {self.opportunities}',
+            f'Orders sent:             {self.orders}',
+            f'Fill rate:               {self.fill_rate():.2%}',
+            f'P&L:                     {self.pnl:.2f}'])
+
+    def fill_rate(self):
+        """Contracts filled over contracts sent"""
+        return self.filled_contracts / self.sent_contracts if self.sent_contracts else 0.
+
+    def to_dict(self):
+        return {**self.__dict__, 'fill_rate': self.fill_rate()}
+
+
+class Backtest:
+    """
+    Class to run the IR arbitrage strategy (IRExpert, Trader, and OpportunityEngine when trading across tenors)
+    over a TickStore, with the orders filled by a SimulatedFillModel.
+    Ticks are processed synchronously in time order, a round per tick, waiting for the orders of each round,
+    and the date seen by the strategy follows the ticks through a SimulatedClock (so days to maturity roll along).
+    Nothing is printed, and no pre-trade risk checks are made.
+    """
+
+    def __init__(self, store_path, transaction_cost=tc.TRANSACITON_COST, fill_ratio=bt.FILL_RATIO,
+                 vectorized_rates=False, cross_tenor=False, chunk_rows=bt.CHUNK_ROWS):
+        self._store_path = store_path
+        self._parameters = dict(transaction_cost=transaction_cost, fill_ratio=fill_ratio,
+                                vectorized_rates=vectorized_rates, cross_tenor=cross_tenor)
+        self._chunk_rows = chunk_rows
+
+    def run(self):
+        store = TickStore(self._store_path)
+        parameters = self._parameters
+        journal = EventJournal(console_level=None)
+        instrument_expert = InstrumentExpert(store.tickers(), rest_instruments=store.reference_data(),
+                                             cross_tenor=parameters['cross_tenor'])
+        spot_feed = ReplayYfinanceMDFeed(instrument_expert, journal=journal)
+        fill_model = SimulatedFillModel(instrument_expert, spot_feed, parameters['fill_ratio'])
+        rofex_proxy = SimulatedRofexProxy(instrument_expert, fill_model, journal=journal)
+        data_update_watchman = DataUpdateWatchman(rofex_proxy, spot_feed)
+        clock = SimulatedClock()
+        ir_expert_class = VectorizedIRExpert if parameters['vectorized_rates'] else IRExpert
+        ir_expert = ir_expert_class(instrument_expert, rofex_proxy, spot_feed, clock=clock.today)
+        opportunity_engine = (OpportunityEngine(instrument_expert, ir_expert,
+                                                transaction_cost=parameters['transaction_cost'], clock=clock.today)
+                              if parameters['cross_tenor'] else None)
+        order_gateway = OrderGateway(rofex_proxy, max_workers=1)
+        trader = Trader(instrument_expert, ir_expert, rofex_proxy, spot_feed, data_update_watchman, order_gateway,
+                        opportunity_engine, journal=journal, transaction_cost=parameters['transaction_cost'])
+        futures, underliers = store.futures(), store.tickers()
+        ticks = 0
+        start = time.perf_counter()
+        try:
+            for tick_time, kind, row in store.ticks(self._chunk_rows):
+                clock.set_time(tick_time)
+                if kind == TickStore.BOOKS:
+                    rofex_proxy.replay_book(futures[row[1]], *row[2:])
+                else:
+                    spot_feed.replay({underliers[row[1]]: row[2]})
+                data_update_watchman.set_last_processed_sequence()
+                ir_expert.update_rates()
+                if opportunity_engine:
+                    opportunity_engine.update()
+                if ir_expert.ready():
+                    trader.evaluate_and_trade_each_maturiry()
+                    trader.evaluate_and_trade_cross_tenor()
+                order_gateway.wait_for_pending()
+                ticks += 1
+        finally:
+            order_gateway.shutdown()
+        return BacktestResult(
+            parameters=parameters,
+            ticks=ticks,
+            elapsed=time.perf_counter() - start,
+            opportunities=trader.tick_to_decision().count(),
+            orders=fill_model.orders,
+            sent_contracts=fill_model.sent_contracts,
+            filled_contracts=fill_model.filled_contracts,
+            pnl=fill_model.pnl(rofex_proxy.book_snapshot()),
+            positions=fill_model.positions())
+
+
+def run_backtest(store_path, parameters):
+    """Runs a single Backtest with the given parameters (Backtest keyword arguments)"""
+    return Backtest(store_path, **parameters).run()
+
+
+class BacktestRunner:
+    """
+    Class to run a Backtest for each parameter set over the same TickStore, in parallel across a process pool.
+    Every process streams the store through its own memory maps, sharing the page cache instead of copies.
+    Results are returned in the parameter sets order, and written as JSON lines if an output path is set.
+    """
+
+    def __init__(self, store_path, parameter_sets, processes=None, output_path=None):
+        self._store_path = store_path
+        self._parameter_sets = list(parameter_sets)
+        self._processes = processes
+        self._output_path = output_path
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers=self._processes) as executor:
+            futures = [executor.submit(run_backtest, self._store_path, parameters)
+                       for parameters in self._parameter_sets]
+            results = [future.result() for future in futures]
+        if self._output_path:
+            with open(self._output_path, 'w', encoding='utf-8') as output_file:
+                for result in results:
+                    output_file.write(json.dumps(result.to_dict(), separators=(',', ':')) + '\n')
+        return results
@@ -0,0 +1,197 @@
+import json
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+import simple_trading_bot.conf.checkpoint as ck
+from simple_trading_bot.lib.event_journal import console_journal
+
+
+class StateCheckpoint:
+    """
+    Class to keep the last checkpoint of the bot state in a memory mapped file, so a restarted bot can resume from it.
+    Checkpoints are JSON documents written in place, alternating between two slots: a slot is marked invalid
+    (sequence 0) while being written and gets the next sequence number once done, so a crash while writing
+    leaves the previous checkpoint in the other slot. The latest valid slot is the one read.
+    Layout: a header (magic, layout version, slot capacity) and two slots (sequence, length, timestamp, data).
+    There must be a single writer.
+    """
+    MAGIC = b'SBCHKPNT'
+    LAYOUT_VERSION = 1
+    HEADER_DTYPE = np.dtype([('magic', 'S8'), ('layout_version', '<u4'), ('capacity', '<u4')])
+    SLOT_DTYPE = np.dtype([('sequence', '<u8'), ('length', '<u8'), ('timestamp', '<f8')])
+    SLOTS = 2
+
+    def __init__(self, path, capacity=ck.INITIAL_CAPACITY):
+        """
+        Opens the checkpoint file, or creates it empty with slots of capacity bytes if there is none.
+        Raises ValueError if there is a file at path which is not a checkpoint, rather than overwriting it.
+        """
+        self._path = path
+        self._mmap = None
+        self._header = None
+        self._last_payload = None
+        if os.path.exists(path):
+            self._map()
+        else:
+            self._create(capacity)
+        self._sequence = max((int(self._slot(index)['sequence']) for index in range(self.SLOTS)), default=0)
+
+    def path(self):
+        return self._path
+
+    def capacity(self):
+        return int(self._header['capacity'])
+
+    def sequence(self):
+        """Sequence number of the last checkpoint written, 0 if none"""
+        return self._sequence
+
+    def write(self, state):
+        """Writes the state (a JSON serializable dict) as the new checkpoint, skipped if it did not change"""
+        payload = json.dumps(state, separators=(',', ':')).encode()
+        if payload == self._last_payload:
+            return False
+        if len(payload) > self.capacity():
+            self._create(max(self.capacity() * 2, len(payload)))
+        self._sequence += 1
+        self._write_slot(self._mmap, self.capacity(), self._sequence, payload, time.time())
+        self._last_payload = payload
+        return True
+
+    def read(self):
+        """Returns (timestamp, state) of the latest valid checkpoint, or None if there is none"""
+        for _, timestamp, payload in self._valid_slots():
+            try:
+                return timestamp, json.loads(payload)
+            except ValueError:
+                continue
+        return None
+
+    def close(self):
+        if self._mmap is not None:
+            #The views over the map must go before it can be closed.
+            self._header = None
+            self._mmap.close()
+            self._mmap = None
+
+    def unlink(self):
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    def _map(self):
+        with open(self._path, 'r+b') as checkpoint_file:
+            self._mmap = mmap.mmap(checkpoint_file.fileno(), 0)
+        if len(self._mmap) < self._size(0):
+            self._mmap.close()
+            self._mmap = None
+            raise ValueError(f'{self._path} is not a checkpoint')
+        self._header = np.ndarray((), dtype=self.HEADER_DTYPE, buffer=self._mmap)
+        if (self._header['magic'] != self.MAGIC or self._header['layout_version'] != self.LAYOUT_VERSION
+                or len(self._mmap) != self._size(self.capacity())):
+            self.close()
+            raise ValueError(f'{self._path} is not a checkpoint with layout version {self.LAYOUT_VERSION}')
+
+    def _create(self, capacity):
+        """
+        Lays out a new file with slots of capacity bytes, carrying over the latest checkpoint.
+        It is written aside and then moved, so a crash meanwhile leaves the previous file in place.
+        """
+        latest = next(self._valid_slots(), None) if self._mmap is not None else None
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f'{self._path}.tmp'
+        with open(temporary_path, 'w+b') as checkpoint_file:
+            checkpoint_file.truncate(self._size(capacity))
+            new_mmap = mmap.mmap(checkpoint_file.fileno(), 0)
+        header = np.ndarray((), dtype=self.HEADER_DTYPE, buffer=new_mmap)
+        header['magic'] = self.MAGIC
+        header['layout_version'] = self.LAYOUT_VERSION
+        header['capacity'] = capacity
+        del header
+        if latest:
+            sequence, timestamp, payload = latest
+            self._write_slot(new_mmap, capacity, sequence, payload, timestamp)
+        new_mmap.flush()
+        new_mmap.close()
+        self.close()
+        os.replace(temporary_path, self._path)
+        self._map()
+
+    def _valid_slots(self):
+        """Yields (sequence, timestamp, payload) of the slots not being written, latest first"""
+        slots = [(int(slot['sequence']), float(slot['timestamp']), int(slot['length']))
+                 for slot in (self._slot(index) for index in range(self.SLOTS))]
+        for sequence, timestamp, length in sorted(slots, reverse=True):
+            if sequence:
+                offset = self._data_offset(sequence % self.SLOTS, self.capacity())
+                yield sequence, timestamp, bytes(self._mmap[offset:offset + length])
+
+    def _write_slot(self, buffer, capacity, sequence, payload, timestamp):
+        """Writes the payload into its slot of the buffer, invalid until it gets its sequence number"""
+        slot = self._slot(sequence % self.SLOTS, buffer)
+        slot['sequence'] = 0
+        offset = self._data_offset(sequence % self.SLOTS, capacity)
+        buffer[offset:offset + len(payload)] = payload
+        slot['length'] = len(payload)
+        slot['timestamp'] = timestamp
+        slot['sequence'] = sequence
+
+    def _slot(self, index, buffer=None):
+        return np.ndarray((), dtype=self.SLOT_DTYPE, buffer=self._mmap if buffer is None else buffer,
+                          offset=self.HEADER_DTYPE.itemsize + index * self.SLOT_DTYPE.itemsize)
+
+    @classmethod
+    def _data_offset(cls, index, capacity):
+        return cls.HEADER_DTYPE.itemsize + cls.SLOTS * cls.SLOT_DTYPE.itemsize + index * capacity
+
+    @classmethod
+    def _size(cls, capacity):
+        return cls.HEADER_DTYPE.itemsize + cls.SLOTS * (cls.SLOT_DTYPE.itemsize + capacity)
+
+
+class Checkpointer:
+    """
+    Class to checkpoint the bot state from a background thread, every period seconds.
+    The state is collected by a callable returning a JSON serializable dict, which must be cheap
+    as it runs alongside the trading loop. Checkpoints are only written when the state changed.
+    """
+
+    def __init__(self, checkpoint, collect_state, period=ck.PERIOD, journal=None):
+        self._checkpoint = checkpoint
+        self._collect_state = collect_state
+        self._period = period
+        self._journal = journal or console_journal()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        if not self._thread:
+            self._thread = threading.Thread(target=self._checkpoint_loop, name='Checkpointer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the thread, taking a last checkpoint"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.checkpoint()
+
+    def checkpoint(self):
+        try:
+            self._checkpoint.write(self._collect_state())
+        except Exception as e:
+            #A failed checkpoint leaves the previous one, trading goes on.
+            self._journal.error('checkpoint_error', f'Exception occurred writing a checkpoint: {e}', error=str(e))
+
+    def _checkpoint_loop(self):
+        while not self._stop_event.wait(self._period):
+            self.checkpoint()
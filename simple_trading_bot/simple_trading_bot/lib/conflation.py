@@ -0,0 +1,139 @@
+import threading
+import time
+
+import simple_trading_bot.conf.conflation as cf
+from simple_trading_bot.lib.market_data_feeds import EMPTY_BOOK_SNAPSHOT, MarketDataFeed
+
+
+class ConflatingBookCache(MarketDataFeed):
+    """
+    Class to conflate the book updates of a RofexProxy into a last-value cache, between it and the strategy.
+    At most one update is pending per instrument: updates of an instrument already pending are merged into it,
+    as only its latest book matters, and counted as dropped.
+    Pending instruments are handed to the strategy as a batch, along with the books as of the batch release,
+    following the conflation policy:
+    - LATEST_ONLY: a batch is released on every update, merging what the strategy did not pick up yet
+    - TIME_WINDOW: a batch is released once the oldest pending update is window seconds old
+    - COUNT: a batch is released once count updates are pending, or window seconds later
+    It exposes the RofexProxy books interface (book_snapshot, bids, asks, depth, pop_updated_tickers, ...),
+    so IRExpert and DataUpdateWatchman can run on top of it. As with SharedBookStoreReader, the updated instruments
+    are the ones of the batches delivered, either by book_snapshot or by pop_updated_tickers,
+    so the books read after popping them always cover them.
+    """
+    LATEST_ONLY = 'latest'
+    TIME_WINDOW = 'window'
+    COUNT = 'count'
+    POLICIES = (LATEST_ONLY, TIME_WINDOW, COUNT)
+
+    def __init__(self, rofex_proxy, policy=cf.POLICY, window=cf.WINDOW, count=cf.COUNT):
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown conflation policy {policy}, expected one of {self.POLICIES}')
+        super().__init__()
+        self._rofex_proxy = rofex_proxy
+        self._policy = policy
+        self._window = window
+        self._count = count
+        self._book_snapshot = EMPTY_BOOK_SNAPSHOT
+        self._released_snapshot = EMPTY_BOOK_SNAPSHOT
+        self._pending_tickers = set()
+        self._pending_updates = 0
+        self._pending_receipt_time = 0.
+        self._released_tickers = set()
+        self._delivered_tickers = set()
+        self._dropped_updates = 0
+        self._released_batches = 0
+        self._condition = threading.Condition()
+        self._flush_thread = None
+        rofex_proxy.add_update_listener(self._proxy_update_handler)
+
+    def start_listening(self):
+        """Starts the thread releasing the batches once their window expires, not needed for LATEST_ONLY"""
+        self._running = True
+        if self._policy != self.LATEST_ONLY and not self._flush_thread:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name='ConflatingBookCache', daemon=True)
+            self._flush_thread.start()
+
+    def stop(self):
+        with self._condition:
+            super().stop()
+            self._condition.notify_all()
+        if self._flush_thread:
+            self._flush_thread.join()
+            self._flush_thread = None
+
+    def policy(self):
+        return self._policy
+
+    def book_snapshot(self):
+        """Books as of the last batch released, delivering the instruments released since last call"""
+        with self._condition:
+            self._book_snapshot = self._released_snapshot
+            self._delivered_tickers.update(self._released_tickers)
+            self._released_tickers.clear()
+        return self._book_snapshot
+
+    def bids(self):
+        return self.book_snapshot().bids
+
+    def asks(self):
+        return self.book_snapshot().asks
+
+    def depth(self):
+        return self.book_snapshot().depth
+
+    def pop_updated_tickers(self):
+        """Returns the instruments delivered since last call, delivering the last batch released first"""
+        with self._condition:
+            self.book_snapshot()
+            updated_tickers, self._delivered_tickers = self._delivered_tickers, set()
+        return updated_tickers
+
+    def dropped_updates(self):
+        """Number of intermediate book states merged into a later update of the same instrument"""
+        return self._dropped_updates
+
+    def released_batches(self):
+        return self._released_batches
+
+    def _proxy_update_handler(self):
+        tickers = self._rofex_proxy.pop_updated_tickers()
+        if not tickers:
+            return
+        receipt_time = self._rofex_proxy.last_receipt_time()
+        with self._condition:
+            if not self._pending_tickers:
+                self._pending_receipt_time = receipt_time
+                self._condition.notify_all()
+            for ticker in tickers:
+                #Released states not picked up yet are superseded as well.
+                if ticker in self._pending_tickers or ticker in self._released_tickers:
+                    self._dropped_updates += 1
+                self._pending_tickers.add(ticker)
+            self._pending_updates += len(tickers)
+            if (self._policy == self.LATEST_ONLY or
+                    (self._policy == self.COUNT and self._pending_updates >= self._count)):
+                self._release()
+
+    def _flush_loop(self):
+        with self._condition:
+            while self._running:
+                if not self._pending_tickers:
+                    self._condition.wait()
+                    continue
+                delay = self._pending_receipt_time + self._window - time.perf_counter()
+                if delay > 0:
+                    self._condition.wait(delay)
+                else:
+                    self._release()
+
+    def _release(self):
+        """
+        Releases the pending instruments as a batch, must be called holding the condition.
+        Listeners are notified from here too, so batches are sequenced in release order.
+        """
+        self._released_snapshot = self._rofex_proxy.book_snapshot()
+        self._released_tickers.update(self._pending_tickers)
+        self._pending_tickers.clear()
+        self._pending_updates = 0
+        self._released_batches += 1
+        self._update_last_timestamp(receipt_time=self._pending_receipt_time)
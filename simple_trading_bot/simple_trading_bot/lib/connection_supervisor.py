@@ -0,0 +1,97 @@
+import threading
+import time
+
+import simple_trading_bot.conf.connection as cn
+from simple_trading_bot.lib.event_journal import console_journal
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+
+
+class ConnectionSupervisor:
+    """
+    Class to keep a connection alive from a background thread.
+    The connection is checked every check period, or right away when reported lost (see connection_lost),
+    and while it is down it is reopened with exponential backoff between attempts.
+    Callbacks are run from the supervisor thread: on_lost once the connection is found down,
+    and on_check on every check of a live connection (i.e. to look for stale data).
+    """
+
+    def __init__(self, connect, connected, on_lost=None, on_check=None, name='Connection', journal=None,
+                 check_period=cn.CHECK_PERIOD, min_backoff=cn.MIN_BACKOFF, max_backoff=cn.MAX_BACKOFF):
+        """
+        connect: callable reopening the connection, returning whether it succeeded
+        connected: callable returning whether the connection is up
+        """
+        self._connect = connect
+        self._connected = connected
+        self._on_lost = on_lost
+        self._on_check = on_check
+        self._name = name
+        self._journal = journal or console_journal()
+        self._check_period = check_period
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._lost = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._reconnects = 0
+        self._recovery_time = LatencyHistogram(f'{name} recovery')
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._supervise, name=f'{self._name}Supervisor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._lost.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self._lost.clear()
+
+    def connection_lost(self):
+        """Reports the connection as lost, so it is reopened right away. Safe to call from any thread"""
+        self._lost.set()
+
+    def reconnects(self):
+        return self._reconnects
+
+    def recovery_time(self):
+        """Time from the connection being found down until it is up again"""
+        return self._recovery_time
+
+    def _supervise(self):
+        while not self._stopped.is_set():
+            self._lost.wait(self._check_period)
+            if self._stopped.is_set():
+                return
+            if not self._lost.is_set() and self._connected():
+                if self._on_check:
+                    self._on_check()
+                continue
+            self._recover()
+
+    def _recover(self):
+        lost_time = time.perf_counter()
+        self._journal.warning('connection_lost', f'{self._name} lost. Reconnecting...', connection=self._name)
+        if self._on_lost:
+            self._on_lost()
+        backoff = self._min_backoff
+        while not self._stopped.is_set():
+            self._lost.clear()
+            try:
+                connected = self._connect()
+            except Exception as e:
+                self._journal.warning('reconnect_failed', f'{self._name} reconnection failed: {e}',
+                                      connection=self._name, error=str(e))
+                connected = False
+            #Losses reported while connecting (i.e. by the client handlers) count as failed attempts.
+            if connected and not self._lost.is_set():
+                self._reconnects += 1
+                recovery_time = time.perf_counter() - lost_time
+                self._recovery_time.record(recovery_time)
+                self._journal.info('reconnected', f'{self._name} reconnected after {recovery_time:.3f}s',
+                                   connection=self._name, recovery_time=recovery_time)
+                return
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
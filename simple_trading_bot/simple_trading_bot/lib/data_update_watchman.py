@@ -1,3 +1,7 @@
+import threading
+import time
+
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
 
 
 class DataUpdateWatchman:
@@ -8,15 +12,61 @@ class DataUpdateWatchman:
     def __init__(self, rofex_proxy, yfinance_md_feed):
         self._rofex_proxy = rofex_proxy
         self._yfinance_md_feed = yfinance_md_feed
-        self._last_proc_timestamp = 0.
+        self._last_proc_rofex_sequence = 0
+        self._last_proc_yfinance_sequence = 0
+        self._update_condition = threading.Condition()
+        self._pending_updates = 0
+        self._coalesced_updates = 0
+        #Receipt time of the oldest update served by the current processing round.
+        self._pending_receipt_time = 0.
+        self._round_receipt_time = 0.
+        self._detection_latency = LatencyHistogram('Tick to detection')
+        self._rofex_proxy.add_update_listener(lambda: self._notify_update(rofex_proxy))
+        self._yfinance_md_feed.add_update_listener(lambda: self._notify_update(yfinance_md_feed))
 
-    def set_last_processed_timestamp(self):
-        "This method tracks "
-        self._last_proc_timestamp = max(
-            self._rofex_proxy.last_update_timestamp(),
-            self._yfinance_md_feed.last_update_timestamp())
+    def set_last_processed_sequence(self):
+        "This method sets the landmark of the data read, using the feeds update sequence numbers"
+        with self._update_condition:
+            #Every update notified up to this point is served by the same processing round.
+            self._coalesced_updates += max(self._pending_updates - 1, 0)
+            now = time.perf_counter()
+            if self._pending_updates:
+                self._round_receipt_time = self._pending_receipt_time
+                self._detection_latency.record(now - self._pending_receipt_time)
+            else:
+                self._round_receipt_time = now
+            self._pending_updates = 0
+        self._last_proc_rofex_sequence = self._rofex_proxy.last_update_sequence()
+        self._last_proc_yfinance_sequence = self._yfinance_md_feed.last_update_sequence()
 
     def should_update(self):
         "Returns True when data is ahead form last time it was read"
-        return (self._last_proc_timestamp < self._rofex_proxy.last_update_timestamp() or
-                self._last_proc_timestamp < self._yfinance_md_feed.last_update_timestamp())
+        return (self._last_proc_rofex_sequence != self._rofex_proxy.last_update_sequence() or
+                self._last_proc_yfinance_sequence != self._yfinance_md_feed.last_update_sequence())
+
+    def wait_for_update(self, timeout=None):
+        """
+        Blocks until data is ahead from last time it was read or the timeout expires.
+        Returns True when there is new data to process.
+        """
+        with self._update_condition:
+            return self._update_condition.wait_for(self.should_update, timeout)
+
+    def round_receipt_time(self):
+        "Performance counter time when the oldest update served by the current processing round was received"
+        return self._round_receipt_time
+
+    def detection_latency(self):
+        "Time from the receipt of an update until a processing round picks it up"
+        return self._detection_latency
+
+    def coalesced_updates(self):
+        "Number of updates which did not trigger a processing round on their own"
+        return self._coalesced_updates
+
+    def _notify_update(self, feed):
+        with self._update_condition:
+            if not self._pending_updates:
+                self._pending_receipt_time = feed.last_receipt_time()
+            self._pending_updates += 1
+            self._update_condition.notify_all()
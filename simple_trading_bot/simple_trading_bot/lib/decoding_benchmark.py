@@ -0,0 +1,105 @@
+import json
+import random
+import time
+
+import pyRofex
+from pyRofex.clients.websocket_rfx import WebSocketClient
+
+import simple_trading_bot.lib.market_data_decoder as mdd
+from simple_trading_bot.lib.event_journal import EventJournal
+from simple_trading_bot.lib.instrument_expert import InstrumentExpert
+from simple_trading_bot.lib.market_data_feeds import RofexProxy
+from simple_trading_bot.lib.replay import StubPyRofexWrapper
+from simple_trading_bot.lib.sharding_benchmark import synthetic_reference_data
+
+
+def synthetic_market_data_messages(tickers, count, depth, seed=0):
+    """Returns count raw websocket market data messages of random tickers, with depth levels per side"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        price = 100. + rng.uniform(1., 5.)
+        messages.append(json.dumps({
+            'type': 'Md',
+            'timestamp': int(time.time() * 1000),
+            'instrumentId': {'marketId': 'ROFX', 'symbol': rng.choice(tickers)},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [
+                    {'price': round(price - 0.5 - level, 2), 'size': rng.randint(1, 100)} for level in range(depth)],
+                pyRofex.MarketDataEntry.OFFERS.value: [
+                    {'price': round(price + 0.5 + level, 2), 'size': rng.randint(1, 100)} for level in range(depth)]}}))
+    return messages
+
+
+class DecodingBenchmarkResult:
+    """
+    Class to hold the per message cost of each decoding path
+    """
+
+    def __init__(self, parser, messages, generic_elapsed, fast_elapsed):
+        self.parser = parser
+        self.messages = messages
+        self.generic_elapsed = generic_elapsed
+        self.fast_elapsed = fast_elapsed
+
+    def __str__(self):
+        return '\n'.join([
+            f'{self.messages} market data messages, fast path parsed with {self.parser}',
+            f'Generic pyRofex path: {self.generic_cost() * 1e6:>8.2f} us/message',
+            f'Fast decoder path:    {self.fast_cost() * 1e6:>8.2f} us/message',
+            f'Speedup:              {self.speedup():>8.2f}x'])
+
+    def generic_cost(self):
+        return self.generic_elapsed / self.messages
+
+    def fast_cost(self):
+        return self.fast_elapsed / self.messages
+
+    def speedup(self):
+        return self.generic_elapsed / self.fast_elapsed if self.fast_elapsed else 0.
+
+
+class DecodingBenchmark:
+    """
+    Class to microbenchmark the cost per market data message, from the raw websocket message to the book published,
+    through the generic pyRofex handling (simplejson parsing and handlers dispatching)
+    and through the FastMarketDataDecoder.
+    Both paths feed the same RofexProxy over a synthetic market, and the best of a few repeats is kept for each.
+    """
+
+    def __init__(self, underlier_count=4, maturity_count=4, messages=20000, depth=5, repeats=5, seed=0):
+        self._underlier_count = underlier_count
+        self._maturity_count = maturity_count
+        self._messages = messages
+        self._depth = depth
+        self._repeats = repeats
+        self._seed = seed
+
+    def run(self):
+        tickers, rest_instruments = synthetic_reference_data(self._underlier_count, self._maturity_count)
+        instrument_expert = InstrumentExpert(tickers, rest_instruments=rest_instruments)
+        journal = EventJournal(console_level=None)
+        rofex_proxy = RofexProxy(
+            instrument_expert, pyrofex_wrapper=StubPyRofexWrapper(), journal=journal, fast_decoding=True)
+        #Same client pyRofex would dispatch the messages with, with no connection.
+        ws_client = WebSocketClient(pyRofex.Environment.REMARKET)
+        ws_client.add_market_data_handler(rofex_proxy._market_data_handler)
+        decoder = rofex_proxy.market_data_decoder()
+        decoder.set_generic_handler(ws_client.on_message)
+        messages = synthetic_market_data_messages(
+            instrument_expert.tradeable_rofex_tickers(), self._messages, self._depth, self._seed)
+        try:
+            generic_elapsed = self._best_elapsed(ws_client.on_message, messages)
+            fast_elapsed = self._best_elapsed(decoder.on_message, messages)
+        finally:
+            journal.close()
+        return DecodingBenchmarkResult(mdd.loads.__module__, self._messages, generic_elapsed, fast_elapsed)
+
+    def _best_elapsed(self, on_message, messages):
+        best_elapsed = float('inf')
+        for _ in range(self._repeats):
+            start = time.perf_counter()
+            for message in messages:
+                on_message(None, message)
+            best_elapsed = min(best_elapsed, time.perf_counter() - start)
+        return best_elapsed
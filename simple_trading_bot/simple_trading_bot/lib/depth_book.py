@@ -0,0 +1,132 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+import pyRofex
+
+
+class DepthLadder:
+    """
+    Class to keep the price levels of one side of an order book, best level first.
+    Prices and sizes are kept in contiguous arrays, so updates and sweeps are cheap.
+    Ladders published in a snapshot are treated as immutable: only the writer updates them before publishing.
+    """
+
+    def __init__(self, descending, levels=()):
+        #Levels are sorted by key ascending, where key is the price (or minus the price for bids).
+        self._sign = -1. if descending else 1.
+        self._keys = array('d')
+        self._sizes = array('d')
+        for price, size in sorted(levels, key=lambda level: self._sign * level[0]):
+            if size > 0:
+                self._keys.append(self._sign * price)
+                self._sizes.append(size)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return ((self._sign * key, size) for key, size in zip(self._keys, self._sizes))
+
+    def best(self):
+        """Returns the best (price, size) level, or None if empty"""
+        if not self._keys:
+            return None
+        return self._sign * self._keys[0], self._sizes[0]
+
+    def update(self, price, size):
+        """Incremental update of a single level. A non positive size removes the level"""
+        key = self._sign * price
+        index = bisect_left(self._keys, key)
+        level_exists = index < len(self._keys) and self._keys[index] == key
+        if size <= 0:
+            if level_exists:
+                del self._keys[index]
+                del self._sizes[index]
+        elif level_exists:
+            self._sizes[index] = size
+        else:
+            self._keys.insert(index, key)
+            self._sizes.insert(index, size)
+
+    def with_levels(self, levels):
+        """
+        Returns a copy of the ladder holding the (price, size) levels given, i.e. the depth of a market data message.
+        They are applied as deltas through update: only the levels gone, moved or resized are touched.
+        """
+        ladder = DepthLadder.__new__(DepthLadder)
+        ladder._sign = self._sign
+        ladder._keys = array('d', self._keys)
+        ladder._sizes = array('d', self._sizes)
+        prices = set(price for price, _ in levels)
+        for key in self._keys:
+            if self._sign * key not in prices:
+                ladder.update(self._sign * key, 0)
+        for price, size in levels:
+            ladder.update(price, size)
+        return ladder
+
+    def total_size(self):
+        return sum(self._sizes)
+
+    def sweep_price(self, qty):
+        """Volume weighted average price to fill qty, or None if there is not enough depth"""
+        if qty <= 0:
+            return None
+        remaining = qty
+        notional = 0.
+        for key, size in zip(self._keys, self._sizes):
+            filled = min(size, remaining)
+            notional += filled * key
+            remaining -= filled
+            if remaining <= 0:
+                return self._sign * notional / qty
+        return None
+
+    def limit_price(self, qty):
+        """Price of the deepest level needed to fill qty (the last level if there is not enough depth)"""
+        accumulated = 0.
+        for key, size in zip(self._keys, self._sizes):
+            accumulated += size
+            if accumulated >= qty:
+                return self._sign * key
+        return self._sign * self._keys[-1] if self._keys else None
+
+    def max_qty_at_price(self, price):
+        """Size available at prices equal or better than price"""
+        return sum(self._sizes[:bisect_right(self._keys, self._sign * price)])
+
+
+class DepthBook:
+    """
+    Class to represent the full depth of an instrument order book.
+    The side argument of the queries is the side of the trade: buying sweeps the asks, selling sweeps the bids.
+    """
+
+    def __init__(self, bid_levels=(), ask_levels=(), bids=None, asks=None):
+        self._bids = bids if bids is not None else DepthLadder(True, bid_levels)
+        self._asks = asks if asks is not None else DepthLadder(False, ask_levels)
+
+    def __repr__(self):
+        return f'DepthBook(bids={list(self._bids)}, asks={list(self._asks)})'
+
+    @classmethod
+    def from_top_of_book(cls, bid=None, ask=None):
+        return cls([bid] if bid else (), [ask] if ask else ())
+
+    def bids(self):
+        return self._bids
+
+    def asks(self):
+        return self._asks
+
+    def ladder(self, side):
+        return self._asks if side == pyRofex.Side.BUY else self._bids
+
+    def sweep_price(self, side, qty):
+        return self.ladder(side).sweep_price(qty)
+
+    def limit_price(self, side, qty):
+        return self.ladder(side).limit_price(qty)
+
+    def max_qty_at_price(self, side, price):
+        return self.ladder(side).max_qty_at_price(price)
@@ -0,0 +1,167 @@
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from collections.abc import Mapping
+
+import simple_trading_bot.conf.journal as jr
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+
+class EventJournal:
+    """
+    Class to record structured events (market data receipts, rate updates, decisions, orders) off the hot path.
+    Recording an event just appends a tuple to a bounded queue (a deque, whose appends and pops are atomic,
+    so no lock is taken), and a background writer thread serializes it as a JSON line into the journal file
+    and echoes it to the console. Formatting is deferred to the writer thread too:
+    the console text may be a callable, only called if the event is echoed.
+    Journal files can be read back with read_journal for offline analysis.
+    """
+
+    def __init__(self, path=None, level=jr.JOURNAL_LEVEL, console_level=jr.CONSOLE_LEVEL,
+                 capacity=jr.QUEUE_CAPACITY, flush_interval=jr.FLUSH_INTERVAL):
+        """
+        path: JSON lines file where events are appended, if any
+        console_level: min level of the events echoed to stdout, None to disable the console
+        """
+        self._path = path
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._level = level if path else None
+        self._console_level = console_level
+        levels = [level for level in (self._level, console_level) if level is not None]
+        self._min_level = min(levels) if levels else None
+        self._capacity = capacity
+        self._flush_interval = flush_interval
+        self._events = deque()
+        self._dropped_events = 0
+        self._running = False
+        self._writer_thread = None
+        self._start_lock = threading.Lock()
+
+    def path(self):
+        return self._path
+
+    def dropped_events(self):
+        return self._dropped_events
+
+    def enabled_for(self, level):
+        """Whether events of the level are recorded, to skip building their fields otherwise"""
+        return self._min_level is not None and level >= self._min_level
+
+    def record(self, kind, level=INFO, text=None, **fields):
+        """
+        Records an event of the given kind. Fields must not be mutated afterwards, as they are serialized later.
+        text: message (or callable returning it) echoed to the console, the fields are echoed if not provided
+        """
+        if not self.enabled_for(level):
+            return
+        if len(self._events) >= self._capacity:
+            self._dropped_events += 1
+            return
+        self._events.append((time.time(), level, kind, text, fields))
+        if not self._running:
+            self._start()
+
+    def debug(self, kind, text=None, **fields):
+        self.record(kind, DEBUG, text, **fields)
+
+    def info(self, kind, text=None, **fields):
+        self.record(kind, INFO, text, **fields)
+
+    def warning(self, kind, text=None, **fields):
+        self.record(kind, WARNING, text, **fields)
+
+    def error(self, kind, text=None, **fields):
+        self.record(kind, ERROR, text, **fields)
+
+    def flush(self, timeout=None):
+        """Waits until every event recorded until now is written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._events and (deadline is None or time.monotonic() < deadline):
+            time.sleep(self._flush_interval)
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        """Writes the pending events and stops the writer thread"""
+        with self._start_lock:
+            self._running = False
+            writer_thread, self._writer_thread = self._writer_thread, None
+        if writer_thread:
+            writer_thread.join()
+        self._write_pending()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _start(self):
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            self._writer_thread = threading.Thread(target=self._write_loop, name='EventJournal', daemon=True)
+            self._writer_thread.start()
+
+    def _write_loop(self):
+        while self._running:
+            if not self._write_pending():
+                time.sleep(self._flush_interval)
+
+    def _write_pending(self):
+        """Writes every event queued, returning whether there was any"""
+        lines = []
+        console_lines = []
+        while self._events:
+            timestamp, level, kind, text, fields = self._events.popleft()
+            try:
+                if self._level is not None and level >= self._level:
+                    lines.append(json.dumps(
+                        {'ts': timestamp, 'level': logging.getLevelName(level), 'kind': kind, **fields},
+                        separators=(',', ':'), default=_to_json))
+                if self._console_level is not None and level >= self._console_level:
+                    if callable(text):
+                        text = text()
+                    console_lines.append(text if text is not None else f'{kind}: {fields}')
+            except Exception:
+                traceback.print_exc()
+        if lines and self._file:
+            self._file.write('\n'.join(lines) + '\n')
+        if console_lines:
+            sys.stdout.write('\n'.join(console_lines) + '\n')
+            sys.stdout.flush()
+        return bool(lines or console_lines)
+
+
+def _to_json(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+_console_journal = None
+_console_journal_lock = threading.Lock()
+
+
+def console_journal():
+    """Process wide journal only echoing to the console, used by the components not given any journal"""
+    global _console_journal
+    with _console_journal_lock:
+        if _console_journal is None:
+            _console_journal = EventJournal()
+        return _console_journal
+
+
+def read_journal(path):
+    """Yields the events stored by an EventJournal as dicts, with ts, level and kind keys along with their fields"""
+    with open(path, encoding='utf-8') as journal_file:
+        for line in journal_file:
+            yield json.loads(line)
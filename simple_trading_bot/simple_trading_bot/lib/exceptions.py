@@ -2,4 +2,11 @@ class ExpiredInstrument(Exception):
 
     def __init__(self, instrument):
         msg = f'Instrument expired on {instrument.maturity_date()}'
-        super().__init__(msg)
\ No newline at end of file
+        super().__init__(msg)
+
+
+class RiskLimitBreached(Exception):
+
+    def __init__(self, reason):
+        self.reason = reason
+        super().__init__(f'Orders rejected by pre-trade risk checks: {reason}')
@@ -2,6 +2,7 @@ import re
 import datetime as dt
 from dateutil.parser import parse
 from collections import defaultdict
+from types import MappingProxyType
 
 import simple_trading_bot.lib.exceptions as exc
 import simple_trading_bot.lib.pyrofex_wrapper as prw
@@ -9,14 +10,21 @@ import simple_trading_bot.lib.pyrofex_wrapper as prw
 
 class Future:
     """
-    Class to represent future contracts
+    Class to represent future contracts.
+    Slotted, as there is one per instrument, and the days and year fraction to maturity are computed once per day.
     """
+    __slots__ = ('_ticker', '_maturity_date', '_underlier_ticker', '_contract_size', '_days_date', '_days',
+                 '_year_fraction')
+    DAYS_IN_A_YEAR = 365
 
     def __init__(self, ticker, maturity_date, underlier_ticker, contract_size):
         self._ticker = ticker
         self._maturity_date = maturity_date
         self._underlier_ticker = underlier_ticker
         self._contract_size = contract_size
+        self._days_date = None
+        self._days = None
+        self._year_fraction = None
 
     def __repr__(self):
         return f'{self._ticker}: [{self._underlier_ticker} - {self._maturity_date} - {self._contract_size}]'
@@ -33,13 +41,36 @@ class Future:
     def contract_size(self):
         return self._contract_size
 
-    def days_to_maturity(self, start_date=None):
+    def days_to_maturity(self, start_date=None, today=None):
         """
-        Computes the days remaining to maturity.
-        Approximation: each day counts as a whole day
+        Computes the days remaining to maturity, from start_date if given, or else from today.
+        Approximation: each day counts as a whole day.
+        today: current date, the system one unless given (i.e. the simulated one when backtesting)
+        Days from today are cached until the date rolls.
         """
-        start_date = start_date or dt.datetime.now()
-        delta = self._maturity_date.date() - start_date.date()
+        if start_date is not None:
+            return self._days_from(start_date.date())
+        self._roll_date(today or dt.date.today())
+        return self._days
+
+    def year_fraction(self, start_date=None, today=None):
+        """
+        Time to maturity in years, under the Actual/DAYS_IN_A_YEAR day count convention.
+        As the days, it is cached until the date rolls.
+        """
+        if start_date is not None:
+            return self._days_from(start_date.date()) / self.DAYS_IN_A_YEAR
+        self._roll_date(today or dt.date.today())
+        return self._year_fraction
+
+    def _roll_date(self, today):
+        if today != self._days_date:
+            self._days = self._days_from(today)
+            self._year_fraction = self._days / self.DAYS_IN_A_YEAR
+            self._days_date = today
+
+    def _days_from(self, start_date):
+        delta = self._maturity_date.date() - start_date
         if delta.days + 1 <= 0:
             raise exc.ExpiredInstrument(self)
         return delta.days
@@ -51,76 +82,153 @@ class InstrumentExpert:
     """
     # TODO: Logic to determine whether an instrument is tradeable or not should not be here.
 
-    def __init__(self, tickers):
+    MATURITY_DATE_FORMAT = '%Y%m%d'
+
+    def __init__(self, tickers, rest_instruments=None, recorder=None, reference_data_cache=None, maturity_tags=None,
+                 cross_tenor=False):
+        """
+        maturity_tags: if provided, only the futures with these maturity tags are loaded (i.e. for a shard)
+        cross_tenor: if set, maturities with a single future are tradeable too, against futures of other maturities
+        """
         self._tickers = tickers
+        self._min_instruments_per_maturity = 1 if cross_tenor else 2
+        self._maturity_tags = set(maturity_tags) if maturity_tags is not None else None
+        self._reference_data = {'instruments': []}
         self._rofex_instruments_by_underlier = defaultdict(list)
         self._rofex_instruments_by_maturity = defaultdict(list)
         self._yfinance_tickers_map = {ticker: self._yfinance_ticker(ticker) for ticker in tickers}
         self._inverse_yfinance_tickers_map = {v: k for k, v in self._yfinance_tickers_map.items()}
         self._rofex_instruments_by_ticker = {}
-        self._load_rofex_instruments()
+        self._load_rofex_instruments(rest_instruments, recorder, reference_data_cache)
+        self._build_views()
+
+    def reference_data(self):
+        """Instruments loaded, in the rest api detailed instruments format, enough to rebuild this expert"""
+        return self._reference_data
 
     def futures_ticker(self):
-        return list(self._rofex_instruments_by_ticker.keys())
+        return self._futures_tickers
 
     def yfinance_tickers(self):
-        return list(self._yfinance_tickers_map.values())
+        return tuple(self._yfinance_tickers_map.values())
 
     def inverse_yfinance_tickers_map(self):
-        return self._inverse_yfinance_tickers_map.copy()
+        return self._inverse_yfinance_tickers_map
 
     def rofex_instruments_by_underlier(self):
-        return copy.deepcopy(self._rofex_instruments_by_underlier)
+        return self._rofex_instruments_by_underlier
 
     def rofex_instruments_by_maturity(self):
-        return copy.deepcopy(self._rofex_instruments_by_maturity)
+        return self._rofex_instruments_by_maturity
 
     def rofex_instruments_by_ticker(self):
-        return self._rofex_instruments_by_ticker.copy()
+        return self._rofex_instruments_by_ticker
 
     def tradeable_maturity_tags(self):
-        return list(self.tradeable_rofex_intruments_by_maturity().keys())
+        return self._tradeable_maturity_tags
 
     def tradeable_rofex_intruments_by_maturity(self):
-        return {maturity: instruments for maturity, instruments in self._rofex_instruments_by_maturity.items()
-                if len(instruments) > 1}
+        return self._tradeable_rofex_instruments_by_maturity
 
     def maturities_of_tradeable_tickers(self):
-        return {instrument.ticker(): maturity
-                for maturity, instruments in self.tradeable_rofex_intruments_by_maturity().items()
-                for instrument in instruments}
+        return self._maturities_of_tradeable_tickers
 
     def tradeable_rofex_instruments(self):
-        return sum(self.tradeable_rofex_intruments_by_maturity().values(), [])
+        return self._tradeable_rofex_instruments
 
     def tradeable_rofex_tickers(self):
-        return [future._ticker for future in self.tradeable_rofex_instruments()]
+        return self._tradeable_rofex_tickers
 
     def tradeable_rofex_instruments_by_underlier_ticker(self):
-        tradeable_ticekrs = self.tradeable_rofex_tickers()
-        return {underlier: [instrument for instrument in instruments if instrument.ticker() in tradeable_ticekrs]
-                for underlier, instruments in self._rofex_instruments_by_underlier.items()}
+        return self._tradeable_rofex_instruments_by_underlier
 
     def tradeable_yfinance_tickers(self):
         return list(set(self._yfinance_tickers_map[future._underlier_ticker]
                         for future in self.tradeable_rofex_instruments()))
 
-    def _load_rofex_instruments(self):
+    def rofex_spot_tickers_map(self):
+        """Rofex symbols of the tradeable underliers spot markets, keyed by underlier ticker"""
+        return {future.underlier_ticker(): self._rofex_spot_ticker(future.underlier_ticker())
+                for future in self.tradeable_rofex_instruments()}
+
+    def _build_views(self):
+        """
+        Instruments never change once loaded, so every accessor returns a read-only view built here,
+        with tuples instead of lists, and the futures themselves (not copies).
+        """
+        self._inverse_yfinance_tickers_map = MappingProxyType(self._inverse_yfinance_tickers_map)
+        self._futures_tickers = tuple(self._rofex_instruments_by_ticker)
+        self._rofex_instruments_by_ticker = MappingProxyType(self._rofex_instruments_by_ticker)
+        self._rofex_instruments_by_underlier = MappingProxyType(
+            {underlier: tuple(instruments) for underlier, instruments in self._rofex_instruments_by_underlier.items()})
+        self._rofex_instruments_by_maturity = MappingProxyType(
+            {maturity: tuple(instruments) for maturity, instruments in self._rofex_instruments_by_maturity.items()})
+        self._tradeable_rofex_instruments_by_maturity = MappingProxyType(
+            {maturity: instruments for maturity, instruments in self._rofex_instruments_by_maturity.items()
+             if len(instruments) >= self._min_instruments_per_maturity})
+        self._tradeable_maturity_tags = tuple(self._tradeable_rofex_instruments_by_maturity)
+        self._tradeable_rofex_instruments = tuple(
+            future for instruments in self._tradeable_rofex_instruments_by_maturity.values() for future in instruments)
+        self._tradeable_rofex_tickers = tuple(future.ticker() for future in self._tradeable_rofex_instruments)
+        self._maturities_of_tradeable_tickers = MappingProxyType(
+            {future.ticker(): maturity
+             for maturity, instruments in self._tradeable_rofex_instruments_by_maturity.items()
+             for future in instruments})
+        tradeable_tickers = set(self._tradeable_rofex_tickers)
+        self._tradeable_rofex_instruments_by_underlier = MappingProxyType(
+            {underlier: tuple(instrument for instrument in instruments if instrument.ticker() in tradeable_tickers)
+             for underlier, instruments in self._rofex_instruments_by_underlier.items()})
+
+    def _load_rofex_instruments(self, rest_instruments=None, recorder=None, reference_data_cache=None):
         """
-        Logic to parse rofex instruments
+        Logic to parse rofex instruments.
+        Detailed instruments are downloaded unless they are provided (i.e. when replaying a session)
+        or a valid snapshot is found in the reference data cache.
         """
-        futures_regexps = {ticker: re.compile(f'^{ticker}[A-Z][a-z][a-z]2.$') for ticker in self._tickers}
-        rest_instruments = prw.PyRofexWrapper().get_detailed_instruments()
+        #Longer tickers go first, so a ticker being the prefix of another one never shadows it.
+        underliers = '|'.join(re.escape(ticker) for ticker in sorted(self._tickers, key=len, reverse=True))
+        futures_regexp = re.compile(f'^({underliers})([A-Z][a-z][a-z]2.)$')
+        downloaded = False
+        if rest_instruments is None and reference_data_cache:
+            rest_instruments = reference_data_cache.load(self._tickers)
+        if rest_instruments is None:
+            rest_instruments = prw.PyRofexWrapper().get_detailed_instruments()
+            downloaded = True
+        matched_instruments = []
         for instrument in rest_instruments['instruments']:
-            for ticker, regexp in futures_regexps.items():
-                if regexp.match(instrument['instrumentId']['symbol']):
-                    rofex_ticker = instrument['instrumentId']['symbol']
-                    maturity_date = parse(instrument['maturityDate'])
-                    contract_size = instrument['contractMultiplier']
-                    future = Future(rofex_ticker, maturity_date, ticker, contract_size)
-                    self._rofex_instruments_by_underlier[ticker].append(future)
-                    self._rofex_instruments_by_maturity[rofex_ticker.replace(ticker, '')].append(future)
-                    self._rofex_instruments_by_ticker[rofex_ticker] = future
+            rofex_ticker = instrument['instrumentId']['symbol']
+            match = futures_regexp.match(rofex_ticker)
+            if not match:
+                continue
+            ticker, maturity_tag = match.groups()
+            if self._maturity_tags is not None and maturity_tag not in self._maturity_tags:
+                continue
+            matched_instruments.append(instrument)
+            maturity_date = self._parse_maturity_date(instrument['maturityDate'])
+            contract_size = instrument['contractMultiplier']
+            future = Future(rofex_ticker, maturity_date, ticker, contract_size)
+            self._rofex_instruments_by_underlier[ticker].append(future)
+            self._rofex_instruments_by_maturity[maturity_tag].append(future)
+            self._rofex_instruments_by_ticker[rofex_ticker] = future
+        #Only the instruments used are recorded/cached, which is enough to rebuild this expert.
+        self._reference_data = {'instruments': matched_instruments}
+        if downloaded and reference_data_cache:
+            reference_data_cache.store(self._tickers, {'instruments': matched_instruments})
+        if recorder:
+            recorder.record_reference_data({'instruments': matched_instruments})
+
+    @classmethod
+    def _parse_maturity_date(cls, maturity_date):
+        try:
+            return dt.datetime.strptime(maturity_date, cls.MATURITY_DATE_FORMAT)
+        except ValueError:
+            return parse(maturity_date)
+
+    @staticmethod
+    def _rofex_spot_ticker(ticker):
+        if ticker == 'DO':
+            return 'DLR/SPOT'
+        return f'MERV - XMEV - {ticker} - 48hs'
 
     @staticmethod
     def _yfinance_ticker(ticker):
@@ -1,6 +1,12 @@
-import copy
+import datetime as dt
+import itertools
 from collections import defaultdict
 
+import simple_trading_bot.lib.exceptions as exc
+from simple_trading_bot.lib.depth_book import DepthBook
+from simple_trading_bot.lib.market_data_feeds import EMPTY_BOOK_SNAPSHOT
+from simple_trading_bot.lib.rate_heap import RateHeap
+
 
 class IRExpert:
     """
@@ -8,56 +14,168 @@ class IRExpert:
     """
     DAYS_IN_A_YEAR = 365
 
-    def __init__(self, instrument_expert, rofex_proxy, yfinance_md_feed):
+    def __init__(self, instrument_expert, rofex_proxy, yfinance_md_feed, clock=dt.date.today):
+        """clock: callable returning the current date, which rates are computed at (i.e. a simulated one)"""
         self._futures_by_underlier_ticker = instrument_expert.tradeable_rofex_instruments_by_underlier_ticker()
         self._maturiries_by_ticker = instrument_expert.maturities_of_tradeable_tickers()
+        self._futures_by_ticker = {future.ticker(): future
+                                   for futures in self._futures_by_underlier_ticker.values()
+                                   for future in futures}
         self._rofex_proxy = rofex_proxy
         self._yfinance_md_feed = yfinance_md_feed
-        self._taker_rates = defaultdict(dict)
-        self._offered_rates = defaultdict(dict)
+        self._clock = clock
+        self._taker_rates = defaultdict(lambda: RateHeap(reverse=True))
+        self._offered_rates = defaultdict(RateHeap)
+        self._days_to_maturity = {}
+        self._rates_date = None
+        self._book_snapshot = EMPTY_BOOK_SNAPSHOT
+        self._underlier_prices = {}
+        self._last_updated_tickers = set()
 
     def update_rates(self):
         """
-        Updates the implicit rates and organize them by maturity date and ticker
+        Updates the implicit rates and organize them by maturity date and ticker.
+        Only the rates depending on the prices changed since last call are recomputed,
+        unless the date has rolled, in which case every rate is rebuilt.
         """
+        #Updated tickers are popped before the data is read, so the data read always covers them.
+        #Updates received in between are read too, and popped again next call.
+        updated_tickers = self._updated_future_tickers()
         underlier_prices = self._yfinance_md_feed.last_prices()
-        future_bids = self._rofex_proxy.bids()
-        future_asks = self._rofex_proxy.asks()
-        self._taker_rates = defaultdict(dict)
-        self._offered_rates = defaultdict(dict)
-        for ticker, underlier_price in underlier_prices.items():
-            for future in self._futures_by_underlier_ticker[ticker]:
-                future_ticker = future.ticker()
-                days_to_maturity = future.days_to_maturity()
-                maturity_tag = self._maturiries_by_ticker[future_ticker]
-                if future_ticker in future_bids:
-                    self._taker_rates[maturity_tag][future_ticker] = self._implicit_rate(
-                        future_bids[future_ticker].price,
-                        underlier_price,
-                        days_to_maturity)
-                if future_ticker in future_asks:
-                    self._offered_rates[maturity_tag][future_ticker] = self._implicit_rate(
-                        future_asks[future_ticker].price,
-                        underlier_price,
-                        days_to_maturity)
+        self._underlier_prices = underlier_prices
+        self._book_snapshot = self._rofex_proxy.book_snapshot()
+        future_bids = self._book_snapshot.bids
+        future_asks = self._book_snapshot.asks
+        today = self._clock()
+        if today != self._rates_date:
+            self._reset_rates(today)
+            updated_tickers = self._futures_by_ticker.keys()
+        self._last_updated_tickers = set(updated_tickers)
+        for future_ticker in updated_tickers:
+            future = self._futures_by_ticker.get(future_ticker)
+            if (future is None or future.underlier_ticker() not in underlier_prices or
+                    future_ticker not in self._days_to_maturity):
+                continue
+            underlier_price = underlier_prices[future.underlier_ticker()]
+            days_to_maturity = self._days_to_maturity[future_ticker]
+            maturity_tag = self._maturiries_by_ticker[future_ticker]
+            if future_ticker in future_bids:
+                self._taker_rates[maturity_tag].update(future_ticker, self._implicit_rate(
+                    future_bids[future_ticker].price,
+                    underlier_price,
+                    days_to_maturity))
+            else:
+                self._taker_rates[maturity_tag].remove(future_ticker)
+            if future_ticker in future_asks:
+                self._offered_rates[maturity_tag].update(future_ticker, self._implicit_rate(
+                    future_asks[future_ticker].price,
+                    underlier_price,
+                    days_to_maturity))
+            else:
+                self._offered_rates[maturity_tag].remove(future_ticker)
+
+    def book_snapshot(self):
+        """Returns the books snapshot used to compute the current rates"""
+        return self._book_snapshot
+
+    def depth_book(self, future_ticker):
+        """Full depth book of the future, falling back to the top of book when depth is not available"""
+        depth_book = self._book_snapshot.depth.get(future_ticker)
+        if depth_book is None:
+            depth_book = DepthBook.from_top_of_book(
+                self._book_snapshot.bids.get(future_ticker),
+                self._book_snapshot.asks.get(future_ticker))
+        return depth_book
+
+    def sweep_rate(self, future_ticker, side, qty):
+        """
+        Volume weighted implicit rate obtained when trading qty contracts against the book,
+        or None if there is not enough depth
+        """
+        price = self.depth_book(future_ticker).sweep_price(side, qty)
+        if price is None:
+            return None
+        return self._implicit_rate(
+            price,
+            self._underlier_price(future_ticker),
+            self._days_to_maturity[future_ticker])
+
+    def max_qty_at_rate(self, future_ticker, side, rate):
+        """
+        Contracts available at rates equal or better than rate,
+        i.e. lower offered rates when buying and higher taker rates when selling
+        """
+        limit_price = self._underlier_price(future_ticker) * (
+            (1 + rate / self.DAYS_IN_A_YEAR) ** self._days_to_maturity[future_ticker])
+        return self.depth_book(future_ticker).max_qty_at_price(side, limit_price)
 
     def taker_rates(self):
-        return copy.deepcopy(self._taker_rates)
+        return {maturity_tag: rates.rates() for maturity_tag, rates in self._taker_rates.items() if rates}
 
     def offered_rates(self):
-        return copy.deepcopy(self._offered_rates)
+        return {maturity_tag: rates.rates() for maturity_tag, rates in self._offered_rates.items() if rates}
+
+    def taker_rate(self, future_ticker):
+        return self._taker_rates[self._maturiries_by_ticker[future_ticker]].rate(future_ticker)
+
+    def offered_rate(self, future_ticker):
+        return self._offered_rates[self._maturiries_by_ticker[future_ticker]].rate(future_ticker)
+
+    def days_to_maturity(self, future_ticker):
+        return self._days_to_maturity[future_ticker]
+
+    def last_updated_tickers(self):
+        """Futures whose rates were recomputed (or removed) by the last update"""
+        return self._last_updated_tickers
 
     def max_taker_rate(self, maturity_tag):
-        return max(self._taker_rates[maturity_tag].items(), key=lambda each: each[1])
+        return self._taker_rates[maturity_tag].best()
 
     def min_offered_rate(self, maturity_tag):
-        return min(self._offered_rates[maturity_tag].items(), key=lambda each: each[1])
+        return self._offered_rates[maturity_tag].best()
+
+    def ranked_taker_rates(self, maturity_tag, count):
+        """Up to count (ticker, rate) pairs of the maturity, from max to min taker rate"""
+        return list(itertools.islice(self._taker_rates[maturity_tag].ranked(), count))
+
+    def ranked_offered_rates(self, maturity_tag, count):
+        """Up to count (ticker, rate) pairs of the maturity, from min to max offered rate"""
+        return list(itertools.islice(self._offered_rates[maturity_tag].ranked(), count))
 
     def ready(self):
-        return self._taker_rates and self._offered_rates
+        return (any(len(rates) for rates in self._taker_rates.values()) and
+                any(len(rates) for rates in self._offered_rates.values()))
 
     def maturiry_ready_to_trade(self, maturity_tag):
-        return self._taker_rates[maturity_tag] and self._offered_rates[maturity_tag]
+        return bool(self._taker_rates[maturity_tag]) and bool(self._offered_rates[maturity_tag])
+
+    def _underlier_price(self, future_ticker):
+        return self._underlier_prices[self._futures_by_ticker[future_ticker].underlier_ticker()]
+
+    def _updated_future_tickers(self):
+        """
+        Collects the futures whose rates are affected by the data received since last call.
+        An updated underlier fans out to all of its futures.
+        """
+        updated_tickers = set(self._rofex_proxy.pop_updated_tickers())
+        for underlier_ticker in self._yfinance_md_feed.pop_updated_tickers():
+            updated_tickers.update(
+                future.ticker() for future in self._futures_by_underlier_ticker.get(underlier_ticker, []))
+        return updated_tickers
+
+    def _reset_rates(self, today):
+        self._taker_rates.clear()
+        self._offered_rates.clear()
+        #Futures maturing today or before are not priced anymore (i.e. when running across maturity dates).
+        self._days_to_maturity = {}
+        for ticker, future in self._futures_by_ticker.items():
+            try:
+                days_to_maturity = future.days_to_maturity(today=today)
+            except exc.ExpiredInstrument:
+                continue
+            if days_to_maturity > 0:
+                self._days_to_maturity[ticker] = days_to_maturity
+        self._rates_date = today
 
     def _implicit_rate(self, maturity_price, current_price, days_to_maturity):
         """
@@ -65,6 +183,3 @@ class IRExpert:
         day count convention and daily compounding.
         """
         return ((maturity_price / current_price) ** (1 / days_to_maturity) - 1) * self.DAYS_IN_A_YEAR
-
-
-
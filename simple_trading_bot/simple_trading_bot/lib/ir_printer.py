@@ -1,39 +1,136 @@
+import sys
+import threading
+import time
+
 from tabulate import tabulate
 
+import simple_trading_bot.conf.display as dc
+from simple_trading_bot.lib.event_journal import console_journal
+
+
 class IRPrinter:
     """
-    Class to print current implicit rates
+    Class to display the current implicit rates from its own thread, out of the trading loop.
+    The trading loop only flags the rates as updated (see print_rates), and the display thread reads them
+    at most once every refresh period, re-sorting only the maturities whose rates changed.
+    On a terminal the table is redrawn in place at the top of the screen, rewriting only the lines which changed,
+    otherwise a new table is printed whenever it changes.
     """
     EMPTY_ROW_STR = '*' * 12 + ' -> ' + '*' * 10
+    #Retries when the rates change while being copied from the trading thread.
+    MAX_READ_RETRIES = 10
 
-    def __init__(self, ir_expert):
+    def __init__(self, ir_expert, journal=None, refresh_period=dc.REFRESH_PERIOD, stream=None,
+                 ansi_redraw=dc.ANSI_REDRAW):
+        """stream: where the table is drawn, stdout if not provided"""
         self._ir_expert = ir_expert
+        self._journal = journal or console_journal()
+        self._refresh_period = refresh_period
+        self._stream = stream
+        self._ansi_redraw = ansi_redraw
+        #Plain flag, set by the trading thread without taking any lock.
+        self._rates_updated = False
+        #Sorted rates of each (side, maturity), along with the rates they were sorted from.
+        self._sorted_rates = {}
+        self._last_lines = []
+        self._running = False
+        self._display_thread = None
+
+    def start(self):
+        self._running = True
+        self._display_thread = threading.Thread(target=self._display_loop, name='IRPrinter', daemon=True)
+        self._display_thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._display_thread:
+            self._display_thread.join()
+            self._display_thread = None
 
     def print_rates(self):
-        #Get the implicit rates and sort them
-        taker_rates = self._ir_expert.taker_rates()
-        offered_rates = self._ir_expert.offered_rates()
-        taker_rates_print = {maturity_tag: sorted(
-            [(ticker, rate) for ticker, rate in values.items()], key=lambda x: x[1])
-            for maturity_tag, values in taker_rates.items()}
-        offered_rates_print = {maturity_tag: sorted(
-            [(ticker, rate) for ticker, rate in values.items()], key=lambda x: x[1])
-            for maturity_tag, values in offered_rates.items()}
-
-        #Then fill the empty rows in maturities with few values
-        maturity_tags = set(taker_rates.keys()).union(set(offered_rates.keys()))
-        max_taker_entries = max(len(entries) for entries in taker_rates_print.values())
-        max_offered_entries = max(len(entries) for entries in taker_rates_print.values())
+        """Flags the rates as updated, they are drawn by the display thread on its next refresh"""
+        self._rates_updated = True
+
+    def refresh(self):
+        """Draws the rates if they were updated since last refresh, returning whether they were"""
+        if not self._rates_updated:
+            return False
+        self._rates_updated = False
+        taker_rates, offered_rates = self._read_rates()
+        if not taker_rates and not offered_rates:
+            return False
+        self._journal.debug('rates', taker_rates=taker_rates, offered_rates=offered_rates)
+        taker_columns = {maturity_tag: self._sorted('taker', maturity_tag, rates)
+                         for maturity_tag, rates in taker_rates.items()}
+        offered_columns = {maturity_tag: self._sorted('offered', maturity_tag, rates)
+                           for maturity_tag, rates in offered_rates.items()}
+        self._draw(self.rates_table(taker_columns, offered_columns).split('\n'))
+        return True
+
+    @classmethod
+    def rates_table(cls, taker_columns, offered_columns):
+        """Renders the table from the (ticker, rate) pairs of each maturity, sorted from lower to higher"""
+        #Fill the empty rows in maturities with few values
+        maturity_tags = set(taker_columns.keys()).union(set(offered_columns.keys()))
+        max_taker_entries = max((len(entries) for entries in taker_columns.values()), default=0)
+        max_offered_entries = max((len(entries) for entries in offered_columns.values()), default=0)
         rates_to_print = {}
-        for maturity_tag in maturity_tags:
-            taker_values = taker_rates_print.get(maturity_tag, [self.EMPTY_ROW_STR] * max_taker_entries)
+        for maturity_tag in sorted(maturity_tags):
+            taker_values = taker_columns.get(maturity_tag, [])
             rates_to_print[maturity_tag] = (
-                    [self.EMPTY_ROW_STR] * (max_taker_entries - len(taker_values))
+                    [cls.EMPTY_ROW_STR] * (max_taker_entries - len(taker_values))
                     + [f'{value[0]:<12} -> {value[1]:10.6f}' for value in taker_values])
-            offered_values = offered_rates_print.get(maturity_tag, [self.EMPTY_ROW_STR] * max_offered_entries)
+            offered_values = offered_columns.get(maturity_tag, [])
             rates_to_print[maturity_tag] += ['+' * 26]
             rates_to_print[maturity_tag] += [f'{value[0]:<12} -> {value[1]:10.6f}' for value in offered_values] + \
-                                            [self.EMPTY_ROW_STR] * (max_offered_entries - len(offered_values))
+                                            [cls.EMPTY_ROW_STR] * (max_offered_entries - len(offered_values))
         table_str = ('Last Updated Rates:\n' +
                      tabulate(rates_to_print, headers='keys', stralign='center', tablefmt='psql'))
-        print(table_str, flush=True)
+        return table_str
+
+    def _display_loop(self):
+        while self._running:
+            next_refresh = time.monotonic() + self._refresh_period
+            try:
+                self.refresh()
+            except Exception as e:
+                self._journal.error('display_error', f'Exception ocurred printing rates: {e}. Continuing...')
+            time.sleep(max(next_refresh - time.monotonic(), 0.))
+
+    def _read_rates(self):
+        #Rates are copied while the trading thread may be adding maturities, which is just retried.
+        for _ in range(self.MAX_READ_RETRIES):
+            try:
+                return self._ir_expert.taker_rates(), self._ir_expert.offered_rates()
+            except RuntimeError:
+                continue
+        return {}, {}
+
+    def _sorted(self, side, maturity_tag, rates):
+        cached = self._sorted_rates.get((side, maturity_tag))
+        if cached and cached[0] == rates:
+            return cached[1]
+        sorted_rates = sorted(rates.items(), key=lambda x: x[1])
+        self._sorted_rates[(side, maturity_tag)] = (rates, sorted_rates)
+        return sorted_rates
+
+    def _draw(self, lines):
+        stream = self._stream or sys.stdout
+        ansi_redraw = self._ansi_redraw if self._ansi_redraw is not None else stream.isatty()
+        if lines == self._last_lines:
+            return
+        if ansi_redraw:
+            #Save the cursor, rewrite the changed lines from the top of the screen, and restore it,
+            #so any other output keeps going where it was.
+            output = ['\x1b7']
+            for row, line in enumerate(lines):
+                if row >= len(self._last_lines) or self._last_lines[row] != line:
+                    output.append(f'\x1b[{row + 1};1H{line}\x1b[K')
+            for row in range(len(lines), len(self._last_lines)):
+                output.append(f'\x1b[{row + 1};1H\x1b[K')
+            output.append('\x1b8')
+        else:
+            output = ['\n'.join(lines), '\n']
+        self._last_lines = lines
+        stream.write(''.join(output))
+        stream.flush()
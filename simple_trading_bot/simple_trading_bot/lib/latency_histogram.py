@@ -0,0 +1,109 @@
+import math
+import threading
+
+
+class LatencyHistogram:
+    """
+    Class to aggregate latency samples (in seconds) into log-spaced buckets.
+    Recording is O(1) and memory is bounded, so it can be used on the hot path.
+    Percentiles are approximated within the bucket resolution.
+    """
+    MIN_VALUE = 1e-6
+    MAX_VALUE = 100.
+    BUCKETS_PER_DECADE = 20
+
+    def __init__(self, name=''):
+        self._name = name
+        self._log_min = math.log10(self.MIN_VALUE)
+        decades = math.log10(self.MAX_VALUE) - self._log_min
+        self._buckets = [0] * (int(decades * self.BUCKETS_PER_DECADE) + 2)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __str__(self):
+        return self.summary()
+
+    def __getstate__(self):
+        #Histograms can be sent across processes, the lock is not.
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def name(self):
+        return self._name
+
+    def record(self, value):
+        index = self._bucket_index(value)
+        with self._lock:
+            self._buckets[index] += 1
+            self._count += 1
+            self._total += value
+            if value > self._max:
+                self._max = value
+            if value < self._min:
+                self._min = value
+
+    def reset(self):
+        with self._lock:
+            self._buckets = [0] * len(self._buckets)
+            self._count = 0
+            self._total = 0.
+            self._max = 0.
+            self._min = math.inf
+
+    def merge(self, other):
+        """Adds the samples of another histogram (i.e. gathered by another process) into this one"""
+        with self._lock:
+            self._buckets = [count + other_count for count, other_count in zip(self._buckets, other._buckets)]
+            self._count += other._count
+            self._total += other._total
+            self._max = max(self._max, other._max)
+            self._min = min(self._min, other._min)
+
+    def count(self):
+        return self._count
+
+    def total(self):
+        return self._total
+
+    def mean(self):
+        return self._total / self._count if self._count else 0.
+
+    def max(self):
+        return self._max
+
+    def min(self):
+        return self._min if self._count else 0.
+
+    def percentile(self, percentile):
+        """Returns the upper bound of the bucket holding the requested percentile (0-100)"""
+        with self._lock:
+            if not self._count:
+                return 0.
+            rank = math.ceil(self._count * percentile / 100.)
+            accumulated = 0
+            for index, bucket_count in enumerate(self._buckets):
+                accumulated += bucket_count
+                if accumulated >= rank:
+                    return min(self._bucket_upper_bound(index), self._max)
+            return self._max
+
+    def summary(self):
+        return (f'{self._name} [n={self._count}] '
+                f'mean: {self.mean() * 1e6:.1f}us '
+                f'p50: {self.percentile(50) * 1e6:.1f}us '
+                f'p99: {self.percentile(99) * 1e6:.1f}us '
+                f'max: {self.max() * 1e6:.1f}us')
+
+    def _bucket_index(self, value):
+        if value <= self.MIN_VALUE:
+            return 0
+        index = int((math.log10(value) - self._log_min) * self.BUCKETS_PER_DECADE) + 1
+        return min(index, len(self._buckets) - 1)
+
+    def _bucket_upper_bound(self, index):
+        return 10 ** (self._log_min + index / self.BUCKETS_PER_DECADE)
@@ -0,0 +1,56 @@
+import json
+import time
+
+import pyRofex
+
+#orjson is optional, the fast path falls back to the standard library parser without it.
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+MARKET_DATA_TYPES = frozenset(('Md', 'MD', 'md'))
+BIDS = pyRofex.MarketDataEntry.BIDS.value
+OFFERS = pyRofex.MarketDataEntry.OFFERS.value
+
+
+class FastMarketDataDecoder:
+    """
+    Class to decode the raw Rofex websocket messages ahead of pyRofex.
+    Market data of the known instruments takes a fast path: it is parsed with orjson (when installed),
+    its symbol is mapped to an integer instrument id through a precomputed table, and its levels are handed
+    as (price, size) tuples, skipping the generic pyRofex dispatching and the handler lookups.
+    Any other message (order reports, errors, spot prices) is handed raw to the generic handler.
+    """
+
+    def __init__(self, instrument_ids, market_data_handler, generic_handler=None):
+        """
+        instrument_ids: integer instrument id keyed by symbol, of the instruments taking the fast path
+        market_data_handler: called with (instrument id, bid levels, ask levels, receipt time, message)
+        generic_handler: called with (websocket, raw message) for any other message, i.e. pyRofex on_message
+        """
+        self._instrument_ids = dict(instrument_ids)
+        self._market_data_handler = market_data_handler
+        self._generic_handler = generic_handler
+
+    def set_generic_handler(self, generic_handler):
+        self._generic_handler = generic_handler
+
+    def on_message(self, ws, raw_message):
+        receipt_time = time.perf_counter()
+        try:
+            message = loads(raw_message)
+            instrument_id = (self._instrument_ids.get(message['instrumentId']['symbol'])
+                             if message.get('type') in MARKET_DATA_TYPES else None)
+            if instrument_id is not None:
+                market_data = message['marketData']
+                bid_levels = [(md_entry['price'], md_entry['size']) for md_entry in market_data.get(BIDS) or ()]
+                ask_levels = [(md_entry['price'], md_entry['size']) for md_entry in market_data.get(OFFERS) or ()]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            instrument_id = None
+        if instrument_id is None:
+            #Unknown or malformed messages are parsed again by pyRofex, which reports them.
+            self._generic_handler(ws, raw_message)
+            return
+        self._market_data_handler(instrument_id, bid_levels, ask_levels, receipt_time, message)
@@ -1,33 +1,76 @@
-import copy
-import sys
+import asyncio
 import threading
 import time
+import traceback
 from collections import defaultdict, namedtuple
-from pprint import pprint
+from pprint import pformat
+from types import MappingProxyType
 
 import pyRofex
-import yfinance
 
+import simple_trading_bot.conf.connection as cn
 import simple_trading_bot.lib.pyrofex_wrapper as prw
+from simple_trading_bot.lib.connection_supervisor import ConnectionSupervisor
+from simple_trading_bot.lib.depth_book import DepthBook
+from simple_trading_bot.lib.event_journal import DEBUG, console_journal
+from simple_trading_bot.lib.market_data_decoder import FastMarketDataDecoder
+from simple_trading_bot.lib.spot_sources import YfinanceSpotSource
+from simple_trading_bot.lib.ticker_map import TickerMap
 
 
 FLOAT_LIMIT = 1e-4
 
 
 OrderbookLevel = namedtuple('OrderbookLevel', 'price size')
+#Read-only view of the books at a given update sequence number.
+#bids and asks keep the top of book, while depth keeps the full DepthBook of each ticker.
+#stale keeps the tickers whose books were restored from a checkpoint and not refreshed yet.
+BookSnapshot = namedtuple('BookSnapshot', 'sequence bids asks depth stale',
+                          defaults=(MappingProxyType({}), frozenset()))
+EMPTY_BOOK_SNAPSHOT = BookSnapshot(0, MappingProxyType({}), MappingProxyType({}), MappingProxyType({}))
 
 
 class MarketDataFeed:
 
     def __init__(self):
+        #Timestamps are taken from the performance counter: monotonic and precise enough for latency measurements.
         self._last_update_timestamp = 0.
+        self._last_receipt_time = 0.
+        self._last_update_sequence = 0
         self._running = False
+        self._update_listeners = []
+        self._updated_tickers = set()
+        self._updated_tickers_lock = threading.Lock()
 
     def last_update_timestamp(self):
         return self._last_update_timestamp
 
-    def _update_last_timestamp(self):
-        self._last_update_timestamp = time.time()
+    def last_receipt_time(self):
+        """Performance counter time when the data of the last update was received"""
+        return self._last_receipt_time
+
+    def last_update_sequence(self):
+        return self._last_update_sequence
+
+    def pop_updated_tickers(self):
+        """Returns the tickers updated since last call, and starts tracking a new set"""
+        with self._updated_tickers_lock:
+            updated_tickers, self._updated_tickers = self._updated_tickers, set()
+        return updated_tickers
+
+    def add_update_listener(self, listener):
+        """Registers a callable to be invoked (from the feed thread) every time data is updated"""
+        self._update_listeners.append(listener)
+
+    def _update_last_timestamp(self, updated_tickers=(), receipt_time=None):
+        if updated_tickers:
+            with self._updated_tickers_lock:
+                self._updated_tickers.update(updated_tickers)
+        self._last_update_timestamp = time.perf_counter()
+        self._last_receipt_time = receipt_time or self._last_update_timestamp
+        self._last_update_sequence += 1
+        for listener in self._update_listeners:
+            listener()
 
     def start_listening(self):
         raise NotImplementedError
@@ -35,60 +78,91 @@ class MarketDataFeed:
     def stop(self):
         self._running = False
 
+    async def start_listening_async(self):
+        """Counterpart of start_listening for the asyncio runtime, by default run in the loop executor"""
+        await asyncio.get_running_loop().run_in_executor(None, self.start_listening)
+
+    async def stop_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
     def running(self):
         return self._running
 
 
-class YfinanceMDFeed(MarketDataFeed):
+class SpotMDFeed(MarketDataFeed):
     """
-    Class to retrieve prices from yahoo finance.
-    Data will be refreshed on a configurable regular basis.
+    Class to hold the underliers spot prices.
+    Prices are pushed by a pluggable SpotSource (see spot_sources module), keyed by underlier ticker.
     """
 
-    def __init__(self, instrument_expert, update_frequency):
+    def __init__(self, spot_source, recorder=None, journal=None):
         super().__init__()
-        self._tickers = instrument_expert.tradeable_yfinance_tickers()
-        self._inverse_ticker_map = instrument_expert.inverse_yfinance_tickers_map()
-        self._update_frequency = update_frequency
-        self._listening_thread = None
+        self._spot_source = spot_source
+        self._recorder = recorder
+        self._journal = journal or console_journal()
         self._prices = {}
 
     def start_listening(self):
         """Starts data retrieving"""
-        print('YFinaince MD Feed is starting listening...')
-        self._listening_thread = threading.Thread(target=self._update_prices)
+        print(f'{type(self).__name__} is starting listening...')
+        self._running = True
+        self._spot_source.start(self._process_prices, self._source_error_handler)
+        print('Started')
+
+    def stop(self):
+        super().stop()
+        self._spot_source.stop()
+
+    async def start_listening_async(self):
+        """Starts data retrieving from the event loop, where sources able to (i.e. polling ones) run as tasks"""
+        print(f'{type(self).__name__} is starting listening...')
         self._running = True
-        self._listening_thread.start()
+        await self._spot_source.start_async(self._process_prices, self._source_error_handler)
         print('Started')
 
+    async def stop_async(self):
+        super().stop()
+        await self._spot_source.stop_async()
+
     def last_prices(self):
         return self._prices.copy()
 
     def price(self, ticker):
         return self._prices.get(ticker, 0.)
 
-    def _update_prices(self):
-        """Process retrieved data"""
-        while self._running:
-            try:
-                data = yfinance.download(
-                    tickers=self._tickers,
-                    period='1d',
-                    interval='1d',
-                    progress=False)
-                start = time.time()
-                prices = data['Close'].to_dict(orient='records')[0]
-                #Prices will be updated only on change
-                if any((price - self._prices.get(self._inverse_ticker_map[ticker], 0.) > FLOAT_LIMIT)
-                       for ticker, price in prices.items()):
-                    self._prices = {self._inverse_ticker_map[ticker]: price for ticker, price in prices.items()}
-                    self._update_last_timestamp()
-                    print(f'Updated {self._prices}\n', flush=True)
-                time.sleep(self._update_frequency)
-            except Exception as e:
-                traceback.print_exc()
-                print(f'Exception occurred updating yfinance prices. Stopping YFinance...')
-                self.stop()
+    def _process_prices(self, prices):
+        """Process the prices received, keyed by underlier ticker"""
+        receipt_time = time.perf_counter()
+        if self._recorder:
+            self._recorder.record_spot_prices(prices)
+        #Prices will be updated only on change
+        updated_prices = {ticker: price for ticker, price in prices.items()
+                          if abs(price - self._prices.get(ticker, 0.)) > FLOAT_LIMIT}
+        if updated_prices:
+            self._prices = {**self._prices, **updated_prices}
+            self._update_last_timestamp(updated_prices.keys(), receipt_time)
+            prices = self._prices
+            self._journal.info('spot_prices', lambda: f'Updated {prices}\n', prices=updated_prices)
+
+    def restore_prices(self, prices):
+        """Sets the prices of a checkpoint (see StateCheckpoint), until fresh ones are received"""
+        self._prices = {**self._prices, **prices}
+        self._update_last_timestamp(prices.keys())
+
+    def _source_error_handler(self, e):
+        self._journal.error('spot_error', f'Exception occurred updating spot prices: {e}. '
+                                          f'Stopping {type(self).__name__}...', error=str(e))
+        self.stop()
+
+
+class YfinanceMDFeed(SpotMDFeed):
+    """
+    Class to retrieve prices from yahoo finance.
+    Data will be refreshed on a configurable regular basis.
+    """
+
+    def __init__(self, instrument_expert, update_frequency, recorder=None, journal=None):
+        super().__init__(YfinanceSpotSource(instrument_expert, update_frequency), recorder=recorder, journal=journal)
 
 
 class RofexProxy(MarketDataFeed):
@@ -96,60 +170,132 @@ class RofexProxy(MarketDataFeed):
     Class used as a proxy for rofex.
     Main responsabilities are data retrieving and order placing and tracking.
     Stands on pyRofex package (https://github.com/matbarofex/pyRofex) through PyRofexWrapper class.
+    The websocket is kept alive by a ConnectionSupervisor: errors trigger a reconnection (with backoff)
+    instead of stopping, and books are invalidated (removed from the snapshot) while disconnected,
+    so no rate is computed from stale quotes. Market data is only sent on change, so books silent for
+    stale_quote_timeout seconds are subscribed again to get their snapshot, and only invalidated if it does not come.
+    With fast_decoding, raw websocket messages go through a FastMarketDataDecoder before reaching pyRofex.
     """
     DATA_ENTRIES = [
         pyRofex.MarketDataEntry.BIDS,
         pyRofex.MarketDataEntry.OFFERS]
 
-    def __init__(self, instrument_expert, subscribe_to_order_report=False):
+    def __init__(
+            self,
+            instrument_expert,
+            subscribe_to_order_report=False,
+            market_depth=5,
+            pyrofex_wrapper=None,
+            recorder=None,
+            subscribe_to_market_data=True,
+            book_store=None,
+            journal=None,
+            stale_quote_timeout=cn.STALE_QUOTE_TIMEOUT,
+            fast_decoding=False):
+        """
+        book_store: SharedBookStore where top of books are also written, so other processes can read them
+        fast_decoding: if set, futures market data is decoded ahead of pyRofex (see FastMarketDataDecoder)
+        """
         super().__init__()
         self._futures_ticker = instrument_expert.tradeable_rofex_tickers()
-        self._pyrofex_wrapper = prw.PyRofexWrapper()
-        self._bids = {}
-        self._asks = {}
-        self._bids_lock = threading.Lock()
-        self._asks_lock = threading.Lock()
+        #Integer id of each ticker: its position in the snapshot mappings (see TickerMap).
+        self._ticker_ids = {ticker: ticker_id for ticker_id, ticker in enumerate(self._futures_ticker)}
+        self._market_depth = market_depth
+        self._pyrofex_wrapper = pyrofex_wrapper or prw.PyRofexWrapper()
+        self._recorder = recorder
+        self._book_store = book_store
+        self._journal = journal or console_journal()
+        self._order_report_listeners = []
+        #Books are published as an immutable snapshot with a single reference swap, so readers need neither
+        #locks nor copies. Writers (the websocket and the connection supervisor threads) take the lock.
+        #Its mappings share the books of the tickers not updated with the previous snapshot (see TickerMap).
+        no_books = TickerMap(self._futures_ticker)
+        self._book_snapshot = BookSnapshot(0, no_books, no_books, no_books)
+        self._book_lock = threading.Lock()
+        self._last_receipts = {}
+        #Time the silent books were subscribed again, keyed by ticker.
+        self._refresh_requests = {}
+        self._stale_quote_timeout = stale_quote_timeout
         self._subscribe_to_order_report = subscribe_to_order_report
+        self._old_order_reports = False
+        self._subscribe_to_market_data = subscribe_to_market_data
+        self._websocket_initialized = False
+        self._supervisor = ConnectionSupervisor(
+            self._pyrofex_wrapper.reconnect_websocket,
+            self._pyrofex_wrapper.websocket_connected,
+            on_lost=self._invalidate_all_books,
+            on_check=self._refresh_silent_books,
+            name='Rofex websocket',
+            journal=self._journal)
+        self._market_data_decoder = None
+        if fast_decoding:
+            self._market_data_decoder = FastMarketDataDecoder(self._ticker_ids, self._process_market_data)
 
     def __str__(self):
         repr_str = ''
-        all_tickers = set(self._bids.keys()).union(set(self._asks.keys()))
+        snapshot = self._book_snapshot
+        all_tickers = set(snapshot.bids.keys()).union(set(snapshot.asks.keys()))
         for ticker in all_tickers:
             repr_str += (f'{ticker}: '
-                         f'{self._bids[ticker].get(pyRofex.MarketDataEntry.BIDS.value, "-")}'
-                         f'{self._asks[ticker].get(pyRofex.MarketDataEntry.OFFERS.value, "-")}')
+                         f'{snapshot.bids.get(ticker, "-")} '
+                         f'{snapshot.asks.get(ticker, "-")}\n')
         return repr_str
 
     def start_listening(self):
         """Starts data retrieving"""
         print('Rofex starting listening')
         self._running = True
-        self._pyrofex_wrapper.init_websocket_connection(
-            market_data_handler=self._market_data_handler,
-            order_report_handler=self._order_report_handler,
-            error_handler=self._error_handler,
-            exception_handler=self._exception_handler)
-        self._pyrofex_wrapper.market_data_subscription(
-            tickers=self._futures_ticker,
-            entries=self.DATA_ENTRIES)
-        #Set this True to recieve order updates through websocket
-        if self._subscribe_to_order_report:
-            self._pyrofex_wrapper.order_report_subscription()
+        if self._websocket_initialized:
+            #Started again after being stopped, the supervisor reconnects and resubscribes.
+            self._supervisor.connection_lost()
+        else:
+            #Installed first, as the websocket binds its message handler when connecting.
+            if self._market_data_decoder:
+                self._pyrofex_wrapper.install_websocket_decoder(self._market_data_decoder)
+            self._pyrofex_wrapper.init_websocket_connection(
+                market_data_handler=self._market_data_handler,
+                order_report_handler=self._order_report_handler,
+                error_handler=self._error_handler,
+                exception_handler=self._exception_handler)
+            self._websocket_initialized = True
+            try:
+                self._subscribe()
+            except Exception as e:
+                self._journal.error('rofex_exception', f'Rofex subscription failed: {e}', error=str(e))
+                self._supervisor.connection_lost()
+        self._supervisor.start()
         print('Started')
 
     def stop(self):
         super().stop()
+        self._supervisor.stop()
         self._pyrofex_wrapper.close_websocket_connection_safely()
 
+    def supervisor(self):
+        return self._supervisor
+
+    def market_data_decoder(self):
+        return self._market_data_decoder
+
+    def book_snapshot(self):
+        """Returns a consistent read-only view of both sides of the books"""
+        return self._book_snapshot
+
     def asks(self):
-        with self._asks_lock:
-            copied = copy.deepcopy(self._asks)
-        return copied
+        return self._book_snapshot.asks
 
     def bids(self):
-        with self._bids_lock:
-            copied = copy.deepcopy(self._bids)
-        return copied
+        return self._book_snapshot.bids
+
+    def depth(self):
+        return self._book_snapshot.depth
+
+    def pyrofex_wrapper(self):
+        return self._pyrofex_wrapper
+
+    def add_order_report_listener(self, listener):
+        """Registers a callable to be invoked with every order report received through websocket"""
+        self._order_report_listeners.append(listener)
 
     def place_order(self, *args, **kwargs):
         return self._pyrofex_wrapper.send_order(*args, **kwargs)
@@ -157,42 +303,189 @@ class RofexProxy(MarketDataFeed):
     def get_order_status(self, *args, **kwargs):
         return self._pyrofex_wrapper.get_order_status(*args, **kwargs)
 
+    def rest_latencies(self):
+        """Latency histograms of the rest api endpoints used"""
+        return self._pyrofex_wrapper.rest_latencies()
+
     def order_execution_status(self, order_id):
         return self.get_order_status(order_id)['order']['status']
 
+    def request_old_order_reports(self):
+        """
+        Requests the order reports sent before subscribing too (i.e. when resuming from a checkpoint),
+        so orders sent before starting are tracked. Must be called before start_listening.
+        """
+        self._old_order_reports = True
+
+    def restore_books(self, books):
+        """
+        Publishes the books of a checkpoint (see StateCheckpoint), as (bid levels, ask levels) keyed by ticker.
+        They are marked stale until data is received for them, and refreshed as any other silent book.
+        """
+        books = {ticker: levels for ticker, levels in books.items() if ticker in self._ticker_ids}
+        if not books:
+            return
+        receipt_time = time.perf_counter()
+        with self._book_lock:
+            for ticker, (bid_levels, ask_levels) in books.items():
+                self._last_receipts[ticker] = receipt_time
+                self._update_book(self._ticker_ids[ticker], bid_levels, ask_levels, receipt_time, stale=True)
+        self._journal.info('books_restored', f'Books restored: {sorted(books)}', tickers=sorted(books))
+
     def _market_data_handler(self, message):
         """
         Handles market data messages recieved through websocket
         Parses the data and keeps bid/ask information for each ticker
         """
+        receipt_time = time.perf_counter()
         try:
-            print(f'Rofex Market Data Received {message}\n', flush=True)
-            ticker = message['instrumentId']['symbol']
+            ticker_id = self._ticker_ids.get(message['instrumentId']['symbol'])
+            #Spot prices may be streamed through the same websocket, those are left to their own handler.
+            if ticker_id is None:
+                return
             market_data = message['marketData']
-            if market_data[pyRofex.MarketDataEntry.OFFERS.value]:
-                md_entry = market_data[pyRofex.MarketDataEntry.OFFERS.value][0]
-                with self._asks_lock:
-                    self._asks[ticker] = OrderbookLevel(md_entry['price'], md_entry['size'])
-            if market_data[pyRofex.MarketDataEntry.BIDS.value]:
-                md_entry = market_data[pyRofex.MarketDataEntry.BIDS.value][0]
-                with self._bids_lock:
-                    self._bids[ticker] = OrderbookLevel(md_entry['price'], md_entry['size'])
-            self._update_last_timestamp()
-        except Exception as e:
-            traceback.print_exc()
-            print(f'Exception ocurred during market data handling. Stopping Rofex...')
-            self.stop()
+            bid_levels = [(md_entry['price'], md_entry['size'])
+                          for md_entry in market_data[pyRofex.MarketDataEntry.BIDS.value]]
+            ask_levels = [(md_entry['price'], md_entry['size'])
+                          for md_entry in market_data[pyRofex.MarketDataEntry.OFFERS.value]]
+        except Exception:
+            self._market_data_error()
+            return
+        self._process_market_data(ticker_id, bid_levels, ask_levels, receipt_time, message)
+
+    def _process_market_data(self, ticker_id, bid_levels, ask_levels, receipt_time, message):
+        """Handles the levels of a futures market data message, decoded by pyRofex or the FastMarketDataDecoder"""
+        try:
+            self._last_receipts[self._futures_ticker[ticker_id]] = receipt_time
+            if self._recorder:
+                self._recorder.record_market_data(message)
+            if self._journal.enabled_for(DEBUG):
+                self._journal.debug('market_data', lambda: f'Rofex Market Data Received {message}\n', message=message)
+            with self._book_lock:
+                self._update_book(ticker_id, bid_levels, ask_levels, receipt_time)
+        except Exception:
+            self._market_data_error()
+
+    def _market_data_error(self):
+        self._journal.error('market_data_error', 'Exception ocurred during market data handling. Resyncing...',
+                            error=traceback.format_exc())
+        self._supervisor.connection_lost()
+
+    def _update_book(self, ticker_id, bid_levels, ask_levels, receipt_time, stale=False):
+        """
+        Publishes a new snapshot with the book of the ticker updated, must be called holding the book lock.
+        The ticker is given by id, which indexes its slot in the snapshot mappings straight away.
+        Levels are (price, size) tuples, applied as deltas on a copy of the ladders (see DepthLadder.with_levels),
+        a side without levels is left as it was.
+        Books are no longer stale once updated, unless they are being restored.
+        """
+        snapshot = self._book_snapshot
+        bids, asks, depth = snapshot.bids, snapshot.asks, snapshot.depth
+        ticker = self._futures_ticker[ticker_id]
+        depth_book = depth.get_by_id(ticker_id) or DepthBook()
+        bid_ladder, ask_ladder = depth_book.bids(), depth_book.asks()
+        #Copy on write: only the side which changed gets a new mapping, sharing the books of the other tickers.
+        if ask_levels:
+            ask_ladder = ask_ladder.with_levels(ask_levels)
+            asks = self._with_top_of_book(asks, ticker_id, ask_ladder)
+        if bid_levels:
+            bid_ladder = bid_ladder.with_levels(bid_levels)
+            bids = self._with_top_of_book(bids, ticker_id, bid_ladder)
+        depth = depth.set_by_id(ticker_id, DepthBook(bids=bid_ladder, asks=ask_ladder))
+        stale_tickers = snapshot.stale
+        if stale:
+            stale_tickers = stale_tickers.union((ticker,))
+        elif ticker in stale_tickers:
+            stale_tickers = stale_tickers.difference((ticker,))
+        self._book_snapshot = BookSnapshot(self._last_update_sequence + 1, bids, asks, depth, stale_tickers)
+        if self._book_store:
+            self._book_store.write(ticker, bids.get(ticker), asks.get(ticker))
+        self._update_last_timestamp((ticker,), receipt_time)
+
+    def _invalidate_books(self, tickers):
+        """Removes the books of the tickers from the snapshot, until new data is received for them"""
+        with self._book_lock:
+            snapshot = self._book_snapshot
+            tickers = set(ticker for ticker in tickers
+                          if ticker in snapshot.bids or ticker in snapshot.asks or ticker in snapshot.depth)
+            if not tickers:
+                return
+            self._book_snapshot = BookSnapshot(
+                self._last_update_sequence + 1, snapshot.bids.without(tickers), snapshot.asks.without(tickers),
+                snapshot.depth.without(tickers), snapshot.stale.difference(tickers))
+            if self._book_store:
+                for ticker in tickers:
+                    self._book_store.write(ticker, None, None)
+            self._update_last_timestamp(tickers)
+        self._journal.warning('books_invalidated', f'Books invalidated: {sorted(tickers)}', tickers=sorted(tickers))
+
+    def _invalidate_all_books(self):
+        self._invalidate_books(self._futures_ticker)
+
+    def _refresh_silent_books(self):
+        """
+        Subscribes again the books with no data for stale_quote_timeout seconds, so their snapshot is sent,
+        and invalidates the ones whose snapshot was not received stale_quote_timeout seconds after.
+        """
+        if self._stale_quote_timeout is None:
+            return
+        now = time.perf_counter()
+        stale_time = now - self._stale_quote_timeout
+        snapshot = self._book_snapshot
+        silent_tickers = []
+        unanswered_tickers = []
+        for ticker in set(snapshot.bids).union(snapshot.asks):
+            last_receipt = self._last_receipts.get(ticker, 0.)
+            if last_receipt >= stale_time:
+                continue
+            refresh_time = self._refresh_requests.get(ticker)
+            if refresh_time is None or refresh_time < last_receipt:
+                silent_tickers.append(ticker)
+            elif refresh_time < stale_time:
+                unanswered_tickers.append(ticker)
+        if silent_tickers:
+            for ticker in silent_tickers:
+                self._refresh_requests[ticker] = now
+            try:
+                self._pyrofex_wrapper.refresh_market_data(
+                    tickers=sorted(silent_tickers), entries=self.DATA_ENTRIES, depth=self._market_depth)
+            except Exception as e:
+                self._journal.error('rofex_exception', f'Rofex subscription failed: {e}', error=str(e))
+                self._supervisor.connection_lost()
+        self._invalidate_books(unanswered_tickers)
+
+    def _subscribe(self):
+        #Set this False to only place and track orders (i.e. in the sharded order gateway process)
+        if self._subscribe_to_market_data:
+            self._pyrofex_wrapper.market_data_subscription(
+                tickers=self._futures_ticker,
+                entries=self.DATA_ENTRIES,
+                depth=self._market_depth)
+        #Set this True to recieve order updates through websocket
+        if self._subscribe_to_order_report:
+            self._pyrofex_wrapper.order_report_subscription(snapshot=not self._old_order_reports)
+
+    @staticmethod
+    def _with_top_of_book(levels, ticker_id, ladder):
+        """Returns the TickerMap of top of book levels with the ticker level taken from the ladder"""
+        best_level = ladder.best()
+        if best_level:
+            return levels.set_by_id(ticker_id, OrderbookLevel(*best_level))
+        return levels.remove_by_id(ticker_id)
 
     def _order_report_handler(self, message):
-        print('============ Order Report Message Received ==============')
-        pprint(message)
-        print('=========================================================')
-        sys.stdout.flush()
+        for listener in self._order_report_listeners:
+            listener(message)
+        self._journal.info('order_report', lambda: '\n'.join([
+            '============ Order Report Message Received ==============',
+            pformat(message),
+            '=========================================================']), message=message)
 
     def _error_handler(self, message):
-        print(f'Rofex Error Message Received: {message}')
-        self.stop()
+        self._journal.error('rofex_error', f'Rofex Error Message Received: {message}. Reconnecting...',
+                            message=message)
+        self._supervisor.connection_lost()
 
     def _exception_handler(self, e):
-        print(f'Rofex Exception Occurred: {message}')
-        self.stop()
+        self._journal.error('rofex_exception', f'Rofex Exception Occurred: {e}. Reconnecting...', error=str(e))
+        self._supervisor.connection_lost()
@@ -0,0 +1,53 @@
+import gzip
+import json
+import threading
+import time
+
+
+class MarketDataRecorder:
+    """
+    Class to capture the raw data received by the feeds into a compact on disk log.
+    Each record is a gzipped JSON line holding [elapsed seconds, record kind, payload],
+    so a session can be replayed offline either as fast as possible or at the recorded pace.
+    """
+    REFERENCE_DATA = 'ref'
+    MARKET_DATA = 'md'
+    SPOT_PRICES = 'spot'
+
+    def __init__(self, path):
+        self._path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        #Records come from both the websocket and the spot feed threads.
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+
+    def path(self):
+        return self._path
+
+    def record_reference_data(self, rest_instruments):
+        self._record(self.REFERENCE_DATA, rest_instruments)
+
+    def record_market_data(self, message):
+        self._record(self.MARKET_DATA, message)
+
+    def record_spot_prices(self, prices):
+        self._record(self.SPOT_PRICES, prices)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _record(self, kind, payload):
+        line = json.dumps([time.monotonic() - self._start_time, kind, payload], separators=(',', ':'))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + '\n')
+
+
+def read_records(path):
+    """Yields the (elapsed seconds, record kind, payload) records stored by a MarketDataRecorder"""
+    with gzip.open(path, 'rt', encoding='utf-8') as records_file:
+        for line in records_file:
+            elapsed, kind, payload = json.loads(line)
+            yield elapsed, kind, payload
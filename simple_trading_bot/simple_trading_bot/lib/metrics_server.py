@@ -0,0 +1,98 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import simple_trading_bot.conf.metrics as mt
+
+
+class MetricsRegistry:
+    """
+    Class to gather the latency histograms of the hot path stages (tick to detection, rates update,
+    tick to decision, tick to order ack, ...) and render them in the Prometheus text format,
+    as a summary labeled by stage. Histograms are registered through sources, callables returning them,
+    so the ones created on demand (i.e. rest api endpoints) are picked up too.
+    """
+    METRIC_NAME = 'simple_trading_bot_latency_seconds'
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self):
+        self._sources = []
+
+    def register(self, *histograms):
+        self._sources.append(lambda: histograms)
+
+    def register_source(self, source):
+        self._sources.append(source)
+
+    def histograms(self):
+        return [histogram for source in self._sources for histogram in source()]
+
+    def render(self):
+        lines = [f'# HELP {self.METRIC_NAME} Latency of the trading bot hot path stages.',
+                 f'# TYPE {self.METRIC_NAME} summary']
+        for histogram in self.histograms():
+            stage = self.stage(histogram)
+            for quantile in self.QUANTILES:
+                lines.append(f'{self.METRIC_NAME}{{stage="{stage}",quantile="{quantile}"}} '
+                             f'{histogram.percentile(quantile * 100):.9f}')
+            lines.append(f'{self.METRIC_NAME}_sum{{stage="{stage}"}} {histogram.total():.9f}')
+            lines.append(f'{self.METRIC_NAME}_count{{stage="{stage}"}} {histogram.count()}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def stage(histogram):
+        """Label of the histogram, i.e. tick_to_detection for 'Tick to detection'"""
+        return re.sub('[^a-z0-9]+', '_', histogram.name().lower()).strip('_')
+
+
+class MetricsServer:
+    """
+    Class to serve the metrics of a MetricsRegistry through a local HTTP endpoint, from a background thread.
+    """
+
+    def __init__(self, registry, port, host=mt.METRICS_HOST):
+        """port: 0 to bind any free port (see port)"""
+        self._registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{mt.METRICS_PATH}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def _handler_class(self):
+        registry = self._registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != mt.METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                #Scrapes are not worth a line each.
+                pass
+
+        return MetricsHandler
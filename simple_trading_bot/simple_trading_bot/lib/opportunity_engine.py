@@ -0,0 +1,101 @@
+import datetime as dt
+import itertools
+from collections import defaultdict, namedtuple
+
+import simple_trading_bot.conf.funding_rates as fr
+import simple_trading_bot.conf.transaction_costs as tc
+from simple_trading_bot.lib.rate_heap import RateHeap
+
+#Buy the future with the offered rate and sell the one with the taker rate, which may mature on different dates.
+#excess is the profit beyond the transaction cost, in annualized rate times days.
+CrossTenorOpportunity = namedtuple(
+    'CrossTenorOpportunity', 'ticker_to_buy offered_rate buy_days ticker_to_sell taker_rate sell_days excess')
+
+
+class OpportunityEngine:
+    """
+    Class to find arbitrage opportunities across tenors, including futures with mismatched maturity dates.
+    Buying a future against its underlier borrows cash at the offered rate until its maturity,
+    and selling one lends cash at the taker rate until its own maturity, so the gap between both dates
+    is bridged at a funding rate. The profit of a pair, in annualized rate times days, is
+        T_sell * (taker_rate - funding_rate) - T_buy * (offered_rate - funding_rate)
+    which is separable: each future gets a score on its own, kept in heaps by exact maturity date.
+    The maturity dates graph is built once, so the best pair is found by checking the top of the heaps
+    of every pair of dates, regardless of the number of futures. Pairs on the same date are left to Trader.
+    """
+
+    def __init__(self, instrument_expert, ir_expert, funding_rate=fr.FUNDING_RATE,
+                 transaction_cost=tc.TRANSACITON_COST, clock=dt.date.today):
+        """clock: callable returning the current date, which days to maturity are counted from (see IRExpert)"""
+        self._ir_expert = ir_expert
+        self._clock = clock
+        self._funding_rate = funding_rate
+        self._transaction_cost = transaction_cost
+        self._maturity_dates = {future.ticker(): future.maturity_date().date()
+                                for future in instrument_expert.tradeable_rofex_instruments()}
+        self._tickers_by_date = defaultdict(list)
+        for ticker, maturity_date in self._maturity_dates.items():
+            self._tickers_by_date[maturity_date].append(ticker)
+        #Graph edges: every (buy date, sell date) pair of different dates.
+        self._edges = list(itertools.permutations(sorted(self._tickers_by_date), 2))
+        self._taker_scores = defaultdict(lambda: RateHeap(reverse=True))
+        self._offered_scores = defaultdict(RateHeap)
+        self._days_by_date = {}
+        self._days_date = None
+
+    def funding_rate(self):
+        return self._funding_rate
+
+    def maturity_dates(self):
+        return sorted(self._tickers_by_date)
+
+    def update(self):
+        """Refreshes the scores of the futures whose rates were updated by the last IRExpert update"""
+        updated_tickers = self._ir_expert.last_updated_tickers()
+        today = self._clock()
+        if today != self._days_date:
+            #Days to maturity changed, so does every score.
+            self._days_date = today
+            self._days_by_date = {}
+            updated_tickers = self._maturity_dates.keys()
+        for ticker in updated_tickers:
+            maturity_date = self._maturity_dates.get(ticker)
+            if maturity_date is None:
+                continue
+            if maturity_date <= today:
+                self._taker_scores[maturity_date].remove(ticker)
+                self._offered_scores[maturity_date].remove(ticker)
+                continue
+            days = self._days(maturity_date, ticker)
+            self._update_score(self._taker_scores[maturity_date], ticker, self._ir_expert.taker_rate(ticker), days)
+            self._update_score(self._offered_scores[maturity_date], ticker, self._ir_expert.offered_rate(ticker), days)
+
+    def best_opportunity(self):
+        """Returns the most profitable CrossTenorOpportunity beyond the transaction cost, or None"""
+        best = None
+        for buy_date, sell_date in self._edges:
+            offered = self._offered_scores[buy_date].best()
+            taker = self._taker_scores[sell_date].best()
+            if offered is None or taker is None:
+                continue
+            buy_days = self._days_by_date[buy_date]
+            sell_days = self._days_by_date[sell_date]
+            #Transaction cost is paid along the longest leg.
+            excess = taker[1] - offered[1] - self._transaction_cost * max(buy_days, sell_days)
+            if excess > 0 and (best is None or excess > best.excess):
+                ticker_to_buy, ticker_to_sell = offered[0], taker[0]
+                best = CrossTenorOpportunity(
+                    ticker_to_buy, self._ir_expert.offered_rate(ticker_to_buy), buy_days,
+                    ticker_to_sell, self._ir_expert.taker_rate(ticker_to_sell), sell_days, excess)
+        return best
+
+    def _days(self, maturity_date, ticker):
+        if maturity_date not in self._days_by_date:
+            self._days_by_date[maturity_date] = self._ir_expert.days_to_maturity(ticker)
+        return self._days_by_date[maturity_date]
+
+    def _update_score(self, scores, ticker, rate, days):
+        if rate is None:
+            scores.remove(ticker)
+        else:
+            scores.update(ticker, days * (rate - self._funding_rate))
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+
+
+class OrderStatuses:
+    """
+    Class to hold the last execution status of the orders sent, keyed by client id.
+    Only the statuses of the last max_orders orders are kept, the oldest ones being dropped first,
+    so a long running session does not pile up the statuses of every order it ever sent.
+    """
+    MAX_ORDERS = 10000
+
+    def __init__(self, max_orders=MAX_ORDERS):
+        self._max_orders = max_orders
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._statuses)
+
+    def get(self, client_id):
+        return self._statuses.get(client_id)
+
+    def set(self, client_id, status):
+        with self._lock:
+            self._statuses[client_id] = status
+            self._drop_oldest()
+
+    def setdefault(self, client_id, status):
+        with self._lock:
+            self._statuses.setdefault(client_id, status)
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        while len(self._statuses) > self._max_orders:
+            self._statuses.popitem(last=False)
+
+
+class OrderGateway:
+    """
+    Class to place orders without blocking the decision thread.
+    Orders are sent concurrently through a worker pool returning futures,
+    and their execution is tracked through the order report websocket stream (no REST polling).
+    If a risk engine is set, orders are checked against it before being sent.
+    """
+    PENDING_STATUS = 'PENDING_REPORT'
+
+    def __init__(self, rofex_proxy, max_workers=4, risk_engine=None):
+        self._rofex_proxy = rofex_proxy
+        self._risk_engine = risk_engine
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='OrderGateway')
+        self._order_status = OrderStatuses()
+        self._pending_futures = set()
+        self._lock = threading.Lock()
+        self._ack_latency = LatencyHistogram('Order ack')
+        self._leg_skew = LatencyHistogram('Leg to leg send skew')
+        self._tick_to_order = LatencyHistogram('Tick to order ack')
+        self._rofex_proxy.add_order_report_listener(self._order_report_handler)
+
+    def send_orders(self, *orders, on_all_done=None, tick_time=None):
+        """
+        Sends every order (given as place_order keyword arguments) concurrently.
+        Returns a future for each order, resolving to the exchange order reception info.
+        If provided, on_all_done is called (from a worker thread) with the futures once every order is done.
+        tick_time: performance counter time when the data which triggered the orders was received
+        Raises RiskLimitBreached, with no order sent, if any of them does not pass the risk checks.
+        """
+        if self._risk_engine:
+            self._risk_engine.check_orders(*orders)
+        send_times = [None] * len(orders)
+        futures = [self._executor.submit(self._send_order, order, send_times, index, tick_time)
+                   for index, order in enumerate(orders)]
+        with self._lock:
+            self._pending_futures.update(futures)
+        remaining_legs = [len(futures)]
+
+        def on_leg_done(future):
+            with self._lock:
+                self._pending_futures.discard(future)
+                remaining_legs[0] -= 1
+                all_legs_done = remaining_legs[0] == 0
+            #Skew is measured once every leg has gone out.
+            if not all_legs_done:
+                return
+            if len(send_times) > 1 and None not in send_times:
+                self._leg_skew.record(max(send_times) - min(send_times))
+            if on_all_done:
+                on_all_done(futures)
+
+        for future in futures:
+            future.add_done_callback(on_leg_done)
+        return futures
+
+    def order_status(self, client_id):
+        """Last execution status reported for the order, if any"""
+        return self._order_status.get(client_id)
+
+    def order_info(self, future):
+        """Reception info of a done order, along with its last execution status"""
+        if future.exception():
+            return f'Order failed: {future.exception()}', None
+        order_info = future.result()
+        return order_info, self.order_status(order_info.get('order', {}).get('clientId'))
+
+    def wait_for_pending(self, timeout=None):
+        """Blocks until every order sent has been acknowledged or the timeout expires"""
+        with self._lock:
+            pending_futures = list(self._pending_futures)
+        wait(pending_futures, timeout=timeout)
+
+    async def wait_for_pending_async(self, timeout=None):
+        """Counterpart of wait_for_pending for the asyncio runtime, the event loop keeps running meanwhile"""
+        with self._lock:
+            pending_futures = [asyncio.wrap_future(future) for future in self._pending_futures]
+        if pending_futures:
+            await asyncio.wait(pending_futures, timeout=timeout)
+
+    def risk_engine(self):
+        return self._risk_engine
+
+    def ack_latency(self):
+        return self._ack_latency
+
+    def leg_skew(self):
+        return self._leg_skew
+
+    def tick_to_order(self):
+        return self._tick_to_order
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _send_order(self, order, send_times, index, tick_time=None):
+        send_times[index] = time.perf_counter()
+        try:
+            order_info = self._rofex_proxy.place_order(**order)
+        except Exception:
+            if self._risk_engine:
+                self._risk_engine.release_order(order)
+            raise
+        ack_time = time.perf_counter()
+        self._ack_latency.record(ack_time - send_times[index])
+        if tick_time:
+            self._tick_to_order.record(ack_time - tick_time)
+        client_id = order_info.get('order', {}).get('clientId')
+        if client_id is not None:
+            self._order_status.setdefault(client_id, self.PENDING_STATUS)
+        if self._risk_engine:
+            if client_id is not None:
+                self._risk_engine.order_sent(client_id, order)
+            else:
+                self._risk_engine.release_order(order)
+        return order_info
+
+    def _order_report_handler(self, message):
+        order_report = message.get('orderReport', {})
+        client_id = order_report.get('clOrdId')
+        if client_id is not None:
+            self._order_status.set(client_id, order_report.get('status'))
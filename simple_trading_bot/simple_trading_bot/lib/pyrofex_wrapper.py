@@ -1,12 +1,17 @@
 import pyRofex
+from pyRofex.components import globals as pyrofex_globals
 
 import simple_trading_bot.conf.remarkets_api_creds as rac
+from simple_trading_bot.lib.rofex_rest_session import RofexRestSession
 from simple_trading_bot.lib.singleton_metaclass import SingletonMetaClass
 
 
 class PyRofexWrapper:
     """
     Class to ensure one and only one instance of pyRofex is initialized.
+    Orders and instruments rest calls go through a pooled keep-alive RofexRestSession,
+    anything else is forwarded to pyRofex.
+    Websocket subscriptions are remembered, so they are all sent again when reconnecting.
     """
     __metaclass__ = SingletonMetaClass
 
@@ -22,6 +27,15 @@ class PyRofexWrapper:
             password=password,
             account=account,
             environment=self._environment)
+        self._environment_config = pyrofex_globals.environment_config[self._environment]
+        self._rest_session = RofexRestSession(
+            self._environment_config['url'],
+            token=self._environment_config['token'],
+            token_refresher=self._refresh_token,
+            verify=self._environment_config['ssl'],
+            proxies=self._environment_config['proxies'])
+        self._market_data_subscriptions = []
+        self._order_report_subscribed = False
 
     def __del__(self):
         self.close_websocket_connection_safely()
@@ -29,8 +43,68 @@ class PyRofexWrapper:
     def __getattr__(self, attribute):
         return getattr(pyRofex, attribute)
 
+    def send_order(self, ticker, size, order_type, side, market=pyRofex.Market.ROFEX, account=None, **kwargs):
+        return self._rest_session.send_order(
+            ticker, size, order_type, side, account or self._environment_config['account'], market, **kwargs)
+
+    def get_order_status(self, client_order_id, proprietary=None):
+        return self._rest_session.get_order_status(
+            client_order_id, proprietary or self._environment_config['proprietary'])
+
+    def get_detailed_instruments(self):
+        return self._rest_session.get_detailed_instruments()
+
+    def rest_latencies(self):
+        return self._rest_session.latencies()
+
+    def market_data_subscription(self, tickers, entries, depth=1, **kwargs):
+        pyRofex.market_data_subscription(tickers=tickers, entries=entries, depth=depth, **kwargs)
+        self._market_data_subscriptions.append(dict(tickers=list(tickers), entries=entries, depth=depth, **kwargs))
+
+    def refresh_market_data(self, tickers, entries, depth=1, **kwargs):
+        """Subscribes the tickers again so their snapshot is sent, without recording it for reconnections"""
+        pyRofex.market_data_subscription(tickers=tickers, entries=entries, depth=depth, **kwargs)
+
+    def order_report_subscription(self, **kwargs):
+        pyRofex.order_report_subscription(**kwargs)
+        self._order_report_subscribed = True
+
+    def install_websocket_decoder(self, decoder):
+        """
+        Routes the raw websocket messages through decoder.on_message(ws, message) ahead of pyRofex,
+        which gets the messages the decoder does not handle. Must be called before connecting.
+        """
+        ws_client = self._environment_config['ws_client']
+        decoder.set_generic_handler(ws_client.on_message)
+        ws_client.on_message = decoder.on_message
+
+    def websocket_connected(self):
+        ws_client = self._environment_config.get('ws_client')
+        return bool(ws_client and ws_client.is_connected())
+
+    def reconnect_websocket(self):
+        """
+        Opens the websocket again, keeping the handlers it was initialized with (initializing it again would
+        add them twice), and sends every subscription made so far, back to back.
+        Order reports are requested including the old ones, so those missed while disconnected are received.
+        Returns whether it is connected, raising if any subscription fails.
+        """
+        self.close_websocket_connection_safely()
+        self._environment_config['ws_client'].connect()
+        if not self.websocket_connected():
+            return False
+        for subscription in self._market_data_subscriptions:
+            pyRofex.market_data_subscription(**subscription)
+        if self._order_report_subscribed:
+            pyRofex.order_report_subscription(snapshot=False)
+        return True
+
     def close_websocket_connection_safely(self):
         try:
             pyRofex.close_websocket_connection(self._environment)
         except AttributeError:
             pass
+
+    def _refresh_token(self):
+        self._environment_config['rest_client'].update_token()
+        return self._environment_config['token']
@@ -0,0 +1,75 @@
+import heapq
+
+
+class RateHeap:
+    """
+    Class to keep the rates of a set of tickers ordered by value.
+    Updates are O(log n) and the best rate is retrieved in O(1) amortized time.
+    Outdated heap entries are discarded lazily when they reach the top.
+    Rates can also be walked in order, i.e. to get the k best ones.
+    """
+    #Heap is rebuilt when stale entries outnumber live ones by this factor.
+    COMPACTION_FACTOR = 4
+
+    def __init__(self, reverse=False):
+        self._sign = -1. if reverse else 1.
+        self._heap = []
+        self._rates = {}
+
+    def __len__(self):
+        return len(self._rates)
+
+    def __contains__(self, ticker):
+        return ticker in self._rates
+
+    def update(self, ticker, rate):
+        if self._rates.get(ticker) == rate:
+            return
+        self._rates[ticker] = rate
+        heapq.heappush(self._heap, (self._sign * rate, ticker))
+        if len(self._heap) > self.COMPACTION_FACTOR * (len(self._rates) + 1):
+            self._compact()
+
+    def remove(self, ticker):
+        self._rates.pop(ticker, None)
+
+    def rate(self, ticker):
+        return self._rates.get(ticker)
+
+    def rates(self):
+        return self._rates.copy()
+
+    def best(self):
+        """Returns the (ticker, rate) pair with the min rate (max if reversed), or None if empty"""
+        while self._heap:
+            key, ticker = self._heap[0]
+            rate = self._rates.get(ticker)
+            if rate is not None and self._sign * rate == key:
+                return ticker, rate
+            heapq.heappop(self._heap)
+        return None
+
+    def ranked(self):
+        """
+        Yields the (ticker, rate) pairs from best to worst.
+        The heap is walked from the top, through a frontier of the entries which may come next,
+        so getting the first k pairs is O(k log k) (plus the stale entries found) instead of sorting every rate.
+        The heap must not be updated while iterating.
+        """
+        heap = self._heap
+        frontier = [(heap[0], 0)] if heap else []
+        yielded_tickers = set()
+        while frontier:
+            (key, ticker), index = heapq.heappop(frontier)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+            rate = self._rates.get(ticker)
+            if rate is None or self._sign * rate != key or ticker in yielded_tickers:
+                continue
+            yielded_tickers.add(ticker)
+            yield ticker, rate
+
+    def _compact(self):
+        self._heap = [(self._sign * rate, ticker) for ticker, rate in self._rates.items()]
+        heapq.heapify(self._heap)
@@ -0,0 +1,56 @@
+import datetime as dt
+import json
+import os
+import time
+
+
+class ReferenceDataCache:
+    """
+    Class to persist the instruments reference data on disk, so restarts do not need to download it again.
+    A cached snapshot is only used if it has the current version, it has not outlived its TTL,
+    it was taken on the current trading date and it covers every ticker requested.
+    """
+    VERSION = 1
+
+    def __init__(self, path, ttl):
+        self._path = path
+        self._ttl = ttl
+
+    def path(self):
+        return self._path
+
+    def load(self, tickers):
+        """Returns the cached instruments, in the rest api detailed instruments format, or None if not valid"""
+        try:
+            with open(self._path, encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if (cached.get('version') != self.VERSION
+                or time.time() - cached.get('created', 0.) > self._ttl
+                or cached.get('trading_date') != dt.date.today().isoformat()
+                or not set(tickers).issubset(cached.get('tickers', []))):
+            return None
+        return {'instruments': cached['instruments']}
+
+    def store(self, tickers, rest_instruments):
+        cached = {
+            'version': self.VERSION,
+            'created': time.time(),
+            'trading_date': dt.date.today().isoformat(),
+            'tickers': sorted(tickers),
+            'instruments': rest_instruments['instruments']}
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        #Written aside and then moved, so a crash while writing never leaves a corrupt cache behind.
+        temporary_path = f'{self._path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(cached, cache_file, separators=(',', ':'))
+        os.replace(temporary_path, self._path)
+
+    def invalidate(self):
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,246 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from simple_trading_bot.lib.instrument_expert import InstrumentExpert
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+from simple_trading_bot.lib.market_data_feeds import RofexProxy, YfinanceMDFeed
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder, read_records
+from simple_trading_bot.lib.trading_bot import IRArbitrageTradingBot
+
+
+class StubPyRofexWrapper:
+    """
+    Class standing in for PyRofexWrapper when replaying.
+    There is no connectivity at all, and every order sent is reported as filled.
+    """
+
+    def __init__(self):
+        self._sent_orders = []
+
+    def sent_orders(self):
+        return list(self._sent_orders)
+
+    def init_websocket_connection(self, *args, **kwargs):
+        pass
+
+    def market_data_subscription(self, *args, **kwargs):
+        pass
+
+    def refresh_market_data(self, *args, **kwargs):
+        pass
+
+    def order_report_subscription(self, *args, **kwargs):
+        pass
+
+    def close_websocket_connection_safely(self):
+        pass
+
+    def install_websocket_decoder(self, decoder):
+        pass
+
+    def websocket_connected(self):
+        return True
+
+    def reconnect_websocket(self):
+        return True
+
+    def send_order(self, **kwargs):
+        self._sent_orders.append(kwargs)
+        return {'status': 'OK', 'order': {'clientId': str(len(self._sent_orders)), 'proprietary': 'STUB'}}
+
+    def get_order_status(self, client_order_id, proprietary=None):
+        return {'status': 'OK', 'order': {'clientId': client_order_id, 'status': 'FILLED'}}
+
+    def rest_latencies(self):
+        return []
+
+
+class ReplayRofexProxy(RofexProxy):
+    """
+    RofexProxy fed with recorded market data messages instead of the websocket.
+    """
+
+    def __init__(self, instrument_expert, pyrofex_wrapper, journal=None):
+        super().__init__(instrument_expert, pyrofex_wrapper=pyrofex_wrapper, journal=journal)
+
+    def start_listening(self):
+        self._running = True
+
+    def place_order(self, *args, **kwargs):
+        #Stub orders are filled at once, which is reported as the exchange would do through websocket.
+        order_info = super().place_order(*args, **kwargs)
+        self._order_report_handler(
+            {'type': 'or', 'orderReport': {'clOrdId': order_info['order']['clientId'], 'status': 'FILLED'}})
+        return order_info
+
+    def replay(self, message):
+        self._market_data_handler(message)
+
+
+class ReplayYfinanceMDFeed(YfinanceMDFeed):
+    """
+    YfinanceMDFeed fed with recorded spot prices instead of downloading them.
+    """
+
+    def __init__(self, instrument_expert, journal=None):
+        super().__init__(instrument_expert, update_frequency=0., journal=journal)
+        self._inverse_ticker_map = instrument_expert.inverse_yfinance_tickers_map()
+
+    def start_listening(self):
+        self._running = True
+
+    async def start_listening_async(self):
+        self.start_listening()
+
+    def replay(self, prices):
+        #Older sessions were recorded keyed by yfinance ticker.
+        self._process_prices({self._inverse_ticker_map.get(ticker, ticker): price for ticker, price in prices.items()})
+
+
+class ReplayTradingBot(IRArbitrageTradingBot):
+    """
+    IRArbitrageTradingBot running against a session recorded by MarketDataRecorder and a stub order gateway.
+    When launched, records are replayed from a background thread, either as fast as possible (pace=None)
+    or at the recorded pace multiplied by a speed factor, and the bot stops once every record is processed.
+    """
+
+    def __init__(self, tickers, record_path, pace=None, **kwargs):
+        self._record_path = record_path
+        self._pace = pace
+        self._pyrofex_wrapper = StubPyRofexWrapper()
+        self._replay_thread = None
+        super().__init__(tickers, spot_update_frequency=0., **kwargs)
+
+    def sent_orders(self):
+        return self._pyrofex_wrapper.sent_orders()
+
+    def replay_record(self, kind, payload):
+        """Dispatches a single record to the feed it belongs to"""
+        if kind == MarketDataRecorder.MARKET_DATA:
+            self._rofex_proxy.replay(payload)
+        elif kind == MarketDataRecorder.SPOT_PRICES:
+            self._yfinance_md_feed.replay(payload)
+
+    def _create_instrument_expert(self, tickers):
+        for _, kind, payload in read_records(self._record_path):
+            if kind == MarketDataRecorder.REFERENCE_DATA:
+                return InstrumentExpert(tickers, rest_instruments=payload, cross_tenor=self._cross_tenor)
+        raise ValueError(f'No reference data found in {self._record_path}')
+
+    def _create_rofex_proxy(self):
+        return ReplayRofexProxy(self._instrument_expert, self._pyrofex_wrapper, journal=self._journal)
+
+    def _create_yfinance_md_feed(self, spot_update_frequency):
+        return ReplayYfinanceMDFeed(self._instrument_expert, journal=self._journal)
+
+    def _start(self):
+        super()._start()
+        self._start_replay()
+
+    async def _start_async(self):
+        await super()._start_async()
+        self._start_replay()
+
+    def _start_replay(self):
+        self._replay_thread = threading.Thread(target=self._replay_records)
+        self._replay_thread.start()
+
+    def _replay_records(self):
+        start_time = time.monotonic()
+        for elapsed, kind, payload in read_records(self._record_path):
+            if self._pace:
+                delay = elapsed / self._pace - (time.monotonic() - start_time)
+                if delay > 0:
+                    time.sleep(delay)
+            self.replay_record(kind, payload)
+        #Let the trading loop process the last updates before finishing.
+        while self._keep_running and self._data_update_watchman.should_update():
+            time.sleep(0.001)
+        self.stop()
+
+
+class ReplayReport:
+    """
+    Class to hold the results of a replay benchmark
+    """
+
+    def __init__(self, messages, elapsed, tick_latency, orders, allocated_blocks, peak_bytes):
+        self.messages = messages
+        self.elapsed = elapsed
+        self.tick_latency = tick_latency
+        self.orders = orders
+        self.allocated_blocks = allocated_blocks
+        self.peak_bytes = peak_bytes
+
+    def __str__(self):
+        lines = [
+            f'Messages replayed:       {self.messages}',
+            f'Elapsed:                 {self.elapsed:.3f}s',
+            f'Throughput:              {self.messages_per_second():.1f} msg/s',
+            f'Tick to decision:        {self.tick_latency}',
+            f'Tick to decision p90:    {self.tick_latency.percentile(90) * 1e6:.1f}us',
+            f'Orders sent:             {self.orders}',
+            f'Net blocks per tick:     {self.allocated_blocks:.1f}']
+        if self.peak_bytes is not None:
+            lines.append(f'Peak bytes per tick:     {self.peak_bytes:.1f}')
+        return '\n'.join(lines)
+
+    def messages_per_second(self):
+        return self.messages / self.elapsed if self.elapsed else 0.
+
+
+class ReplayBenchmark:
+    """
+    Class to benchmark the IRExpert/Trader hot path over a recorded session.
+    Every record is processed synchronously, so the tick to decision latency does not include any waiting.
+    Output printed by the bot is discarded, and allocations can be traced (at a noticeable slowdown).
+    """
+
+    def __init__(self, record_path, tickers, vectorized_rates=False, trace_allocations=False):
+        self._record_path = record_path
+        self._tickers = tickers
+        self._vectorized_rates = vectorized_rates
+        self._trace_allocations = trace_allocations
+
+    def run(self):
+        records = [(kind, payload) for _, kind, payload in read_records(self._record_path)
+                   if kind != MarketDataRecorder.REFERENCE_DATA]
+        tick_latency = LatencyHistogram('Tick to decision')
+        allocated_blocks = 0
+        peak_bytes = 0
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            bot = ReplayTradingBot(self._tickers, self._record_path, vectorized_rates=self._vectorized_rates,
+                                   console_level=None)
+            if self._trace_allocations:
+                tracemalloc.start()
+            start = time.perf_counter()
+            for kind, payload in records:
+                if self._trace_allocations:
+                    tracemalloc.reset_peak()
+                    traced_before, _ = tracemalloc.get_traced_memory()
+                blocks_before = sys.getallocatedblocks()
+                tick_time = time.perf_counter()
+                bot.replay_record(kind, payload)
+                bot.process_update()
+                tick_latency.record(time.perf_counter() - tick_time)
+                allocated_blocks += sys.getallocatedblocks() - blocks_before
+                if self._trace_allocations:
+                    _, traced_peak = tracemalloc.get_traced_memory()
+                    peak_bytes += traced_peak - traced_before
+            elapsed = time.perf_counter() - start
+            if self._trace_allocations:
+                tracemalloc.stop()
+            #Orders are sent asynchronously, out of the decision path.
+            bot.order_gateway().shutdown()
+        ticks = max(len(records), 1)
+        return ReplayReport(
+            messages=len(records),
+            elapsed=elapsed,
+            tick_latency=tick_latency,
+            orders=len(bot.sent_orders()),
+            allocated_blocks=allocated_blocks / ticks,
+            peak_bytes=peak_bytes / ticks if self._trace_allocations else None)
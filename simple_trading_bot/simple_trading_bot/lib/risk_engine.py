@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import defaultdict
+
+import pyRofex
+
+import simple_trading_bot.conf.risk_limits as rl
+import simple_trading_bot.lib.exceptions as exc
+
+
+class _OrderState:
+    """Fills seen for an order, and its size once it is known to be reserved (see RiskEngine.order_sent)"""
+    __slots__ = ('ticker', 'sign', 'size', 'filled', 'done')
+
+    def __init__(self, ticker, sign, size=None):
+        self.ticker = ticker
+        self.sign = sign
+        self.size = size
+        self.filled = 0
+        self.done = False
+
+
+class RiskEngine:
+    """
+    Class to keep the running positions out of the order reports, and run the pre-trade risk checks.
+    Positions are kept per future (in contracts), per underlier (in underlier units) and per maturity
+    (cash exposure at the traded prices), updated on every fill.
+    Checks are constant time, so they run on the decision path: max order notional, max position of each future
+    (counting the orders in flight) and max order rate, through a token bucket.
+    Accepted orders are reserved until they are filled or done, so back to back rounds can not breach the limits
+    while their reports are on the way.
+    Settled orders are remembered with their final cumulative quantity, so their reports, replayed when the websocket
+    reconnects, are not counted again.
+    """
+    SIGNS = {pyRofex.Side.BUY: 1, pyRofex.Side.SELL: -1, 'BUY': 1, 'SELL': -1}
+    TERMINAL_STATUSES = frozenset(('FILLED', 'CANCELLED', 'REJECTED', 'EXPIRED'))
+
+    def __init__(
+            self,
+            instrument_expert,
+            rofex_proxy,
+            spot_feed=None,
+            max_order_notional=rl.MAX_ORDER_NOTIONAL,
+            max_position=rl.MAX_POSITION,
+            max_orders_per_second=rl.MAX_ORDERS_PER_SECOND,
+            order_burst=rl.ORDER_BURST):
+        """spot_feed: feed of the underliers spot prices, needed for the net delta only"""
+        self._futures_by_ticker = instrument_expert.rofex_instruments_by_ticker()
+        self._maturities_by_ticker = {future.ticker(): maturity_tag
+                                      for maturity_tag, futures in instrument_expert.rofex_instruments_by_maturity().items()
+                                      for future in futures}
+        self._spot_feed = spot_feed
+        self._max_order_notional = max_order_notional
+        self._max_position = max_position
+        self._max_orders_per_second = max_orders_per_second
+        self._order_burst = order_burst
+        self._positions = defaultdict(int)
+        #Signed size of the accepted orders not filled nor done yet.
+        self._reserved = defaultdict(int)
+        self._underlier_positions = defaultdict(float)
+        self._maturity_exposures = defaultdict(float)
+        self._orders = {}
+        #Final cumulative quantity of the orders done, keyed by client id.
+        self._settled = {}
+        self._tokens = float(order_burst)
+        self._last_refill = time.monotonic()
+        #Checks run on the trading thread and reports are handled on the websocket one.
+        self._lock = threading.Lock()
+        rofex_proxy.add_order_report_listener(self._order_report_handler)
+
+    def check_orders(self, *orders):
+        """
+        Runs the pre-trade checks on the orders (given as place_order keyword arguments),
+        either all of them are accepted, and reserved, or RiskLimitBreached is raised.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._tokens + (now - self._last_refill) * self._max_orders_per_second,
+                               self._order_burst)
+            self._last_refill = now
+            if self._tokens < len(orders):
+                raise exc.RiskLimitBreached(f'order rate above {self._max_orders_per_second} orders per second')
+            #Orders on the same future add up.
+            positions = {}
+            for order in orders:
+                ticker = order['ticker']
+                notional = order['size'] * order['price'] * self._futures_by_ticker[ticker].contract_size()
+                if notional > self._max_order_notional:
+                    raise exc.RiskLimitBreached(f'{ticker} order notional {notional:.2f} above '
+                                                f'{self._max_order_notional:.2f}')
+                position = (positions.get(ticker, self._positions[ticker] + self._reserved[ticker]) +
+                            self.SIGNS[order['side']] * order['size'])
+                if abs(position) > self._max_position:
+                    raise exc.RiskLimitBreached(f'{ticker} position {position} above {self._max_position} contracts')
+                positions[ticker] = position
+            self._tokens -= len(orders)
+            for order in orders:
+                self._reserved[order['ticker']] += self.SIGNS[order['side']] * order['size']
+
+    def order_sent(self, client_id, order):
+        """Links an accepted order to its client id, so its reservation is settled by the order reports"""
+        with self._lock:
+            state = self._orders.get(client_id)
+            if state is None:
+                self._orders[client_id] = _OrderState(order['ticker'], self.SIGNS[order['side']], order['size'])
+                return
+            #Reports received before the order response: settle what they already filled.
+            state.size = order['size']
+            self._reserved[state.ticker] -= state.sign * (state.size if state.done else state.filled)
+            if state.done:
+                self._settle(client_id, state)
+
+    def release_order(self, order):
+        """Releases the reservation of an accepted order which did not reach the exchange"""
+        with self._lock:
+            self._reserved[order['ticker']] -= self.SIGNS[order['side']] * order['size']
+
+    def position(self, ticker):
+        """Contracts held of the future, negative when short"""
+        return self._positions.get(ticker, 0)
+
+    def positions(self):
+        return {ticker: position for ticker, position in self._positions.items() if position}
+
+    def reserved(self, ticker):
+        """Signed size of the orders in flight of the future"""
+        return self._reserved.get(ticker, 0)
+
+    def underlier_position(self, underlier_ticker):
+        """Underlier units held through its futures"""
+        return self._underlier_positions.get(underlier_ticker, 0.)
+
+    def maturity_exposure(self, maturity_tag):
+        """Cash amount of the futures held of the maturity, at the prices traded"""
+        return self._maturity_exposures.get(maturity_tag, 0.)
+
+    def maturity_exposures(self):
+        return dict(self._maturity_exposures)
+
+    def net_delta(self):
+        """Cash amount of the underliers held through futures, at their last spot prices"""
+        spot_prices = self._spot_feed.last_prices() if self._spot_feed else {}
+        return sum(units * spot_prices.get(underlier_ticker, 0.)
+                   for underlier_ticker, units in list(self._underlier_positions.items()))
+
+    def state(self):
+        """Positions, open orders and settled orders, in a JSON serializable form (see restore)"""
+        with self._lock:
+            return {
+                'positions': dict(self._positions),
+                'underlier_positions': dict(self._underlier_positions),
+                'maturity_exposures': dict(self._maturity_exposures),
+                'orders': {client_id: [state.ticker, state.sign, state.size, state.filled, state.done]
+                           for client_id, state in self._orders.items()},
+                'settled': dict(self._settled)}
+
+    def restore(self, state):
+        """
+        Resumes from the positions and orders of a checkpoint (see state).
+        The old order reports must be requested (see RofexProxy.request_old_order_reports), so the open orders
+        which were filled or done while stopped are settled. Fills are tracked by cumulative quantity
+        and settled orders are skipped, so the reports already applied are not counted twice.
+        Reservations are rebuilt from the open orders linked to their client id, the ones accepted and not linked
+        never reached the exchange before stopping, or their response is lost, and their reports carry the fills.
+        """
+        with self._lock:
+            self._positions = defaultdict(int, state['positions'])
+            self._underlier_positions = defaultdict(float, state['underlier_positions'])
+            self._maturity_exposures = defaultdict(float, state['maturity_exposures'])
+            self._settled = dict(state['settled'])
+            self._reserved = defaultdict(int)
+            self._orders = {}
+            for client_id, (ticker, sign, size, filled, done) in state['orders'].items():
+                if done:
+                    self._settled[client_id] = filled
+                    continue
+                order_state = self._orders[client_id] = _OrderState(ticker, sign, size)
+                order_state.filled = filled
+                if size is not None:
+                    self._reserved[ticker] += sign * (size - filled)
+
+    def _order_report_handler(self, message):
+        order_report = message.get('orderReport', {})
+        client_id = order_report.get('clOrdId')
+        ticker = order_report.get('instrumentId', {}).get('symbol')
+        if client_id is None or ticker not in self._futures_by_ticker:
+            return
+        with self._lock:
+            if client_id in self._settled:
+                return
+            state = self._orders.get(client_id)
+            if state is None:
+                #Reports of unknown orders without a side can not be signed, so they are skipped.
+                sign = self.SIGNS.get(order_report.get('side'))
+                if sign is None:
+                    return
+                state = self._orders[client_id] = _OrderState(ticker, sign)
+            if state.done:
+                return
+            #Reports carry the cumulative quantity, so repeated or skipped reports do not miscount fills.
+            cum_qty = order_report.get('cumQty') or 0
+            if cum_qty > state.filled:
+                self._apply_fill(state, cum_qty - state.filled,
+                                 order_report.get('lastPx') or order_report.get('avgPx') or 0.)
+                state.filled = cum_qty
+            if order_report.get('status') in self.TERMINAL_STATUSES:
+                state.done = True
+                #Orders not linked yet are settled once their response arrives (see order_sent).
+                if state.size is not None:
+                    self._reserved[ticker] -= state.sign * (state.size - state.filled)
+                    self._settle(client_id, state)
+
+    def _settle(self, client_id, state):
+        del self._orders[client_id]
+        self._settled[client_id] = state.filled
+
+    def _apply_fill(self, state, size, price):
+        future = self._futures_by_ticker[state.ticker]
+        signed_size = state.sign * size
+        self._positions[state.ticker] += signed_size
+        self._underlier_positions[future.underlier_ticker()] += signed_size * future.contract_size()
+        self._maturity_exposures[self._maturities_by_ticker[state.ticker]] += (
+                signed_size * future.contract_size() * price)
+        if state.size is not None:
+            self._reserved[state.ticker] -= signed_size
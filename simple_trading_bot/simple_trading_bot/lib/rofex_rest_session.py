@@ -0,0 +1,116 @@
+import threading
+import time
+
+import requests
+from pyRofex.components import urls
+from pyRofex.components.enums import OrderType, TimeInForce
+from pyRofex.components.exceptions import ApiException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+
+
+class RofexRestSession:
+    """
+    Class to perform the pyRofex rest api calls through a pooled keep-alive session,
+    so requests reuse already established TCP/TLS connections instead of setting up a new one each time.
+    Every request has bounded connect/read timeouts. Idempotent queries are retried with backoff,
+    while new orders are only retried on connection errors (i.e. when they never reached the exchange).
+    Latency is tracked per endpoint.
+    """
+    SEND_ORDER = 'send_order'
+    ORDER_STATUS = 'order_status'
+    DETAILED_INSTRUMENTS = 'detailed_instruments'
+    #(connect, read) timeouts in seconds.
+    TIMEOUT = (3.05, 10.)
+    POOL_SIZE = 8
+    RETRIES = 3
+    BACKOFF_FACTOR = 0.1
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, url, token=None, token_refresher=None, verify=True, proxies=None, timeout=TIMEOUT):
+        """
+        url: rest api base url, ending with '/'.
+        token_refresher: called to get a new token when the current one is rejected (401).
+        """
+        self._url = url
+        self._token = token
+        self._token_refresher = token_refresher
+        self._timeout = timeout
+        self._session = requests.Session()
+        self._session.verify = verify
+        if proxies:
+            self._session.proxies.update(proxies)
+        self._session.mount(url, HTTPAdapter(
+            pool_connections=self.POOL_SIZE,
+            pool_maxsize=self.POOL_SIZE,
+            max_retries=Retry(
+                total=self.RETRIES,
+                backoff_factor=self.BACKOFF_FACTOR,
+                status_forcelist=self.RETRY_STATUSES,
+                allowed_methods=frozenset(['GET']),
+                raise_on_status=False)))
+        #Longest prefix wins, so new orders get their own adapter which never resends a request that went out.
+        self._session.mount(url + urls.new_order.split('?')[0], HTTPAdapter(
+            pool_connections=self.POOL_SIZE,
+            pool_maxsize=self.POOL_SIZE,
+            max_retries=Retry(total=self.RETRIES, connect=self.RETRIES, read=0, status=0, other=0,
+                              backoff_factor=self.BACKOFF_FACTOR, raise_on_status=False)))
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def send_order(self, ticker, size, order_type, side, account, market, price=None,
+                   time_in_force=TimeInForce.DAY, cancel_previous=False, iceberg=False,
+                   expire_date=None, display_quantity=None):
+        new_order_url = urls.new_order
+        if order_type is OrderType.LIMIT:
+            new_order_url += urls.limit_order
+        if time_in_force is TimeInForce.GoodTillDate:
+            new_order_url += urls.good_till_date
+        if iceberg:
+            new_order_url += urls.iceberg
+        return self._get(self.SEND_ORDER, new_order_url.format(
+            market=market.value,
+            ticker=ticker,
+            size=size,
+            type=order_type.value,
+            side=side.value,
+            time_force=time_in_force.value,
+            account=account,
+            price=price,
+            cancel_previous=cancel_previous,
+            expire_date=expire_date,
+            display_quantity=display_quantity))
+
+    def get_order_status(self, client_order_id, proprietary):
+        return self._get(self.ORDER_STATUS, urls.order_status.format(c=client_order_id, p=proprietary))
+
+    def get_detailed_instruments(self):
+        return self._get(self.DETAILED_INSTRUMENTS, urls.instruments['details'])
+
+    def latency(self, endpoint):
+        """Latency histogram of the given endpoint, created on first use"""
+        with self._lock:
+            if endpoint not in self._latencies:
+                self._latencies[endpoint] = LatencyHistogram(f'REST {endpoint}')
+            return self._latencies[endpoint]
+
+    def latencies(self):
+        with self._lock:
+            return list(self._latencies.values())
+
+    def close(self):
+        self._session.close()
+
+    def _get(self, endpoint, path, retry_auth=True):
+        start = time.perf_counter()
+        response = self._session.get(
+            self._url + path, headers={'X-Auth-Token': self._token}, timeout=self._timeout)
+        self.latency(endpoint).record(time.perf_counter() - start)
+        if response.status_code == 401:
+            if not retry_auth or not self._token_refresher:
+                raise ApiException('Authentication Fails.')
+            self._token = self._token_refresher()
+            return self._get(endpoint, path, retry_auth=False)
+        return response.json()
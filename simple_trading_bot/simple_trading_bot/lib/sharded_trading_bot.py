@@ -0,0 +1,439 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future, wait
+
+import simple_trading_bot.lib.exceptions as exc
+from simple_trading_bot.lib.data_update_watchman import DataUpdateWatchman
+from simple_trading_bot.lib.instrument_expert import InstrumentExpert
+from simple_trading_bot.lib.ir_expert import IRExpert
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+from simple_trading_bot.lib.market_data_feeds import RofexProxy, YfinanceMDFeed
+from simple_trading_bot.lib.order_gateway import OrderGateway, OrderStatuses
+from simple_trading_bot.lib.risk_engine import RiskEngine
+from simple_trading_bot.lib.shared_market_data import SharedMarketData, SharedMarketDataReader
+from simple_trading_bot.lib.trader import Trader
+
+
+def shard_maturity_tags(instruments_by_maturity, shards):
+    """
+    Splits the maturity tags into (at most) the given number of shards, balancing the instruments of each one.
+    Greedy: the largest maturities go first, each one to the shard with less instruments so far.
+    """
+    shard_tags = [[] for _ in range(max(min(shards, len(instruments_by_maturity)), 1))]
+    shard_sizes = [0] * len(shard_tags)
+    for maturity_tag, instruments in sorted(instruments_by_maturity.items(), key=lambda item: -len(item[1])):
+        shard = shard_sizes.index(min(shard_sizes))
+        shard_tags[shard].append(maturity_tag)
+        shard_sizes[shard] += len(instruments)
+    return [tags for tags in shard_tags if tags]
+
+
+class ShardingFactory:
+    """
+    Creates the objects living in each process of a ShardedTradingBot.
+    It is sent to every process, so it must be picklable.
+    """
+
+    def __init__(self, tickers, spot_update_frequency):
+        self._tickers = tickers
+        self._spot_update_frequency = spot_update_frequency
+
+    def setup_process(self):
+        """Called first thing in every child process"""
+        pass
+
+    def create_instrument_expert(self, rest_instruments=None, maturity_tags=None):
+        return InstrumentExpert(self._tickers, rest_instruments=rest_instruments, maturity_tags=maturity_tags)
+
+    def create_rofex_proxy(self, instrument_expert):
+        return RofexProxy(instrument_expert)
+
+    def create_spot_feed(self, instrument_expert, rofex_proxy):
+        return YfinanceMDFeed(instrument_expert, self._spot_update_frequency)
+
+    def create_order_proxy(self, instrument_expert):
+        #Only orders are placed and tracked here, market data is received by the ingest process.
+        return RofexProxy(instrument_expert, subscribe_to_order_report=True, subscribe_to_market_data=False)
+
+    def create_risk_engine(self, instrument_expert, order_proxy):
+        #Spot prices are not received by the order gateway process, so the net delta is not available.
+        return RiskEngine(instrument_expert, order_proxy)
+
+
+class MarketDataPublisher:
+    """
+    Class to publish every update received by the feeds into SharedMarketData, from the feeds threads.
+    """
+
+    def __init__(self, shared_market_data, rofex_proxy, spot_feed):
+        self._shared_market_data = shared_market_data
+        self._rofex_proxy = rofex_proxy
+        self._spot_feed = spot_feed
+        self._rofex_proxy.add_update_listener(self._publish_books)
+        self._spot_feed.add_update_listener(self._publish_spot_prices)
+
+    def _publish_books(self):
+        #Updated tickers are popped before the data is read, so the data read always covers them.
+        updated_tickers = self._rofex_proxy.pop_updated_tickers()
+        snapshot = self._rofex_proxy.book_snapshot()
+        self._shared_market_data.publish_books(
+            (ticker, snapshot.bids.get(ticker), snapshot.asks.get(ticker)) for ticker in updated_tickers)
+
+    def _publish_spot_prices(self):
+        updated_tickers = self._spot_feed.pop_updated_tickers()
+        prices = self._spot_feed.last_prices()
+        self._shared_market_data.publish_spot_prices(
+            {ticker: prices[ticker] for ticker in updated_tickers if ticker in prices})
+
+
+class RemoteOrderGateway:
+    """
+    Worker side of the order gateway process, exposing the OrderGateway interface used by Trader.
+    Orders are queued to the gateway process, and its responses resolve the futures returned.
+    """
+
+    def __init__(self, worker_id, order_requests, order_responses):
+        self._worker_id = worker_id
+        self._order_requests = order_requests
+        self._order_responses = order_responses
+        self._request_ids = itertools.count()
+        self._pending_requests = {}
+        self._order_status = OrderStatuses()
+        self._lock = threading.Lock()
+        self._responses_thread = threading.Thread(target=self._read_responses, daemon=True)
+        self._responses_thread.start()
+
+    def send_orders(self, *orders, on_all_done=None, tick_time=None):
+        request_id = next(self._request_ids)
+        futures = [Future() for _ in orders]
+        with self._lock:
+            self._pending_requests[request_id] = (futures, on_all_done)
+        #Performance counter is system wide (monotonic clock), so tick time is still valid in the gateway process.
+        self._order_requests.put((self._worker_id, request_id, orders, tick_time))
+        return futures
+
+    def order_status(self, client_id):
+        return self._order_status.get(client_id)
+
+    def order_info(self, future):
+        if future.exception():
+            return f'Order failed: {future.exception()}', None
+        order_info = future.result()
+        return order_info, self.order_status(order_info.get('order', {}).get('clientId'))
+
+    def wait_for_pending(self, timeout=None):
+        with self._lock:
+            pending_futures = [future for futures, _ in self._pending_requests.values() for future in futures]
+        wait(pending_futures, timeout=timeout)
+
+    def shutdown(self):
+        self._order_responses.put(None)
+        self._responses_thread.join()
+
+    def _read_responses(self):
+        while True:
+            response = self._order_responses.get()
+            if response is None:
+                return
+            request_id, leg_results = response
+            with self._lock:
+                futures, on_all_done = self._pending_requests.pop(request_id)
+            for future, (order_info, status, error) in zip(futures, leg_results):
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                    continue
+                client_id = order_info.get('order', {}).get('clientId')
+                if client_id is not None:
+                    self._order_status.set(client_id, status)
+                future.set_result(order_info)
+            if on_all_done:
+                on_all_done(futures)
+
+
+class WorkerReport:
+    """
+    Class to hold what a worker process did, sent back to the parent process on exit
+    """
+
+    def __init__(self, worker_id, maturity_tags, decision_latency, processed_sequence):
+        self.worker_id = worker_id
+        self.maturity_tags = maturity_tags
+        self.decision_latency = decision_latency
+        self.processed_sequence = processed_sequence
+
+    def __str__(self):
+        return f'Worker {self.worker_id} {self.maturity_tags}: {self.decision_latency}'
+
+
+class GatewayReport:
+    """
+    Class to hold what the order gateway process did, sent back to the parent process on exit
+    """
+
+    def __init__(self, orders, ack_latency, leg_skew):
+        self.orders = orders
+        self.ack_latency = ack_latency
+        self.leg_skew = leg_skew
+
+    def __str__(self):
+        return f'Orders sent: {self.orders}\n{self.ack_latency}\n{self.leg_skew}'
+
+
+class MissingReport:
+    """
+    Class to stand for the report of a process which exited without sending it, or did not send it in time
+    """
+
+    def __init__(self, process_name, exitcode):
+        self.process_name = process_name
+        self.exitcode = exitcode
+
+    def __str__(self):
+        if self.exitcode is None:
+            return f'{self.process_name} did not report in time'
+        return f'{self.process_name} exited with code {self.exitcode} without a report'
+
+
+def _run_ingest(factory, reference_data, market_data_spec, stop_event):
+    """Ingest process: owns the feeds and publishes their data into shared memory"""
+    factory.setup_process()
+    shared_market_data = SharedMarketData.attach(market_data_spec)
+    instrument_expert = factory.create_instrument_expert(rest_instruments=reference_data)
+    rofex_proxy = factory.create_rofex_proxy(instrument_expert)
+    spot_feed = factory.create_spot_feed(instrument_expert, rofex_proxy)
+    MarketDataPublisher(shared_market_data, rofex_proxy, spot_feed)
+    try:
+        rofex_proxy.start_listening()
+        spot_feed.start_listening()
+        while not stop_event.wait(ShardedTradingBot.HEALTH_CHECK_PERIOD):
+            if not rofex_proxy.running():
+                rofex_proxy.start_listening()
+            if not spot_feed.running():
+                spot_feed.start_listening()
+    finally:
+        spot_feed.stop()
+        rofex_proxy.stop()
+        shared_market_data.close()
+
+
+def _run_gateway(factory, reference_data, order_requests, order_responses, reports):
+    """Order gateway process: every order from every worker is sent from here, until a None request arrives"""
+    order_proxy = order_gateway = None
+    orders = 0
+
+    def leg_result(future):
+        if future.exception():
+            return None, None, str(future.exception())
+        order_info, status = order_gateway.order_info(future)
+        return order_info, status, None
+
+    try:
+        factory.setup_process()
+        instrument_expert = factory.create_instrument_expert(rest_instruments=reference_data)
+        order_proxy = factory.create_order_proxy(instrument_expert)
+        #Every order goes through here, so the pre-trade checks see the orders of every worker.
+        order_gateway = OrderGateway(order_proxy, risk_engine=factory.create_risk_engine(instrument_expert, order_proxy))
+        order_proxy.start_listening()
+        for worker_id, request_id, leg_orders, tick_time in iter(order_requests.get, None):
+
+            def reply(futures, worker_id=worker_id, request_id=request_id):
+                order_responses[worker_id].put((request_id, [leg_result(future) for future in futures]))
+
+            try:
+                order_gateway.send_orders(*leg_orders, on_all_done=reply, tick_time=tick_time)
+            except exc.RiskLimitBreached as e:
+                #No leg was sent, every one of them fails on the worker side.
+                order_responses[worker_id].put((request_id, [(None, None, str(e))] * len(leg_orders)))
+                continue
+            orders += len(leg_orders)
+    finally:
+        #Failed setups leave no report, the parent tells them by the exit code.
+        if order_gateway:
+            order_gateway.shutdown()
+            reports.put(GatewayReport(orders, order_gateway.ack_latency(), order_gateway.leg_skew()))
+        if order_proxy:
+            order_proxy.stop()
+
+
+def _run_worker(factory, reference_data, worker_id, maturity_tags, market_data_spec,
+                order_requests, order_responses, processed_sequences, stop_event, reports):
+    """Worker process: computes the rates and trades the maturities of its shard"""
+    shared_market_data = reader = order_gateway = None
+    decision_latency = LatencyHistogram(f'Worker {worker_id} wakeup to decision')
+    try:
+        factory.setup_process()
+        shared_market_data = SharedMarketData.attach(market_data_spec)
+        instrument_expert = factory.create_instrument_expert(
+            rest_instruments=reference_data, maturity_tags=maturity_tags)
+        reader = SharedMarketDataReader(shared_market_data, instrument_expert.tradeable_rofex_tickers())
+        books_feed, spot_feed = reader.books_feed(), reader.spot_feed()
+        data_update_watchman = DataUpdateWatchman(books_feed, spot_feed)
+        ir_expert = IRExpert(instrument_expert, books_feed, spot_feed)
+        order_gateway = RemoteOrderGateway(worker_id, order_requests, order_responses[worker_id])
+        trader = Trader(instrument_expert, ir_expert, books_feed, spot_feed, data_update_watchman, order_gateway)
+        while not stop_event.is_set():
+            if not reader.wait_for_update(ShardedTradingBot.UPDATE_WAIT_TIMEOUT):
+                continue
+            wakeup_time = time.perf_counter()
+            if reader.refresh():
+                data_update_watchman.set_last_processed_sequence()
+                ir_expert.update_rates()
+                if ir_expert.ready():
+                    trader.evaluate_and_trade_each_maturiry()
+                decision_latency.record(time.perf_counter() - wakeup_time)
+            processed_sequences[worker_id] = reader.last_sequence()
+    except Exception:
+        traceback.print_exc()
+        print(f'Exception occurred in worker {worker_id}. Stopping...')
+    finally:
+        if order_gateway:
+            order_gateway.wait_for_pending(ShardedTradingBot.UPDATE_WAIT_TIMEOUT)
+            order_gateway.shutdown()
+        reports.put(WorkerReport(worker_id, maturity_tags, decision_latency, reader.last_sequence() if reader else 0))
+        if shared_market_data:
+            shared_market_data.close()
+
+
+class ShardedTradingBot:
+    """
+    Sharded deployment of the trading bot, to use several cores instead of contending on a single GIL.
+    * An ingest process owns the feeds and publishes the books and spot prices through shared memory.
+    * Each worker process owns a subset of the maturities, running its own IRExpert and Trader slice.
+    * Every order is sent by a single order gateway process, which runs the pre-trade risk checks.
+    """
+    UPDATE_WAIT_TIMEOUT = 1.
+    HEALTH_CHECK_PERIOD = 1.
+    REPORT_WAIT_TIMEOUT = 1.
+    JOIN_TIMEOUT = 30.
+    GATEWAY_REPORT_KEY = 'gateway'
+
+    def __init__(self, tickers, spot_update_frequency, workers=None, factory=None):
+        self._factory = factory or ShardingFactory(tickers, spot_update_frequency)
+        self._context = multiprocessing.get_context('spawn')
+        instrument_expert = self._factory.create_instrument_expert()
+        self._reference_data = instrument_expert.reference_data()
+        #Ingest and order gateway take a core each.
+        workers = workers or max((os.cpu_count() or 1) - 2, 1)
+        self._shards = shard_maturity_tags(instrument_expert.tradeable_rofex_intruments_by_maturity(), workers)
+        underlier_tickers = sorted(instrument_expert.tradeable_rofex_instruments_by_underlier_ticker().keys())
+        self._shared_market_data = SharedMarketData(
+            instrument_expert.tradeable_rofex_tickers(), underlier_tickers, self._context.Condition())
+        self._stop_event = self._context.Event()
+        self._order_requests = self._context.Queue()
+        self._order_responses = [self._context.Queue() for _ in self._shards]
+        self._processed_sequences = self._context.Array('q', len(self._shards), lock=False)
+        self._reports = self._context.Queue()
+        #Reports received so far, keyed by worker id (see _report_key).
+        self._received_reports = {}
+        self._worker_processes = []
+        self._gateway_process = None
+        self._ingest_process = None
+
+    def shards(self):
+        return [list(tags) for tags in self._shards]
+
+    def shared_market_data(self):
+        return self._shared_market_data
+
+    def processed_sequences(self):
+        """Last data sequence processed by each worker"""
+        return list(self._processed_sequences)
+
+    def launch(self):
+        self.start()
+        try:
+            while self._all_alive():
+                self._stop_event.wait(self.HEALTH_CHECK_PERIOD)
+        except KeyboardInterrupt:
+            pass
+        for report in self.join():
+            print(report, flush=True)
+
+    def start(self):
+        self._gateway_process = self._context.Process(
+            target=_run_gateway,
+            args=(self._factory, self._reference_data, self._order_requests, self._order_responses, self._reports),
+            name='OrderGateway')
+        self._gateway_process.start()
+        for worker_id, maturity_tags in enumerate(self._shards):
+            worker_process = self._context.Process(
+                target=_run_worker,
+                args=(self._factory, self._reference_data, worker_id, maturity_tags,
+                      self._shared_market_data.spec(), self._order_requests, self._order_responses,
+                      self._processed_sequences, self._stop_event, self._reports),
+                name=f'Worker{worker_id}')
+            worker_process.start()
+            self._worker_processes.append(worker_process)
+        self._ingest_process = self._create_ingest_process()
+        if self._ingest_process:
+            self._ingest_process.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def join(self):
+        """
+        Stops every process and returns their reports (workers first, then the order gateway).
+        Processes exiting without a report, or not sending it within JOIN_TIMEOUT, get a MissingReport instead,
+        and are terminated if still running.
+        """
+        self.stop()
+        deadline = time.monotonic() + self.JOIN_TIMEOUT
+        if self._ingest_process:
+            self._join_process(self._ingest_process, deadline)
+        worker_reports = self._wait_for_reports(dict(enumerate(self._worker_processes)), deadline)
+        for worker_process in self._worker_processes:
+            self._join_process(worker_process, deadline)
+        #Workers wait for their orders before leaving, so the gateway has nothing else to send.
+        self._order_requests.put(None)
+        deadline = time.monotonic() + self.JOIN_TIMEOUT
+        gateway_report, = self._wait_for_reports({self.GATEWAY_REPORT_KEY: self._gateway_process}, deadline)
+        self._join_process(self._gateway_process, deadline)
+        self._shared_market_data.close()
+        return worker_reports + [gateway_report]
+
+    def _create_ingest_process(self):
+        return self._context.Process(
+            target=_run_ingest,
+            args=(self._factory, self._reference_data, self._shared_market_data.spec(), self._stop_event),
+            name='Ingest')
+
+    def _wait_for_reports(self, processes, deadline):
+        """
+        Returns the reports of the processes given (keyed as their reports, see _report_key), waiting until
+        each one reported or exited, or the deadline. Reports of other processes are kept for later.
+        """
+        while time.monotonic() < deadline:
+            pending = [process for key, process in processes.items() if key not in self._received_reports]
+            if not pending:
+                break
+            #Checked before waiting, as processes send their report before exiting.
+            exited = not any(process.is_alive() for process in pending)
+            try:
+                report = self._reports.get(timeout=self.REPORT_WAIT_TIMEOUT)
+            except queue.Empty:
+                if exited:
+                    break
+                continue
+            self._received_reports[self._report_key(report)] = report
+        return [self._received_reports.get(key) or MissingReport(process.name, process.exitcode)
+                for key, process in processes.items()]
+
+    def _report_key(self, report):
+        return report.worker_id if isinstance(report, WorkerReport) else self.GATEWAY_REPORT_KEY
+
+    @staticmethod
+    def _join_process(process, deadline):
+        process.join(max(deadline - time.monotonic(), 0.))
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    def _all_alive(self):
+        processes = self._worker_processes + [self._gateway_process, self._ingest_process]
+        return all(process.is_alive() for process in processes if process)
@@ -0,0 +1,138 @@
+import datetime as dt
+import itertools
+import os
+import random
+import string
+import sys
+import time
+
+from simple_trading_bot.lib.replay import ReplayRofexProxy, StubPyRofexWrapper
+from simple_trading_bot.lib.sharded_trading_bot import MissingReport, ShardedTradingBot, ShardingFactory
+
+MONTH_TAGS = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+
+def synthetic_reference_data(underlier_count, maturity_count):
+    """
+    Returns the (underlier tickers, rest api detailed instruments) of a synthetic market,
+    with a future for every underlier and maturity. Maturities are a month apart, starting next month.
+    """
+    tickers = [''.join(letters) for letters in itertools.islice(
+        itertools.product(string.ascii_uppercase, repeat=3), underlier_count)]
+    today = dt.date.today()
+    instruments = []
+    for maturity in range(maturity_count):
+        #Tags have to look like Rofex ones, i.e. Feb21.
+        maturity_tag = f'{MONTH_TAGS[maturity % 12]}2{maturity // 12}'
+        maturity_date = (today + dt.timedelta(days=30 * (maturity + 1))).strftime('%Y%m%d')
+        for ticker in tickers:
+            instruments.append({
+                'instrumentId': {'symbol': f'{ticker}{maturity_tag}'},
+                'maturityDate': maturity_date,
+                'contractMultiplier': 100.})
+    return tickers, {'instruments': instruments}
+
+
+class SyntheticShardingFactory(ShardingFactory):
+    """
+    ShardingFactory over a synthetic market, sending orders to a stub gateway and discarding any output.
+    """
+
+    def __init__(self, underlier_count, maturity_count):
+        self._underlier_count = underlier_count
+        self._maturity_count = maturity_count
+        tickers, _ = synthetic_reference_data(underlier_count, maturity_count)
+        super().__init__(tickers, spot_update_frequency=0.)
+
+    def setup_process(self):
+        sys.stdout = open(os.devnull, 'w')
+
+    def create_instrument_expert(self, rest_instruments=None, maturity_tags=None):
+        if rest_instruments is None:
+            _, rest_instruments = synthetic_reference_data(self._underlier_count, self._maturity_count)
+        return super().create_instrument_expert(rest_instruments=rest_instruments, maturity_tags=maturity_tags)
+
+    def create_order_proxy(self, instrument_expert):
+        return ReplayRofexProxy(instrument_expert, StubPyRofexWrapper())
+
+
+class ShardingBenchmarkResult:
+    """
+    Class to hold the results of a single sharded run
+    """
+
+    def __init__(self, instruments, workers, updates, elapsed, decision_latency, orders):
+        self.instruments = instruments
+        self.workers = workers
+        self.updates = updates
+        self.elapsed = elapsed
+        self.decision_latency = decision_latency
+        self.orders = orders
+
+    def __str__(self):
+        return (f'{self.instruments:>11} {self.workers:>7} {self.updates_per_second():>12.1f} '
+                f'{self.decision_latency.percentile(50) * 1e6:>10.1f} '
+                f'{self.decision_latency.percentile(99) * 1e6:>10.1f} {self.orders:>7}')
+
+    def updates_per_second(self):
+        return self.updates / self.elapsed if self.elapsed else 0.
+
+
+class ShardingBenchmark:
+    """
+    Class to benchmark how the sharded deployment scales with the instrument count.
+    For each market size and worker count, the parent process publishes random book updates
+    as fast as possible (standing in for the ingest process), and measures how long
+    the workers take to process all of them.
+    """
+    HEADER = f'{"Instruments":>11} {"Workers":>7} {"Updates/s":>12} {"p50 (us)":>10} {"p99 (us)":>10} {"Orders":>7}'
+
+    def __init__(self, underlier_counts, maturity_count, worker_counts, updates, seed=0):
+        self._underlier_counts = underlier_counts
+        self._maturity_count = maturity_count
+        self._worker_counts = worker_counts
+        self._updates = updates
+        self._seed = seed
+
+    def run(self):
+        return [self._run_single(underlier_count, workers)
+                for underlier_count in self._underlier_counts
+                for workers in self._worker_counts]
+
+    def _run_single(self, underlier_count, workers):
+        factory = SyntheticShardingFactory(underlier_count, self._maturity_count)
+        bot = _BenchmarkShardedTradingBot(factory.create_instrument_expert().futures_ticker(), 0.,
+                                          workers=workers, factory=factory)
+        shared_market_data = bot.shared_market_data()
+        futures_tickers = shared_market_data.futures_tickers()
+        rng = random.Random(self._seed)
+        bot.start()
+        try:
+            shared_market_data.publish_spot_prices({ticker: 100. for ticker in shared_market_data.underlier_tickers()})
+            start = time.perf_counter()
+            for _ in range(self._updates):
+                price = 100. + rng.uniform(1., 5.)
+                shared_market_data.publish_books(
+                    [(rng.choice(futures_tickers), (price - 0.5, 10.), (price + 0.5, 10.))])
+            final_sequence = shared_market_data.sequence()
+            while min(bot.processed_sequences()) < final_sequence:
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - start
+        finally:
+            reports = bot.join()
+        missing_reports = [report for report in reports if isinstance(report, MissingReport)]
+        if missing_reports:
+            raise RuntimeError(', '.join(str(report) for report in missing_reports))
+        worker_reports, gateway_report = reports[:-1], reports[-1]
+        decision_latency = worker_reports[0].decision_latency
+        for worker_report in worker_reports[1:]:
+            decision_latency.merge(worker_report.decision_latency)
+        return ShardingBenchmarkResult(
+            len(futures_tickers), len(worker_reports), self._updates, elapsed, decision_latency, gateway_report.orders)
+
+
+class _BenchmarkShardedTradingBot(ShardedTradingBot):
+    """ShardedTradingBot without ingest process, data is published by the benchmark"""
+
+    def _create_ingest_process(self):
+        return None
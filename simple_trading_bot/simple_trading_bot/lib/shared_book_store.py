@@ -0,0 +1,256 @@
+import mmap
+import os
+import tempfile
+import time
+from types import MappingProxyType
+
+import numpy as np
+
+from simple_trading_bot.lib.market_data_feeds import EMPTY_BOOK_SNAPSHOT, BookSnapshot, OrderbookLevel
+
+
+class SeqlockRows:
+    """
+    Class to guard each row of a struct array shared across processes with a seqlock, the first field of the rows
+    being their sequence: the writer makes the row sequence odd while writing and even again when done,
+    so readers copy rows without any lock and copy again the ones written meanwhile.
+    Sequences only grow, so readers can tell which rows changed. There must be a single writer.
+    """
+    MAX_READ_RETRIES = 1000
+
+    def __init__(self, rows, name):
+        """
+        rows: struct array over the shared memory, with a 'sequence' first field
+        name: name of the shared memory, for errors
+        """
+        self._rows = rows
+        self._sequences = rows['sequence']
+        self._name = name
+
+    def sequences(self):
+        """Copy of the sequence of every row"""
+        return self._sequences.copy()
+
+    def write(self, index, values):
+        """Writes the row with the values given for every field but the sequence"""
+        sequence = self._sequences[index] + 1
+        #Odd sequence: row being written.
+        self._sequences[index] = sequence
+        self._rows[index] = (sequence, *values)
+        self._sequences[index] = sequence + 1
+
+    def read(self, index):
+        """Returns a consistent copy of every field of the row but the sequence"""
+        for _ in range(self.MAX_READ_RETRIES):
+            sequence = self._sequences[index]
+            if sequence & 1:
+                continue
+            values = self._rows[index].item()
+            if self._sequences[index] == sequence:
+                return values[1:]
+        raise TimeoutError(f'Row {index} of {self._name} could not be read consistently')
+
+    def copy(self):
+        """Returns a copy of every row, each of them consistent"""
+        rows = self._rows.copy()
+        for _ in range(self.MAX_READ_RETRIES):
+            #Rows being written when copied, or written since, are copied again.
+            sequences = rows['sequence']
+            torn_rows = np.flatnonzero((sequences & 1) | (sequences != self._sequences))
+            if not len(torn_rows):
+                return rows
+            rows[torn_rows] = self._rows[torn_rows]
+        raise TimeoutError(f'Rows of {self._name} could not be read consistently')
+
+
+class SharedBookStore:
+    """
+    Class to hold the top of book of every future in a memory mapped file with a fixed layout,
+    so it can be read from other processes (risk monitors, dashboards, an IRExpert running apart)
+    without opening their own Rofex sessions.
+    Layout: a header (magic, layout version, row count, store sequence), a directory with the symbol
+    of each row, and a struct array with a row per future, indexed by instrument id (its directory position).
+    Each row is guarded by a seqlock (see SeqlockRows), so readers can copy a row without any lock.
+    There must be a single writer.
+    """
+    MAGIC = b'SBKSTORE'
+    LAYOUT_VERSION = 1
+    HEADER_DTYPE = np.dtype([('magic', 'S8'), ('layout_version', '<u4'), ('rows', '<u4'), ('sequence', '<u8')])
+    SYMBOL_DTYPE = np.dtype('S32')
+    ROW_DTYPE = np.dtype([
+        ('sequence', '<u8'),
+        ('bid_price', '<f8'),
+        ('bid_size', '<f8'),
+        ('ask_price', '<f8'),
+        ('ask_size', '<f8'),
+        ('timestamp', '<f8')])
+
+    def __init__(self, path, tickers=None):
+        """
+        Creates the store for the given tickers, or opens an existing one read-only when tickers are not provided.
+        """
+        self._path = path
+        self._writable = tickers is not None
+        if self._writable:
+            rows = len(tickers)
+            with open(path, 'w+b') as store_file:
+                store_file.truncate(self._size(rows))
+                self._mmap = mmap.mmap(store_file.fileno(), 0)
+        else:
+            with open(path, 'rb') as store_file:
+                self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._header = np.ndarray((), dtype=self.HEADER_DTYPE, buffer=self._mmap)
+        if self._writable:
+            self._header['magic'] = self.MAGIC
+            self._header['layout_version'] = self.LAYOUT_VERSION
+            self._header['rows'] = rows
+        elif self._header['magic'] != self.MAGIC or self._header['layout_version'] != self.LAYOUT_VERSION:
+            raise ValueError(f'{path} is not a book store with layout version {self.LAYOUT_VERSION}')
+        rows = int(self._header['rows'])
+        offset = self.HEADER_DTYPE.itemsize
+        self._symbols = np.ndarray((rows,), dtype=self.SYMBOL_DTYPE, buffer=self._mmap, offset=offset)
+        if self._writable:
+            self._symbols[:] = [ticker.encode() for ticker in tickers]
+        offset += self._symbols.nbytes
+        self._rows = np.ndarray((rows,), dtype=self.ROW_DTYPE, buffer=self._mmap, offset=offset)
+        if self._writable:
+            self._rows['bid_price'] = np.nan
+            self._rows['ask_price'] = np.nan
+        self._book_rows = SeqlockRows(self._rows, path)
+        self._tickers = [symbol.decode() for symbol in self._symbols]
+        self._index_by_ticker = {ticker: index for index, ticker in enumerate(self._tickers)}
+
+    @staticmethod
+    def default_path(name='book_store'):
+        #Shared memory backed file system when available, so the store never hits the disk.
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return os.path.join(directory, f'simple_trading_bot_{name}.bin')
+
+    def path(self):
+        return self._path
+
+    def tickers(self):
+        return list(self._tickers)
+
+    def instrument_id(self, ticker):
+        return self._index_by_ticker.get(ticker)
+
+    def sequence(self):
+        """Store sequence, bumped after every row written"""
+        return int(self._header['sequence'])
+
+    def row_sequences(self):
+        """Copy of the sequence of every row, which only grows, so changed rows can be found by comparison"""
+        return self._book_rows.sequences()
+
+    def write(self, ticker, bid_level, ask_level):
+        """Writes the top of book of the ticker, where missing levels are None"""
+        index = self._index_by_ticker.get(ticker)
+        if index is None:
+            return
+        bid_price, bid_size = bid_level if bid_level else (np.nan, 0.)
+        ask_price, ask_size = ask_level if ask_level else (np.nan, 0.)
+        self._book_rows.write(index, (bid_price, bid_size, ask_price, ask_size, time.time()))
+        self._header['sequence'] += 1
+
+    def read(self, ticker):
+        """Returns a consistent (bid level, ask level, timestamp) of the ticker, where missing levels are None"""
+        return self.read_row(self._index_by_ticker[ticker])
+
+    def read_row(self, index):
+        bid_price, bid_size, ask_price, ask_size, timestamp = self._book_rows.read(index)
+        return self._level(bid_price, bid_size), self._level(ask_price, ask_size), timestamp
+
+    def bids(self):
+        return {ticker: bid for ticker, bid in self._levels(0).items() if bid}
+
+    def asks(self):
+        return {ticker: ask for ticker, ask in self._levels(1).items() if ask}
+
+    def close(self):
+        #Views over the map must be released before closing it.
+        self._header = self._symbols = self._rows = self._book_rows = None
+        self._mmap.close()
+
+    def unlink(self):
+        os.remove(self._path)
+
+    @classmethod
+    def _size(cls, rows):
+        return cls.HEADER_DTYPE.itemsize + rows * (cls.SYMBOL_DTYPE.itemsize + cls.ROW_DTYPE.itemsize)
+
+    def _levels(self, side):
+        return {ticker: self.read_row(index)[side] for index, ticker in enumerate(self._tickers)}
+
+    @staticmethod
+    def _level(price, size):
+        return None if np.isnan(price) else OrderbookLevel(price, size)
+
+
+class SharedBookStoreReader:
+    """
+    Class to read a SharedBookStore from another process, exposing the RofexProxy books interface
+    (book_snapshot, bids, asks, pop_updated_tickers and last_update_sequence), so IRExpert can run on top of it.
+    Only the rows changed since last snapshot are read. No depth is available, just the top of book.
+    """
+
+    def __init__(self, path):
+        self._book_store = SharedBookStore(path)
+        self._row_sequences = np.zeros(len(self._book_store.tickers()), dtype=np.uint64)
+        self._book_snapshot = EMPTY_BOOK_SNAPSHOT
+        self._updated_tickers = set()
+
+    def book_store(self):
+        return self._book_store
+
+    def last_update_sequence(self):
+        return self._book_store.sequence()
+
+    def book_snapshot(self):
+        """Returns the books as of now, tracking the tickers updated since last call"""
+        row_sequences = self._book_store.row_sequences()
+        changed_rows = np.flatnonzero(row_sequences != self._row_sequences)
+        if not len(changed_rows):
+            return self._book_snapshot
+        self._row_sequences = row_sequences
+        bids = dict(self._book_snapshot.bids)
+        asks = dict(self._book_snapshot.asks)
+        tickers = self._book_store.tickers()
+        for index in changed_rows:
+            ticker = tickers[index]
+            bid, ask, _ = self._book_store.read_row(index)
+            self._set_level(bids, ticker, bid)
+            self._set_level(asks, ticker, ask)
+            self._updated_tickers.add(ticker)
+        self._book_snapshot = BookSnapshot(
+            self._book_store.sequence(), MappingProxyType(bids), MappingProxyType(asks))
+        return self._book_snapshot
+
+    def bids(self):
+        return self.book_snapshot().bids
+
+    def asks(self):
+        return self.book_snapshot().asks
+
+    def depth(self):
+        return self.book_snapshot().depth
+
+    def pop_updated_tickers(self):
+        """Returns the tickers read since last call, reading the rows changed first"""
+        self.book_snapshot()
+        updated_tickers, self._updated_tickers = self._updated_tickers, set()
+        return updated_tickers
+
+    def add_update_listener(self, listener):
+        #Updates made by another process can not be notified, see last_update_sequence.
+        pass
+
+    def close(self):
+        self._book_store.close()
+
+    @staticmethod
+    def _set_level(levels, ticker, level):
+        if level:
+            levels[ticker] = level
+        else:
+            levels.pop(ticker, None)
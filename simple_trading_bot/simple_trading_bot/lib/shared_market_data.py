@@ -0,0 +1,240 @@
+from multiprocessing import shared_memory
+from types import MappingProxyType
+
+import numpy as np
+
+from simple_trading_bot.lib.market_data_feeds import (
+    EMPTY_BOOK_SNAPSHOT, BookSnapshot, MarketDataFeed, OrderbookLevel)
+from simple_trading_bot.lib.shared_book_store import SeqlockRows
+
+
+class SharedMarketData:
+    """
+    Class to share the top of book of the futures and the spot prices of the underliers across processes.
+    Data lives in a shared memory block with a fixed layout: a row per future (bid price, bid size,
+    ask price, ask size) and a row per underlier (spot price), missing values being NaN.
+    As in SharedBookStore, every row is guarded by a seqlock (see SeqlockRows), so readers copy the data out
+    without any lock and can tell which rows changed. There must be a single writer.
+    The condition shared with the writer is only used to wake up the readers waiting for new data.
+    """
+    BOOK_ROW_DTYPE = np.dtype([
+        ('sequence', '<u8'),
+        ('bid_price', '<f8'),
+        ('bid_size', '<f8'),
+        ('ask_price', '<f8'),
+        ('ask_size', '<f8')])
+    SPOT_ROW_DTYPE = np.dtype([('sequence', '<u8'), ('price', '<f8')])
+
+    def __init__(self, futures_tickers, underlier_tickers, update_condition, name=None):
+        """
+        update_condition: multiprocessing Condition notified on every publication.
+        name: shared memory block to attach to. A new one is created when not provided.
+        """
+        self._futures_tickers = list(futures_tickers)
+        self._underlier_tickers = list(underlier_tickers)
+        self._future_index = {ticker: index for index, ticker in enumerate(self._futures_tickers)}
+        self._underlier_index = {ticker: index for index, ticker in enumerate(self._underlier_tickers)}
+        self._update_condition = update_condition
+        size = (8 + len(self._futures_tickers) * self.BOOK_ROW_DTYPE.itemsize +
+                len(self._underlier_tickers) * self.SPOT_ROW_DTYPE.itemsize)
+        self._owner = name is None
+        #The block belongs to the creating process, which is the one to unlink it.
+        #Child processes share its resource tracker, so attaching does not change the block ownership.
+        self._shared_memory = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        buffer = self._shared_memory.buf
+        offset = 0
+        self._sequence = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += self._sequence.nbytes
+        self._book_rows = np.ndarray(
+            (len(self._futures_tickers),), dtype=self.BOOK_ROW_DTYPE, buffer=buffer, offset=offset)
+        offset += self._book_rows.nbytes
+        self._spot_rows = np.ndarray(
+            (len(self._underlier_tickers),), dtype=self.SPOT_ROW_DTYPE, buffer=buffer, offset=offset)
+        if self._owner:
+            self._sequence[:] = 0
+            self._book_rows[:] = (0, np.nan, np.nan, np.nan, np.nan)
+            self._spot_rows[:] = (0, np.nan)
+        self._books = SeqlockRows(self._book_rows, self._shared_memory.name)
+        self._spot_prices = SeqlockRows(self._spot_rows, self._shared_memory.name)
+
+    def spec(self):
+        """Arguments to attach to this shared data from another process (see attach)"""
+        return self._futures_tickers, self._underlier_tickers, self._update_condition, self._shared_memory.name
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(*spec)
+
+    def futures_tickers(self):
+        return list(self._futures_tickers)
+
+    def underlier_tickers(self):
+        return list(self._underlier_tickers)
+
+    def publish_books(self, levels):
+        """Publishes the (ticker, bid level, ask level) top of books given, where missing levels are None"""
+        for ticker, bid_level, ask_level in levels:
+            index = self._future_index.get(ticker)
+            if index is None:
+                continue
+            bid_price, bid_size = bid_level if bid_level else (np.nan, np.nan)
+            ask_price, ask_size = ask_level if ask_level else (np.nan, np.nan)
+            self._books.write(index, (bid_price, bid_size, ask_price, ask_size))
+        self._notify()
+
+    def publish_spot_prices(self, prices):
+        """Publishes the spot prices given, keyed by underlier ticker"""
+        for ticker, price in prices.items():
+            index = self._underlier_index.get(ticker)
+            if index is None:
+                continue
+            self._spot_prices.write(index, (price,))
+        self._notify()
+
+    def sequence(self):
+        return int(self._sequence[0])
+
+    def wait_for_update(self, last_sequence, timeout=None):
+        """Blocks until data is published after last_sequence or the timeout expires. Returns True on new data"""
+        with self._update_condition:
+            return self._update_condition.wait_for(lambda: self._sequence[0] != last_sequence, timeout)
+
+    def read(self):
+        """
+        Returns a copy of (sequence, book rows, spot rows), without taking any lock.
+        Every row is consistent, and at least as recent as the sequence returned.
+        """
+        sequence = int(self._sequence[0])
+        return sequence, self._books.copy(), self._spot_prices.copy()
+
+    def _notify(self):
+        self._sequence[0] += 1
+        with self._update_condition:
+            self._update_condition.notify_all()
+
+    def close(self):
+        #Views over the block must be released before closing it.
+        self._sequence = self._book_rows = self._spot_rows = self._books = self._spot_prices = None
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
+
+
+class SharedBooksFeed(MarketDataFeed):
+    """
+    Read side of the futures books published through SharedMarketData, with the RofexProxy books interface.
+    Only the top of book is shared, so no depth is available.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._book_snapshot = EMPTY_BOOK_SNAPSHOT
+        self._running = True
+
+    def start_listening(self):
+        self._running = True
+
+    def book_snapshot(self):
+        return self._book_snapshot
+
+    def bids(self):
+        return self._book_snapshot.bids
+
+    def asks(self):
+        return self._book_snapshot.asks
+
+    def depth(self):
+        return self._book_snapshot.depth
+
+    def update_books(self, rows):
+        """Updates the books with the (bid price, bid size, ask price, ask size) rows given, keyed by ticker"""
+        bids = dict(self._book_snapshot.bids)
+        asks = dict(self._book_snapshot.asks)
+        for ticker, (bid_price, bid_size, ask_price, ask_size) in rows.items():
+            self._set_level(bids, ticker, bid_price, bid_size)
+            self._set_level(asks, ticker, ask_price, ask_size)
+        self._book_snapshot = BookSnapshot(
+            self._last_update_sequence + 1, MappingProxyType(bids), MappingProxyType(asks))
+        self._update_last_timestamp(rows.keys())
+
+    @staticmethod
+    def _set_level(levels, ticker, price, size):
+        if np.isnan(price):
+            levels.pop(ticker, None)
+        else:
+            levels[ticker] = OrderbookLevel(float(price), float(size))
+
+
+class SharedSpotFeed(MarketDataFeed):
+    """
+    Read side of the spot prices published through SharedMarketData, with the SpotMDFeed interface.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._prices = {}
+        self._running = True
+
+    def start_listening(self):
+        self._running = True
+
+    def last_prices(self):
+        return self._prices.copy()
+
+    def price(self, ticker):
+        return self._prices.get(ticker, 0.)
+
+    def update_prices(self, prices):
+        self._prices = {**self._prices, **prices}
+        self._update_last_timestamp(prices.keys())
+
+
+class SharedMarketDataReader:
+    """
+    Class to read the data of a subset of futures (and their underliers) from SharedMarketData
+    into a SharedBooksFeed and a SharedSpotFeed. Only the rows changed since last refresh are read.
+    """
+
+    def __init__(self, shared_market_data, futures_tickers):
+        self._shared_market_data = shared_market_data
+        self._futures_tickers = shared_market_data.futures_tickers()
+        self._underlier_tickers = shared_market_data.underlier_tickers()
+        futures_tickers = set(futures_tickers)
+        self._own_futures = np.array([ticker in futures_tickers for ticker in self._futures_tickers], dtype=bool)
+        self._last_sequence = 0
+        self._book_sequences = np.zeros(len(self._futures_tickers), dtype=np.uint64)
+        self._spot_sequences = np.zeros(len(self._underlier_tickers), dtype=np.uint64)
+        self._books_feed = SharedBooksFeed()
+        self._spot_feed = SharedSpotFeed()
+
+    def books_feed(self):
+        return self._books_feed
+
+    def spot_feed(self):
+        return self._spot_feed
+
+    def last_sequence(self):
+        return self._last_sequence
+
+    def wait_for_update(self, timeout=None):
+        return self._shared_market_data.wait_for_update(self._last_sequence, timeout)
+
+    def refresh(self):
+        """Reads the data published since last refresh into the feeds. Returns True if anything changed"""
+        sequence, book_rows, spot_rows = self._shared_market_data.read()
+        if sequence == self._last_sequence:
+            return False
+        self._last_sequence = sequence
+        changed_futures = np.flatnonzero((book_rows['sequence'] != self._book_sequences) & self._own_futures)
+        changed_underliers = np.flatnonzero(spot_rows['sequence'] != self._spot_sequences)
+        self._book_sequences = book_rows['sequence']
+        self._spot_sequences = spot_rows['sequence']
+        spot_prices = spot_rows['price']
+        updated_prices = {self._underlier_tickers[index]: float(spot_prices[index])
+                          for index in changed_underliers if not np.isnan(spot_prices[index])}
+        if updated_prices:
+            self._spot_feed.update_prices(updated_prices)
+        if len(changed_futures):
+            self._books_feed.update_books({self._futures_tickers[index]: book_rows[index].item()[1:]
+                                           for index in changed_futures})
+        return bool(len(changed_futures) or len(changed_underliers))
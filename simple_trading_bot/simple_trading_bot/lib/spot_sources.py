@@ -0,0 +1,183 @@
+import asyncio
+import json
+import socket
+import threading
+import traceback
+
+import pyRofex
+import yfinance
+
+
+class SpotSource:
+    """
+    Interface for the sources of spot prices used by SpotMDFeed.
+    Once started, a source pushes the prices, keyed by underlier ticker, through on_prices as they change,
+    and calls on_error if it can not keep going.
+    Sources can also be started from the asyncio runtime (see start_async), by default they keep their own thread.
+    """
+
+    def start(self, on_prices, on_error):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    async def start_async(self, on_prices, on_error):
+        self.start(on_prices, on_error)
+
+    async def stop_async(self):
+        self.stop()
+
+
+class YfinanceSpotSource(SpotSource):
+    """
+    Source polling the daily close prices from yahoo finance on a regular basis.
+    Started from the asyncio runtime, polling is a task on the event loop, with the downloads run in its executor.
+    """
+
+    def __init__(self, instrument_expert, update_frequency):
+        self._tickers = instrument_expert.tradeable_yfinance_tickers()
+        self._inverse_ticker_map = instrument_expert.inverse_yfinance_tickers_map()
+        self._update_frequency = update_frequency
+        self._stop_event = threading.Event()
+        self._poll_task = None
+
+    def start(self, on_prices, on_error):
+        self._stop_event.clear()
+        threading.Thread(target=self._update_prices, args=(on_prices, on_error), daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._poll_task:
+            #Called from the event loop thread, as the task was started there.
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    async def start_async(self, on_prices, on_error):
+        self._stop_event.clear()
+        self._poll_task = asyncio.ensure_future(self._poll_prices(on_prices, on_error))
+
+    async def stop_async(self):
+        poll_task = self._poll_task
+        self.stop()
+        if poll_task:
+            await asyncio.gather(poll_task, return_exceptions=True)
+
+    def _update_prices(self, on_prices, on_error):
+        while not self._stop_event.is_set():
+            try:
+                on_prices(self._download_prices())
+            except Exception as e:
+                traceback.print_exc()
+                on_error(e)
+                return
+            self._stop_event.wait(self._update_frequency)
+
+    async def _poll_prices(self, on_prices, on_error):
+        loop = asyncio.get_running_loop()
+        while not self._stop_event.is_set():
+            try:
+                on_prices(await loop.run_in_executor(None, self._download_prices))
+            except Exception as e:
+                traceback.print_exc()
+                on_error(e)
+                return
+            await asyncio.sleep(self._update_frequency)
+
+    def _download_prices(self):
+        data = yfinance.download(
+            tickers=self._tickers,
+            period='1d',
+            interval='1d',
+            progress=False)
+        #Only the last close of each ticker is needed, so there is no need for a full records conversion.
+        closes = data['Close'].iloc[-1]
+        return {self._inverse_ticker_map[ticker]: float(closes[ticker]) for ticker in self._tickers}
+
+
+class RofexSpotSource(SpotSource):
+    """
+    Source streaming the last traded spot prices through the pyRofex websocket already opened by RofexProxy.
+    Prices are pushed per ticker as trades happen, with no polling.
+    """
+    DATA_ENTRIES = [pyRofex.MarketDataEntry.LAST]
+
+    def __init__(self, instrument_expert, pyrofex_wrapper):
+        self._tickers_map = instrument_expert.rofex_spot_tickers_map()
+        self._inverse_ticker_map = {v: k for k, v in self._tickers_map.items()}
+        self._pyrofex_wrapper = pyrofex_wrapper
+        self._on_prices = None
+        self._on_error = None
+
+    def start(self, on_prices, on_error):
+        self._on_prices = on_prices
+        self._on_error = on_error
+        self._pyrofex_wrapper.add_websocket_market_data_handler(self._market_data_handler)
+        self._pyrofex_wrapper.market_data_subscription(
+            tickers=list(self._tickers_map.values()),
+            entries=self.DATA_ENTRIES)
+
+    def stop(self):
+        try:
+            self._pyrofex_wrapper.remove_websocket_market_data_handler(self._market_data_handler)
+        except Exception:
+            pass
+
+    def _market_data_handler(self, message):
+        try:
+            ticker = self._inverse_ticker_map.get(message['instrumentId']['symbol'])
+            #Every websocket message goes through every handler, futures ones are dismissed here.
+            if ticker is None:
+                return
+            last = message['marketData'].get(pyRofex.MarketDataEntry.LAST.value)
+            if last:
+                self._on_prices({ticker: last['price']})
+        except Exception as e:
+            traceback.print_exc()
+            self._on_error(e)
+
+
+class LineStreamSpotSource(SpotSource):
+    """
+    Source reading prices from a stream of JSON lines, each one holding a {underlier ticker: price} mapping.
+    Useful for testing and local simulation, the stream can be a file or a socket (see from_socket).
+    A blocking read is used, so prices are pushed as soon as a line arrives. The source stops at the stream end.
+    """
+
+    def __init__(self, stream_factory):
+        """stream_factory: callable returning a new text stream to read lines from"""
+        self._stream_factory = stream_factory
+        self._stream = None
+        self._running = False
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(lambda: open(path, encoding='utf-8'))
+
+    @classmethod
+    def from_socket(cls, host, port):
+        return cls(lambda: socket.create_connection((host, port)).makefile('r', encoding='utf-8'))
+
+    def start(self, on_prices, on_error):
+        self._running = True
+        self._stream = self._stream_factory()
+        threading.Thread(target=self._read_prices, args=(self._stream, on_prices, on_error), daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        if self._stream:
+            self._stream.close()
+
+    def _read_prices(self, stream, on_prices, on_error):
+        try:
+            for line in stream:
+                if not self._running:
+                    break
+                if line.strip():
+                    on_prices(json.loads(line))
+        except Exception as e:
+            if self._running:
+                traceback.print_exc()
+                on_error(e)
+        finally:
+            stream.close()
@@ -0,0 +1,104 @@
+from collections.abc import Mapping
+
+#Marks the slots of the tickers without a value.
+_MISSING = object()
+
+
+class TickerMap(Mapping):
+    """
+    Class to represent an immutable mapping over a fixed set of tickers, each one with an integer id (its position).
+    Values are kept in a two level trie of tuples, CHUNK_SIZE ids per chunk: setting a ticker returns a new map
+    sharing every chunk but the one holding it, so an update copies CHUNK_SIZE + tickers / CHUNK_SIZE references
+    instead of the whole mapping, and the maps already published are left untouched.
+    Tickers out of the set are never found, and can not be set.
+    """
+    __slots__ = ('_tickers', '_ids', '_chunks', '_length')
+    CHUNK_SIZE = 32
+
+    def __init__(self, tickers, values=None):
+        """
+        tickers: every ticker the map can hold, in id order
+        values: initial values, keyed by ticker
+        """
+        self._tickers = tuple(tickers)
+        self._ids = {ticker: ticker_id for ticker_id, ticker in enumerate(self._tickers)}
+        chunk_count = -(-len(self._tickers) // self.CHUNK_SIZE)
+        slots = [_MISSING] * (chunk_count * self.CHUNK_SIZE)
+        for ticker, value in (values or {}).items():
+            slots[self._ids[ticker]] = value
+        self._chunks = tuple(tuple(slots[start:start + self.CHUNK_SIZE])
+                             for start in range(0, len(slots), self.CHUNK_SIZE))
+        self._length = sum(1 for value in slots if value is not _MISSING)
+
+    def __repr__(self):
+        return f'TickerMap({dict(self)})'
+
+    def __getitem__(self, ticker):
+        value = self.get(ticker, _MISSING)
+        if value is _MISSING:
+            raise KeyError(ticker)
+        return value
+
+    def __contains__(self, ticker):
+        return self.get(ticker, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        for chunk_index, chunk in enumerate(self._chunks):
+            for offset, value in enumerate(chunk):
+                if value is not _MISSING:
+                    yield self._tickers[chunk_index * self.CHUNK_SIZE + offset]
+
+    def __len__(self):
+        return self._length
+
+    def get(self, ticker, default=None):
+        ticker_id = self._ids.get(ticker)
+        if ticker_id is None:
+            return default
+        return self.get_by_id(ticker_id, default)
+
+    def get_by_id(self, ticker_id, default=None):
+        value = self._chunks[ticker_id // self.CHUNK_SIZE][ticker_id % self.CHUNK_SIZE]
+        return default if value is _MISSING else value
+
+    def tickers(self):
+        """Every ticker the map can hold, indexed by id"""
+        return self._tickers
+
+    def ticker_id(self, ticker):
+        """Id of the ticker, None if the map can not hold it"""
+        return self._ids.get(ticker)
+
+    def set(self, ticker, value):
+        return self.set_by_id(self._ids[ticker], value)
+
+    def set_by_id(self, ticker_id, value):
+        """Returns a new map with the value of the ticker set"""
+        return self._replace(ticker_id, value)
+
+    def remove_by_id(self, ticker_id):
+        """Returns a new map without the ticker, or this one if it had no value"""
+        return self._replace(ticker_id, _MISSING)
+
+    def without(self, tickers):
+        """Returns a new map without the tickers given"""
+        ticker_map = self
+        for ticker in tickers:
+            ticker_id = self._ids.get(ticker)
+            if ticker_id is not None:
+                ticker_map = ticker_map.remove_by_id(ticker_id)
+        return ticker_map
+
+    def _replace(self, ticker_id, value):
+        chunk_index, offset = divmod(ticker_id, self.CHUNK_SIZE)
+        chunk = self._chunks[chunk_index]
+        previous = chunk[offset]
+        if previous is _MISSING and value is _MISSING:
+            return self
+        ticker_map = TickerMap.__new__(TickerMap)
+        ticker_map._tickers = self._tickers
+        ticker_map._ids = self._ids
+        ticker_map._chunks = (self._chunks[:chunk_index] + (chunk[:offset] + (value,) + chunk[offset + 1:],) +
+                              self._chunks[chunk_index + 1:])
+        ticker_map._length = self._length + (previous is _MISSING) - (value is _MISSING)
+        return ticker_map
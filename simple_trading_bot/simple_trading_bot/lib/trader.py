@@ -1,27 +1,57 @@
+import heapq
+import time
 from collections import namedtuple
 
 import pyRofex
 
+import simple_trading_bot.conf.funding_rates as fr
 import simple_trading_bot.conf.transaction_costs as tc
+import simple_trading_bot.lib.exceptions as exc
+from simple_trading_bot.lib.event_journal import console_journal
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+from simple_trading_bot.lib.market_data_feeds import FLOAT_LIMIT
+from simple_trading_bot.lib.order_gateway import OrderGateway
 
 
 class Trader:
     """
     Class to detect IR arbitrage opportunities and place orders in the exchange.
     """
+    #Rates of each side considered when the best pair of a maturity can not be traded.
+    MAX_CANDIDATES_PER_SIDE = 5
+
     def __init__(
             self,
             instrument_expert,
             ir_expert,
             rofex_proxy,
             yfinance_md_feed,
-            data_update_watchman):
+            data_update_watchman,
+            order_gateway=None,
+            opportunity_engine=None,
+            journal=None,
+            transaction_cost=tc.TRANSACITON_COST):
         self._futures_by_ticker = instrument_expert.rofex_instruments_by_ticker()
         self._maturity_tags = instrument_expert.tradeable_maturity_tags()
         self._ir_expert = ir_expert
         self._rofex_proxy = rofex_proxy
         self._yfinance_md_feed = yfinance_md_feed
         self._data_update_watchman = data_update_watchman
+        self._order_gateway = order_gateway or OrderGateway(rofex_proxy)
+        #Set an opportunity engine to trade across maturity dates too (see evaluate_and_trade_cross_tenor).
+        self._opportunity_engine = opportunity_engine
+        self._funding_rate = opportunity_engine.funding_rate() if opportunity_engine else fr.FUNDING_RATE
+        self._journal = journal or console_journal()
+        #Strong assumption: transaction cost can be expressed as a constant rate difference.
+        self._transaction_cost = transaction_cost
+        self._tick_to_decision = LatencyHistogram('Tick to decision')
+
+    def order_gateway(self):
+        return self._order_gateway
+
+    def tick_to_decision(self):
+        """Time from the receipt of the data until orders are decided on it"""
+        return self._tick_to_decision
 
     def evaluate_and_trade_each_maturiry(self):
         for maturity_tag in self._maturity_tags:
@@ -33,9 +63,64 @@ class Trader:
         #Try to sell the more expensive taker and buy the cheaper offered.
         ticker_to_sell, max_taker_rate = self._ir_expert.max_taker_rate(maturity_tag=maturity_tag)
         ticker_to_buy, min_offered_rate = self._ir_expert.min_offered_rate(maturity_tag=maturity_tag)
-        #Strong assumption: transaction cost can be expressed as a constant rate difference.
-        if not max_taker_rate - min_offered_rate > tc.TRANSACITON_COST:
+        if not max_taker_rate - min_offered_rate > self._transaction_cost:
+            return
+        if self._trade_pair(maturity_tag, ticker_to_buy, min_offered_rate, ticker_to_sell, max_taker_rate):
+            return
+        #The best pair can not be sized (i.e. contract sizes too unbalanced), fall back to the next profitable ones.
+        for ticker_to_buy, min_offered_rate, ticker_to_sell, max_taker_rate in self._ranked_pairs(maturity_tag):
+            if self._trade_pair(maturity_tag, ticker_to_buy, min_offered_rate, ticker_to_sell, max_taker_rate):
+                return
+
+    def evaluate_and_trade_cross_tenor(self):
+        """Look for arbitrage opportunities between futures of different maturity dates and place orders if found."""
+        if self._opportunity_engine is None:
             return
+        opportunity = self._opportunity_engine.best_opportunity()
+        if opportunity is None:
+            return
+        tenure = (f'{self._futures_by_ticker[opportunity.ticker_to_buy].maturity_date():%Y-%m-%d}/'
+                  f'{self._futures_by_ticker[opportunity.ticker_to_sell].maturity_date():%Y-%m-%d}')
+        self._trade_pair(
+            tenure, opportunity.ticker_to_buy, opportunity.offered_rate, opportunity.ticker_to_sell, opportunity.taker_rate)
+
+    def _ranked_pairs(self, maturity_tag):
+        """
+        Yields the (ticker to buy, offered rate, ticker to sell, taker rate) pairs of the maturity
+        clearing the transaction cost, from the most profitable one on, but the best pair (already tried).
+        Only the MAX_CANDIDATES_PER_SIDE best rates of each side are considered.
+        Pairs are walked through a frontier over both ranked lists, so no pair is evaluated before a better one.
+        """
+        takers = self._ir_expert.ranked_taker_rates(maturity_tag, self.MAX_CANDIDATES_PER_SIDE)
+        offereds = self._ir_expert.ranked_offered_rates(maturity_tag, self.MAX_CANDIDATES_PER_SIDE)
+        if not takers or not offereds:
+            return
+        frontier = [(offereds[0][1] - takers[0][1], 0, 0)]
+        visited = {(0, 0)}
+        while frontier:
+            negated_profit, taker_index, offered_index = heapq.heappop(frontier)
+            if not -negated_profit > self._transaction_cost:
+                return
+            ticker_to_sell, taker_rate = takers[taker_index]
+            ticker_to_buy, offered_rate = offereds[offered_index]
+            if (taker_index, offered_index) != (0, 0) and ticker_to_buy != ticker_to_sell:
+                yield ticker_to_buy, offered_rate, ticker_to_sell, taker_rate
+            for next_indexes in ((taker_index + 1, offered_index), (taker_index, offered_index + 1)):
+                if next_indexes[0] < len(takers) and next_indexes[1] < len(offereds) and next_indexes not in visited:
+                    visited.add(next_indexes)
+                    heapq.heappush(frontier, (offereds[next_indexes[1]][1] - takers[next_indexes[0]][1],) + next_indexes)
+
+    def _trade_pair(self, tenure, ticker_to_buy, min_offered_rate, ticker_to_sell, max_taker_rate):
+        """
+        Buys ticker_to_buy and sells ticker_to_sell (hedged with their underliers) with the depth available.
+        Futures may mature on different dates, in which case the gap between them is bridged at the funding rate,
+        so rates are compared in rate times days, along the longest leg. On the same date this is just the rate gap.
+        Returns False when no order can be sized, so other pairs can be tried.
+        """
+        #Books restored from a checkpoint are only traded once refreshed by the exchange.
+        stale_tickers = self._ir_expert.book_snapshot().stale
+        if ticker_to_buy in stale_tickers or ticker_to_sell in stale_tickers:
+            return False
         #If arb opportunity found determines the trade size.
         future_to_buy = self._futures_by_ticker[ticker_to_buy]
         future_to_sell = self._futures_by_ticker[ticker_to_sell]
@@ -45,68 +130,110 @@ class Trader:
         underlier_to_sell = future_to_buy.underlier_ticker()
         underlier_sell_price = self._yfinance_md_feed.price(underlier_to_sell)
 
-        future_asks = self._rofex_proxy.asks()
-        future_bids = self._rofex_proxy.bids()
-        available_buy_size = future_asks[ticker_to_buy].size
-        available_sell_size = future_bids[ticker_to_sell].size
+        buy_days = self._ir_expert.days_to_maturity(ticker_to_buy)
+        sell_days = self._ir_expert.days_to_maturity(ticker_to_sell)
+        max_days = max(buy_days, sell_days)
+        #Take depth as long as any level bought still clears the transaction cost against any level sold,
+        #which holds when the profit in excess of it is split evenly between both sides.
+        #Depth is read from the same books the rates were computed from.
+        excess = (sell_days * (max_taker_rate - self._funding_rate) -
+                  buy_days * (min_offered_rate - self._funding_rate) - self._transaction_cost * max_days)
+        available_buy_size = self._ir_expert.max_qty_at_rate(
+            ticker_to_buy, pyRofex.Side.BUY, min_offered_rate + excess * 0.5 / buy_days)
+        available_sell_size = self._ir_expert.max_qty_at_rate(
+            ticker_to_sell, pyRofex.Side.SELL, max_taker_rate - excess * 0.5 / sell_days)
         #Minimum available size in cash amount.
         amount_to_trade = min(
             available_buy_size * future_to_buy.contract_size() * underlier_sell_price,
             available_sell_size * future_to_sell.contract_size() * underlier_buy_price)
-        #Round up the sizes (in contract units). This has issues when few contracts are available.
-        buy_size = int(amount_to_trade / future_to_buy.contract_size() / underlier_sell_price + 0.5)
-        sell_size = int(amount_to_trade / future_to_sell.contract_size() / underlier_buy_price + 0.5)
-        buy_price = future_asks[ticker_to_buy].price
-        sell_price = future_bids[ticker_to_sell].price
+        #Round down the sizes (in contract units), so no order reaches beyond the depth clearing the cost.
+        buy_size = int(min(amount_to_trade / future_to_buy.contract_size() / underlier_sell_price,
+                           available_buy_size) + FLOAT_LIMIT)
+        sell_size = int(min(amount_to_trade / future_to_sell.contract_size() / underlier_buy_price,
+                            available_sell_size) + FLOAT_LIMIT)
+        #Limit prices are set at the deepest level needed to fill each order.
+        buy_price = self._ir_expert.depth_book(ticker_to_buy).limit_price(pyRofex.Side.BUY, buy_size)
+        sell_price = self._ir_expert.depth_book(ticker_to_sell).limit_price(pyRofex.Side.SELL, sell_size)
+        buy_rate = self._ir_expert.sweep_rate(ticker_to_buy, pyRofex.Side.BUY, buy_size)
+        buy_rate = min_offered_rate if buy_rate is None else buy_rate
+        sell_rate = self._ir_expert.sweep_rate(ticker_to_sell, pyRofex.Side.SELL, sell_size)
+        sell_rate = max_taker_rate if sell_rate is None else sell_rate
         underlier_buy_size = sell_size * future_to_sell.contract_size()
         underlier_sell_size = buy_size * future_to_buy.contract_size()
-        #Estimate the profit.
-        trade_rate_profit = (max_taker_rate - min_offered_rate - tc.TRANSACITON_COST)
+        #Estimate the profit using the volume weighted rates.
+        trade_rate_profit = (sell_days * (sell_rate - self._funding_rate) -
+                             buy_days * (buy_rate - self._funding_rate)) / max_days - self._transaction_cost
         av_position_to_take = (underlier_buy_size * underlier_buy_price +
                                underlier_sell_size * underlier_sell_price) * 0.5
-        #If the data is not ahead and order sizes make sense, place orders and print trade info.
-        if not self._data_update_watchman.should_update() and (buy_size * sell_size) > 0:
+        if not buy_size * sell_size > 0 or trade_rate_profit <= 0:
+            return False
+        #If the data is not ahead, place orders and journal trade info.
+        if not self._data_update_watchman.should_update():
+            tick_time = self._data_update_watchman.round_receipt_time()
+            self._tick_to_decision.record(time.perf_counter() - tick_time)
+            buy_leg = dict(ticker=ticker_to_buy, size=buy_size, price=buy_price, rate=buy_rate, days=buy_days,
+                           underlier=underlier_to_sell, underlier_size=underlier_sell_size,
+                           underlier_price=underlier_sell_price)
+            sell_leg = dict(ticker=ticker_to_sell, size=sell_size, price=sell_price, rate=sell_rate, days=sell_days,
+                            underlier=underlier_to_buy, underlier_size=underlier_buy_size,
+                            underlier_price=underlier_buy_price)
+            self._journal.debug('decision', tenure=tenure, buy=buy_leg, sell=sell_leg,
+                                rate_profit=trade_rate_profit, average_position=av_position_to_take)
+
+            def trade_info_text(buy_order, buy_order_status, sell_order, sell_order_status):
+                trade_info = [
+                    f'--- Trade Info For Tenure {tenure} ---',
+                    'Rate long side:',
+                    f'Buy:      {ticker_to_buy:<12} -> {buy_size:>8} @ {buy_price:.2f}',
+                    f'Sell:     {underlier_to_sell:<12} -> {underlier_sell_size:>8} @ {underlier_sell_price:.2f}',
+                    f'Imp Rate: {buy_rate:.6f}',
+                    f'Traded amount: {underlier_sell_size * underlier_sell_price:.2f}',
+                    f'Order reception info:   {buy_order}',
+                    f'Order execution status: {buy_order_status}',
+                    f'---',
+                    f'Rate short side:',
+                    f'Sell:     {ticker_to_sell:<12} -> {sell_size:>8} @ {sell_price:.2f}',
+                    f'Buy:      {underlier_to_buy:<12} -> {underlier_buy_size:>8} @ {underlier_buy_price:.2f}',
+                    f'Imp Rate: {sell_rate:.6f}',
+                    f'Traded amount: {underlier_buy_size * underlier_buy_price:.2f}',
+                    f'Order reception info:   {sell_order}',
+                    f'Order execution status: {sell_order_status}',
+                    f'--------------------------------------------',
+                    f'Trade rate profit:     {trade_rate_profit:.6f}',
+                    f'Average position size: {av_position_to_take:.2f}',
+                    f'--------------------------------------------',
+                    '']
+                return '\n'.join(trade_info)
+
+            def journal_trade_info(order_futures):
+                buy_order, buy_order_status = self._order_gateway.order_info(order_futures[0])
+                sell_order, sell_order_status = self._order_gateway.order_info(order_futures[1])
+                self._journal.info(
+                    'trade', lambda: trade_info_text(buy_order, buy_order_status, sell_order, sell_order_status),
+                    tenure=tenure, buy=buy_leg, sell=sell_leg, rate_profit=trade_rate_profit,
+                    buy_order=buy_order, buy_order_status=buy_order_status,
+                    sell_order=sell_order, sell_order_status=sell_order_status)
+
+            #Both legs are sent concurrently, without waiting for the acks on this thread.
             #Either pyRofex or remarkets seems not to be allowing Market orders
             #so we need to use Limits with the correct price
-            buy_order = self._rofex_proxy.place_order(
-                ticker=ticker_to_buy,
-                side=pyRofex.Side.BUY,
-                size=buy_size,
-                price=buy_price,
-                time_in_force=pyRofex.TimeInForce.ImmediateOrCancel,
-                order_type=pyRofex.OrderType.LIMIT)
-            sell_order = self._rofex_proxy.place_order(
-                ticker=ticker_to_sell,
-                side=pyRofex.Side.SELL,
-                size=sell_size,
-                price=sell_price,
-                time_in_force=pyRofex.TimeInForce.ImmediateOrCancel,
-                order_type=pyRofex.OrderType.LIMIT)
-
-            #TODO: improve order tracking.
-            #TODO: wrap trade info and use a printer class.
-            trade_info = [
-                f'--- Trade Info For Tenure {maturity_tag} ---',
-                'Rate long side:',
-                f'Buy:      {ticker_to_buy:<12} -> {buy_size:>8} @ {buy_price:.2f}',
-                f'Sell:     {underlier_to_sell:<12} -> {underlier_sell_size:>8} @ {underlier_sell_price:.2f}',
-                f'Imp Rate: {min_offered_rate:.6f}',
-                f'Traded amount: {underlier_sell_size * underlier_sell_price:.2f}',
-                f'Order reception info:   {buy_order}',
-                f'Order execution status: {self._rofex_proxy.order_execution_status(buy_order["order"]["clientId"])}',
-                f'---',
-                f'Rate short side:',
-                f'Sell:     {ticker_to_sell:<12} -> {sell_size:>8} @ {sell_price:.2f}',
-                f'Buy:      {underlier_to_buy:<12} -> {underlier_buy_size:>8} @ {underlier_buy_price:.2f}',
-                f'Imp Rate: {max_taker_rate:.6f}',
-                f'Traded amount: {underlier_buy_size * underlier_buy_price:.2f}',
-                f'Order reception info:   {sell_order}',
-                f'Order execution status: {self._rofex_proxy.order_execution_status(sell_order["order"]["clientId"])}',
-                f'--------------------------------------------',
-                f'Trade rate profit:     {trade_rate_profit:.6f}',
-                f'Average position size: {av_position_to_take:.2f}',
-                f'--------------------------------------------',
-                '']
-
-            print('\n'.join(trade_info), flush=True)
-
+            try:
+                self._order_gateway.send_orders(
+                    dict(ticker=ticker_to_buy,
+                         side=pyRofex.Side.BUY,
+                         size=buy_size,
+                         price=buy_price,
+                         time_in_force=pyRofex.TimeInForce.ImmediateOrCancel,
+                         order_type=pyRofex.OrderType.LIMIT),
+                    dict(ticker=ticker_to_sell,
+                         side=pyRofex.Side.SELL,
+                         size=sell_size,
+                         price=sell_price,
+                         time_in_force=pyRofex.TimeInForce.ImmediateOrCancel,
+                         order_type=pyRofex.OrderType.LIMIT),
+                    on_all_done=journal_trade_info,
+                    tick_time=tick_time)
+            except exc.RiskLimitBreached as e:
+                self._journal.warning('risk_rejected', f'Trade for tenure {tenure} not sent. {e}',
+                                      tenure=tenure, buy=buy_leg, sell=sell_leg, reason=e.reason)
+        return True
@@ -1,62 +1,384 @@
+import asyncio
+import datetime as dt
 import time
 import traceback
 
+import simple_trading_bot.conf.conflation as cf
+import simple_trading_bot.conf.journal as jr
+import simple_trading_bot.conf.reference_data as rd
+from simple_trading_bot.lib.checkpoint import Checkpointer, StateCheckpoint
+from simple_trading_bot.lib.conflation import ConflatingBookCache
 from simple_trading_bot.lib.ir_expert import IRExpert
-from simple_trading_bot.lib.market_data_feeds import RofexProxy, YfinanceMDFeed
+from simple_trading_bot.lib.market_data_feeds import RofexProxy, SpotMDFeed, YfinanceMDFeed
 from simple_trading_bot.lib.instrument_expert import InstrumentExpert
 from simple_trading_bot.lib.data_update_watchman import DataUpdateWatchman
+from simple_trading_bot.lib.event_journal import EventJournal
 from simple_trading_bot.lib.ir_printer import IRPrinter
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder
+from simple_trading_bot.lib.metrics_server import MetricsRegistry, MetricsServer
+from simple_trading_bot.lib.opportunity_engine import OpportunityEngine
+from simple_trading_bot.lib.order_gateway import OrderGateway
+from simple_trading_bot.lib.reference_data_cache import ReferenceDataCache
+from simple_trading_bot.lib.risk_engine import RiskEngine
+from simple_trading_bot.lib.shared_book_store import SharedBookStore
+from simple_trading_bot.lib.spot_sources import RofexSpotSource
 from simple_trading_bot.lib.trader import Trader
+from simple_trading_bot.lib.vectorized_ir_expert import VectorizedIRExpert
 
 
 class IRArbitrageTradingBot:
+    #Max time to block waiting for data, so the feeds health can still be checked.
+    UPDATE_WAIT_TIMEOUT = 1.
+    LATENCY_REPORT_PERIOD = 60.
+    CHECKPOINT_VERSION = 1
 
-    def __init__(self, tickers, spot_update_frequency):
-        self._instrument_expert = InstrumentExpert(tickers)
-        self._rofex_proxy = RofexProxy(self._instrument_expert)
-        self._yfinance_md_feed = YfinanceMDFeed(self._instrument_expert, spot_update_frequency)
-        self._data_update_watchman = DataUpdateWatchman(self._rofex_proxy, self._yfinance_md_feed)
-        self._ir_expert = IRExpert(self._instrument_expert, self._rofex_proxy, self._yfinance_md_feed)
-        self._ir_printer = IRPrinter(self._ir_expert)
+    def __init__(
+            self,
+            tickers,
+            spot_update_frequency,
+            event_driven=True,
+            vectorized_rates=False,
+            record_path=None,
+            streaming_spot=False,
+            book_store_path=None,
+            cross_tenor=False,
+            journal_path=None,
+            console_level=jr.CONSOLE_LEVEL,
+            metrics_port=None,
+            fast_decoding=False,
+            conflation_policy=cf.POLICY,
+            checkpoint_path=None):
+        self._tickers = tickers
+        self._event_driven = event_driven
+        #Set fast_decoding to decode the futures market data ahead of pyRofex (see FastMarketDataDecoder).
+        self._fast_decoding = fast_decoding
+        #Set cross_tenor to trade futures of different maturity dates against each other too.
+        self._cross_tenor = cross_tenor
+        #Set streaming_spot to get spot prices through the Rofex websocket instead of polling yahoo finance.
+        self._streaming_spot = streaming_spot
+        self._keep_running = True
+        #Set when running on the asyncio runtime (see launch_async).
+        self._loop = None
+        self._update_event = None
+        self._wakeup_scheduled = False
+        #Market data, rates, decisions and orders are journaled from a background thread,
+        #into a JSON lines file if a journal path is set, and echoed to the console (disabled if level is None).
+        self._journal = EventJournal(journal_path, level=jr.JOURNAL_LEVEL, console_level=console_level)
+        self._decision_latency = LatencyHistogram('Wakeup to decision')
+        self._update_rates_latency = LatencyHistogram('Update rates')
+        self._last_latency_report = time.monotonic()
+        #Set a checkpoint path to checkpoint the bot state periodically, and resume from it on restart.
+        self._checkpoint = StateCheckpoint(checkpoint_path) if checkpoint_path else None
+        self._resume_state = self._load_checkpoint() if self._checkpoint else None
+        #Set a record path to capture the market data received, so it can be replayed offline.
+        self._recorder = MarketDataRecorder(record_path) if record_path else None
+        self._instrument_expert = self._create_instrument_expert(tickers)
+        #Set a book store path to share the top of books with other processes (see SharedBookStoreReader).
+        self._book_store = (SharedBookStore(book_store_path, self._instrument_expert.tradeable_rofex_tickers())
+                            if book_store_path else None)
+        self._rofex_proxy = self._create_rofex_proxy()
+        self._yfinance_md_feed = self._create_yfinance_md_feed(spot_update_frequency)
+        #The strategy reads the books through a last-value cache, conflating the updates of each instrument.
+        self._book_cache = ConflatingBookCache(self._rofex_proxy, policy=conflation_policy)
+        self._data_update_watchman = DataUpdateWatchman(self._book_cache, self._yfinance_md_feed)
+        ir_expert_class = VectorizedIRExpert if vectorized_rates else IRExpert
+        self._ir_expert = ir_expert_class(self._instrument_expert, self._book_cache, self._yfinance_md_feed)
+        self._ir_printer = IRPrinter(self._ir_expert, journal=self._journal)
+        #Positions are tracked from the order reports, and every order goes through the pre-trade risk checks.
+        self._risk_engine = RiskEngine(self._instrument_expert, self._rofex_proxy, self._yfinance_md_feed)
+        self._order_gateway = OrderGateway(self._rofex_proxy, risk_engine=self._risk_engine)
+        self._opportunity_engine = (OpportunityEngine(self._instrument_expert, self._ir_expert)
+                                    if cross_tenor else None)
         self._trader = Trader(
             self._instrument_expert,
             self._ir_expert,
             self._rofex_proxy,
             self._yfinance_md_feed,
-            self._data_update_watchman)
+            self._data_update_watchman,
+            self._order_gateway,
+            self._opportunity_engine,
+            journal=self._journal)
+        #Latency of each hot path stage, from the websocket message receipt to the order ack.
+        self._metrics = MetricsRegistry()
+        self._metrics.register(
+            self._data_update_watchman.detection_latency(),
+            self._update_rates_latency,
+            self._decision_latency,
+            self._trader.tick_to_decision(),
+            self._order_gateway.tick_to_order(),
+            self._order_gateway.ack_latency(),
+            self._order_gateway.leg_skew(),
+            self._rofex_proxy.supervisor().recovery_time())
+        self._metrics.register_source(self._rofex_proxy.rest_latencies)
+        #Set a metrics port to serve them in the Prometheus format (0 for any free port).
+        self._metrics_server = MetricsServer(self._metrics, metrics_port) if metrics_port is not None else None
+        self._checkpointer = (Checkpointer(self._checkpoint, self.checkpoint_state, journal=self._journal)
+                              if self._checkpoint else None)
+        if self._resume_state:
+            self._resume(self._resume_state)
 
     def launch(self):
         self._start()
         self._run()
         self._finish()
 
+    async def launch_async(self):
+        """
+        Runs the bot on an asyncio event loop, i.e. asyncio.run(bot.launch_async()).
+        Feeds are started from the loop (blocking pyRofex calls in its executor, spot prices polled by a task),
+        and rounds run as a coroutine woken up by the feeds. The pyRofex websocket keeps its own thread.
+        """
+        await self._start_async()
+        await self._run_async()
+        await self._finish_async()
+
+    def stop(self):
+        """Requests the trading loop to finish after the current round"""
+        self._keep_running = False
+        if self._loop:
+            self._wake_up()
+
+    def decision_latency(self):
+        return self._decision_latency
+
+    def order_gateway(self):
+        return self._order_gateway
+
+    def book_cache(self):
+        return self._book_cache
+
+    def risk_engine(self):
+        return self._risk_engine
+
+    def journal(self):
+        return self._journal
+
+    def resumed(self):
+        """True if the bot resumed from a checkpoint"""
+        return self._resume_state is not None
+
+    def metrics(self):
+        return self._metrics
+
+    def metrics_server(self):
+        return self._metrics_server
+
+    def process_update(self):
+        """
+        Runs a single round: rates update, and arbitrage evaluation and trading.
+        Every update received until now is coalesced into this round.
+        """
+        self._data_update_watchman.set_last_processed_sequence()
+        update_start = time.perf_counter()
+        self._ir_expert.update_rates()
+        self._update_rates_latency.record(time.perf_counter() - update_start)
+        if self._opportunity_engine:
+            self._opportunity_engine.update()
+        if self._ir_expert.ready():
+            #Rates are drawn by the printer thread, the trading loop never waits on them.
+            self._ir_printer.print_rates()
+            self._trader.evaluate_and_trade_each_maturiry()
+            self._trader.evaluate_and_trade_cross_tenor()
+
+    def checkpoint_state(self):
+        """
+        Bot state to resume from: instruments reference data, books, spot prices, positions and open orders.
+        Rates are not kept, they are computed again from the books and spot prices restored.
+        """
+        depth = self._rofex_proxy.book_snapshot().depth
+        return {
+            'version': self.CHECKPOINT_VERSION,
+            'trading_date': dt.date.today().isoformat(),
+            'tickers': sorted(self._tickers),
+            'reference_data': self._instrument_expert.reference_data(),
+            'books': {ticker: [list(book.bids()), list(book.asks())] for ticker, book in depth.items()},
+            'spot_prices': self._yfinance_md_feed.last_prices(),
+            'risk': self._risk_engine.state()}
+
+    def _load_checkpoint(self):
+        """Returns the state checkpointed, if it was taken on the current trading date for the same tickers"""
+        checkpoint = self._checkpoint.read()
+        if checkpoint is None:
+            return None
+        timestamp, state = checkpoint
+        if (state.get('version') != self.CHECKPOINT_VERSION
+                or state.get('trading_date') != dt.date.today().isoformat()
+                or state.get('tickers') != sorted(self._tickers)):
+            self._journal.warning('checkpoint_discarded', f'Checkpoint {self._checkpoint.path()} discarded, '
+                                                          f'taken on another date or for other tickers')
+            return None
+        self._journal.info('checkpoint_loaded', f'Resuming from checkpoint {self._checkpoint.path()} '
+                                                f'taken {time.time() - timestamp:.1f} seconds ago',
+                           timestamp=timestamp)
+        return state
+
+    def _resume(self, state):
+        #Books stay stale, so they are not traded, until the exchange refreshes them.
+        self._rofex_proxy.restore_books(state['books'])
+        self._yfinance_md_feed.restore_prices(state['spot_prices'])
+        self._risk_engine.restore(state['risk'])
+        #Reports of the orders restored, done while stopped, are only received if old ones are requested.
+        self._rofex_proxy.request_old_order_reports()
+
+    def _create_instrument_expert(self, tickers):
+        if self._resume_state:
+            return InstrumentExpert(tickers, rest_instruments=self._resume_state['reference_data'],
+                                    recorder=self._recorder, cross_tenor=self._cross_tenor)
+        #Reference data is cached on disk, so restarts are ready to trade without downloading it again.
+        reference_data_cache = ReferenceDataCache(rd.CACHE_PATH, rd.CACHE_TTL)
+        return InstrumentExpert(tickers, recorder=self._recorder, reference_data_cache=reference_data_cache,
+                                cross_tenor=self._cross_tenor)
+
+    def _create_rofex_proxy(self):
+        #Order reports are used to track the orders execution.
+        return RofexProxy(
+            self._instrument_expert,
+            subscribe_to_order_report=True,
+            recorder=self._recorder,
+            book_store=self._book_store,
+            journal=self._journal,
+            fast_decoding=self._fast_decoding)
+
+    def _create_yfinance_md_feed(self, spot_update_frequency):
+        if self._streaming_spot:
+            spot_source = RofexSpotSource(self._instrument_expert, self._rofex_proxy.pyrofex_wrapper())
+            return SpotMDFeed(spot_source, recorder=self._recorder, journal=self._journal)
+        return YfinanceMDFeed(
+            self._instrument_expert, spot_update_frequency, recorder=self._recorder, journal=self._journal)
+
     def _start(self):
-        self._yfinance_md_feed.start_listening()
+        #Streamed spot prices go through the websocket opened by RofexProxy, so it must be started first.
         self._rofex_proxy.start_listening()
+        self._book_cache.start_listening()
+        self._yfinance_md_feed.start_listening()
+        if self._checkpointer:
+            self._checkpointer.start()
+        if self._metrics_server:
+            self._metrics_server.start()
+        self._ir_printer.start()
+
+    async def _start_async(self):
+        #Streamed spot prices go through the websocket opened by RofexProxy, so it must be started first.
+        await self._rofex_proxy.start_listening_async()
+        await self._book_cache.start_listening_async()
+        await self._yfinance_md_feed.start_listening_async()
+        if self._checkpointer:
+            self._checkpointer.start()
+        if self._metrics_server:
+            self._metrics_server.start()
+        self._ir_printer.start()
 
     def _run(self):
-        while True:
+        while self._keep_running:
             try:
-                if self._data_update_watchman.should_update():
-                    self._data_update_watchman.set_last_processed_timestamp()
-                    self._ir_expert.update_rates()
-                    if self._ir_expert.ready():
-                        try:
-                            self._ir_printer.print_rates()
-                        except Exception:
-                            print(f'Exception ocurred printing rates. Continuing...')
-                        self._trader.evaluate_and_trade_each_maturiry()
+                if self._wait_for_update():
+                    wakeup_time = time.perf_counter()
+                    self.process_update()
+                    self._decision_latency.record(time.perf_counter() - wakeup_time)
+                self._report_latency()
             except Exception as e:
-                traceback.print_exc()
-                print(f'Exception occurred during trading. Stopping...')
+                self._journal.error('trading_error', 'Exception occurred during trading. Stopping...',
+                                    error=traceback.format_exc())
+                break
+            if not self._keep_running:
                 break
+            if not self._rofex_proxy.running():
+                self._rofex_proxy.start_listening()
             if not self._yfinance_md_feed.running():
                 self._yfinance_md_feed.start_listening()
+
+    async def _run_async(self):
+        self._update_event = asyncio.Event()
+        self._wakeup_scheduled = False
+        self._loop = asyncio.get_running_loop()
+        self._book_cache.add_update_listener(self._wake_up)
+        self._yfinance_md_feed.add_update_listener(self._wake_up)
+        while self._keep_running:
+            try:
+                if await self._wait_for_update_async():
+                    wakeup_time = time.perf_counter()
+                    self.process_update()
+                    self._decision_latency.record(time.perf_counter() - wakeup_time)
+                self._report_latency()
+            except Exception as e:
+                self._journal.error('trading_error', 'Exception occurred during trading. Stopping...',
+                                    error=traceback.format_exc())
+                break
+            if not self._keep_running:
+                break
             if not self._rofex_proxy.running():
-                self._rofex_proxy.start_listening()
+                await self._rofex_proxy.start_listening_async()
+            if not self._yfinance_md_feed.running():
+                await self._yfinance_md_feed.start_listening_async()
+            #Other tasks (i.e. the spot prices polling) get their turn between rounds.
+            await asyncio.sleep(0)
+
+    def _wake_up(self):
+        #Feeds notify from their own threads, the loop is woken up once per round.
+        if self._wakeup_scheduled:
+            return
+        self._wakeup_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._update_event.set)
+        except RuntimeError:
+            #Loop already closed, the bot is finishing.
+            pass
+
+    async def _wait_for_update_async(self):
+        self._update_event.clear()
+        self._wakeup_scheduled = False
+        if self._event_driven and not self._data_update_watchman.should_update():
+            try:
+                await asyncio.wait_for(self._update_event.wait(), self.UPDATE_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        return self._data_update_watchman.should_update()
+
+    def _wait_for_update(self):
+        if self._event_driven:
+            return self._data_update_watchman.wait_for_update(self.UPDATE_WAIT_TIMEOUT)
+        return self._data_update_watchman.should_update()
+
+    def _report_latency(self):
+        now = time.monotonic()
+        if now - self._last_latency_report < self.LATENCY_REPORT_PERIOD:
+            return
+        self._last_latency_report = now
+        coalesced_updates = self._data_update_watchman.coalesced_updates()
+        dropped_updates = self._book_cache.dropped_updates()
+        latency_lines = [str(latency) for latency in self._metrics.histograms()]
+        latency_lines.append(f'Coalesced updates: {coalesced_updates}')
+        latency_lines.append(f'Conflated book updates: {dropped_updates}')
+        self._journal.info('latency', '\n'.join(latency_lines), latencies=latency_lines,
+                           coalesced_updates=coalesced_updates, dropped_updates=dropped_updates)
+        self._journal.info('positions', positions=self._risk_engine.positions(),
+                           maturity_exposures=self._risk_engine.maturity_exposures(),
+                           net_delta=self._risk_engine.net_delta())
+
+    async def _finish_async(self):
+        #Tasks running on the loop are stopped from it, the rest of the teardown blocks, so it goes to the executor.
+        await self._yfinance_md_feed.stop_async()
+        await self._order_gateway.wait_for_pending_async()
+        await asyncio.get_running_loop().run_in_executor(None, self._finish)
 
     def _finish(self):
         print('Finishing...')
+        self._ir_printer.stop()
         self._yfinance_md_feed.stop()
+        self._order_gateway.shutdown()
+        if self._checkpointer:
+            #Last checkpoint, with the orders sent until now.
+            self._checkpointer.stop()
+            self._checkpoint.close()
+        self._book_cache.stop()
         self._rofex_proxy.stop()
+        if self._recorder:
+            self._recorder.close()
+        if self._book_store:
+            self._book_store.close()
+            self._book_store.unlink()
+        if self._metrics_server:
+            self._metrics_server.stop()
+        self._journal.close()
         print('Done!')
@@ -0,0 +1,157 @@
+import datetime as dt
+
+import numpy as np
+
+from simple_trading_bot.lib.ir_expert import IRExpert
+
+
+class VectorizedIRExpert(IRExpert):
+    """
+    Class to compute implicit rates using contiguous arrays.
+    Futures are indexed once, grouped by maturity, so every rate is computed in a single vectorized pass
+    and the max taker / min offered rate of each maturity is obtained through segment reductions.
+    Exposes the same interface as IRExpert.
+    """
+
+    def __init__(self, instrument_expert, rofex_proxy, yfinance_md_feed, clock=dt.date.today):
+        super().__init__(instrument_expert, rofex_proxy, yfinance_md_feed, clock)
+        futures = sorted(self._futures_by_ticker.values(),
+                         key=lambda future: (self._maturiries_by_ticker[future.ticker()], future.ticker()))
+        self._tickers = [future.ticker() for future in futures]
+        self._index_by_ticker = {ticker: index for index, ticker in enumerate(self._tickers)}
+        self._underlier_tickers = sorted(set(future.underlier_ticker() for future in futures))
+        underlier_index_by_ticker = {ticker: index for index, ticker in enumerate(self._underlier_tickers)}
+        self._underlier_index = np.array(
+            [underlier_index_by_ticker[future.underlier_ticker()] for future in futures], dtype=np.intp)
+        maturity_tags = [self._maturiries_by_ticker[ticker] for ticker in self._tickers]
+        self._maturity_tags = sorted(set(maturity_tags), key=maturity_tags.index)
+        self._segment_starts = np.array([maturity_tags.index(tag) for tag in self._maturity_tags], dtype=np.intp)
+        self._segment_ids = np.array([self._maturity_tags.index(tag) for tag in maturity_tags], dtype=np.intp)
+        size = len(self._tickers)
+        self._bid_prices = np.full(size, np.nan)
+        self._ask_prices = np.full(size, np.nan)
+        self._spot_prices = np.full(len(self._underlier_tickers), np.nan)
+        self._days = np.full(size, np.nan)
+        self._taker_rate_values = np.full(size, np.nan)
+        self._offered_rate_values = np.full(size, np.nan)
+        self._best_taker_rates = {}
+        self._best_offered_rates = {}
+
+    def update_rates(self):
+        """
+        Updates the prices changed since last call in the arrays and recomputes every rate in one pass.
+        """
+        #Updated tickers are popped before the data is read, so the data read always covers them.
+        #Updates received in between are read too, and popped again next call.
+        updated_tickers = self._updated_future_tickers()
+        underlier_prices = self._yfinance_md_feed.last_prices()
+        self._underlier_prices = underlier_prices
+        self._book_snapshot = self._rofex_proxy.book_snapshot()
+        future_bids = self._book_snapshot.bids
+        future_asks = self._book_snapshot.asks
+        today = self._clock()
+        if today != self._rates_date:
+            self._reset_rates(today)
+            updated_tickers = self._tickers
+        self._last_updated_tickers = set(updated_tickers)
+        for future_ticker in updated_tickers:
+            index = self._index_by_ticker.get(future_ticker)
+            if index is None:
+                continue
+            bid = future_bids.get(future_ticker)
+            ask = future_asks.get(future_ticker)
+            self._bid_prices[index] = bid.price if bid else np.nan
+            self._ask_prices[index] = ask.price if ask else np.nan
+        for index, underlier_ticker in enumerate(self._underlier_tickers):
+            self._spot_prices[index] = underlier_prices.get(underlier_ticker, np.nan)
+        self._compute_rates()
+
+    def taker_rates(self):
+        return self._rates_by_maturity(self._taker_rate_values)
+
+    def offered_rates(self):
+        return self._rates_by_maturity(self._offered_rate_values)
+
+    def taker_rate(self, future_ticker):
+        return self._rate(self._taker_rate_values, future_ticker)
+
+    def offered_rate(self, future_ticker):
+        return self._rate(self._offered_rate_values, future_ticker)
+
+    def max_taker_rate(self, maturity_tag):
+        return self._best_taker_rates.get(maturity_tag)
+
+    def min_offered_rate(self, maturity_tag):
+        return self._best_offered_rates.get(maturity_tag)
+
+    def ranked_taker_rates(self, maturity_tag, count):
+        return self._ranked_rates(self._taker_rate_values, maturity_tag, count, reverse=True)
+
+    def ranked_offered_rates(self, maturity_tag, count):
+        return self._ranked_rates(self._offered_rate_values, maturity_tag, count)
+
+    def ready(self):
+        return bool(self._best_taker_rates) and bool(self._best_offered_rates)
+
+    def maturiry_ready_to_trade(self, maturity_tag):
+        return maturity_tag in self._best_taker_rates and maturity_tag in self._best_offered_rates
+
+    def _reset_rates(self, today):
+        super()._reset_rates(today)
+        self._days[:] = [self._days_to_maturity.get(ticker, np.nan) for ticker in self._tickers]
+
+    def _compute_rates(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spot_prices = self._spot_prices[self._underlier_index]
+            exponents = 1. / self._days
+            self._taker_rate_values = ((self._bid_prices / spot_prices) ** exponents - 1.) * self.DAYS_IN_A_YEAR
+            self._offered_rate_values = ((self._ask_prices / spot_prices) ** exponents - 1.) * self.DAYS_IN_A_YEAR
+        self._best_taker_rates = self._max_rate_by_maturity(self._taker_rate_values)
+        #Min offered rates are found as the max of the negated rates.
+        self._best_offered_rates = {tag: (ticker, -rate) for tag, (ticker, rate)
+                                    in self._max_rate_by_maturity(-self._offered_rate_values).items()}
+
+    def _max_rate_by_maturity(self, rates):
+        """
+        Returns the (ticker, rate) pair holding the max rate of each maturity segment.
+        Missing rates are ignored, and so are the maturities without any rate.
+        """
+        if not self._tickers:
+            return {}
+        filled_rates = np.where(np.isnan(rates), -np.inf, rates)
+        segment_max = np.maximum.reduceat(filled_rates, self._segment_starts)
+        best_positions = np.flatnonzero(
+            (filled_rates == segment_max[self._segment_ids]) & (filled_rates != -np.inf))
+        segments, first_positions = np.unique(self._segment_ids[best_positions], return_index=True)
+        return {self._maturity_tags[segment]: (self._tickers[index], float(rates[index]))
+                for segment, index in zip(segments, best_positions[first_positions])}
+
+    def _ranked_rates(self, rates, maturity_tag, count, reverse=False):
+        """
+        Returns up to count (ticker, rate) pairs of the maturity segment, ordered from best to worst.
+        Only the count best rates of the segment are sorted.
+        """
+        if maturity_tag not in self._maturity_tags:
+            return []
+        segment = self._maturity_tags.index(maturity_tag)
+        start = self._segment_starts[segment]
+        end = self._segment_starts[segment + 1] if segment + 1 < len(self._segment_starts) else len(self._tickers)
+        keys = -rates[start:end] if reverse else rates[start:end]
+        positions = np.flatnonzero(~np.isnan(keys))
+        if count < len(positions):
+            positions = positions[np.argpartition(keys[positions], count - 1)[:count]]
+        positions = positions[np.argsort(keys[positions], kind='stable')]
+        return [(self._tickers[start + position], float(rates[start + position])) for position in positions]
+
+    def _rate(self, rates, future_ticker):
+        index = self._index_by_ticker.get(future_ticker)
+        if index is None or np.isnan(rates[index]):
+            return None
+        return float(rates[index])
+
+    def _rates_by_maturity(self, rates):
+        rates_by_maturity = {}
+        for index in np.flatnonzero(~np.isnan(rates)):
+            ticker = self._tickers[index]
+            rates_by_maturity.setdefault(self._maturiries_by_ticker[ticker], {})[ticker] = float(rates[index])
+        return rates_by_maturity
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pyRofex
+
+import simple_trading_bot.lib.backtester as btr
+from simple_trading_bot.lib.market_data_feeds import OrderbookLevel
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder
+
+
+class TestBacktester(unittest.TestCase):
+    #2021-01-01 00:00 UTC
+    START_TIME = 1609459200.
+    REST_INSTRUMENTS = {'instruments': [
+        {'instrumentId': {'symbol': 'GGALFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 100.},
+        {'instrumentId': {'symbol': 'DOFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 1000.}]}
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._store_path = os.path.join(self._tmp_dir.name, 'store')
+        #Chunks smaller than the rows written, so they are streamed across chunks.
+        writer = btr.TickStoreWriter(self._store_path, ['GGAL', 'DO'], self.REST_INSTRUMENTS, chunk_rows=2)
+        writer.write_spot(self.START_TIME, 'GGAL', 100.)
+        writer.write_spot(self.START_TIME, 'DO', 100.)
+        writer.write_book(self.START_TIME + 1., 'GGALFeb21', OrderbookLevel(115, 10), OrderbookLevel(120, 10))
+        writer.write_book(self.START_TIME + 2., 'DOFeb21', OrderbookLevel(125, 2), OrderbookLevel(130, 2))
+        #Next day, the arbitrage is gone.
+        writer.write_book(self.START_TIME + 86400., 'DOFeb21', OrderbookLevel(119, 2), None)
+        writer.close()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_ticks_are_streamed_in_time_order(self):
+        store = btr.TickStore(self._store_path)
+        self.assertEqual(len(store.books()), 3)
+        ticks = list(store.ticks(chunk_rows=1))
+        self.assertEqual([kind for _, kind, _ in ticks], [btr.TickStore.SPOTS] * 2 + [btr.TickStore.BOOKS] * 3)
+        self.assertEqual(store.futures()[ticks[-1][2][1]], 'DOFeb21')
+        self.assertNotEqual(ticks[-1][2][4], ticks[-1][2][4])
+
+    def test_backtest_trades_against_simulated_fills(self):
+        result = btr.Backtest(self._store_path, fill_ratio=0.5).run()
+        self.assertEqual(result.ticks, 5)
+        self.assertEqual(result.opportunities, 1)
+        #Sells 1 DOFeb21 (1 of the 2 displayed fills) against 10 GGALFeb21 (5 fill).
+        self.assertEqual((result.orders, result.sent_contracts, result.filled_contracts), (2, 11, 6))
+        self.assertEqual(result.positions, {'GGALFeb21': 5, 'DOFeb21': -1})
+        #Hedged fills marked at the last mid prices: GGALFeb21 at 117.5, DOFeb21 at 124.5.
+        self.assertAlmostEqual(result.pnl, 5 * 100. * (117.5 - 120.) - 1000. * (124.5 - 125.))
+
+    def test_parameter_sets_are_run_in_parallel(self):
+        output_path = os.path.join(self._tmp_dir.name, 'results.jsonl')
+        results = btr.BacktestRunner(
+            self._store_path,
+            [dict(transaction_cost=0.01), dict(transaction_cost=10.)],
+            processes=2,
+            output_path=output_path).run()
+        self.assertEqual([result.opportunities for result in results], [1, 0])
+        with open(output_path) as output_file:
+            rows = [json.loads(line) for line in output_file]
+        self.assertEqual([row['parameters']['transaction_cost'] for row in rows], [0.01, 10.])
+        self.assertEqual(rows[0]['fill_rate'], 1.)
+
+    def test_recorded_session_is_imported(self):
+        record_path = os.path.join(self._tmp_dir.name, 'session.jsonl.gz')
+        recorder = MarketDataRecorder(record_path)
+        recorder.record_reference_data(self.REST_INSTRUMENTS)
+        recorder.record_spot_prices({'GGAL.BA': 100.})
+        recorder.record_market_data({'instrumentId': {'symbol': 'GGALFeb21'}, 'marketData': {
+            pyRofex.MarketDataEntry.BIDS.value: [{'price': 115, 'size': 10}],
+            pyRofex.MarketDataEntry.OFFERS.value: []}})
+        recorder.close()
+        store_path = os.path.join(self._tmp_dir.name, 'imported')
+        self.assertTrue(btr.import_recorded_session(record_path, store_path, ['GGAL', 'DO'], self.START_TIME))
+        store = btr.TickStore(store_path)
+        self.assertEqual(store.spots()[0]['price'], 100.)
+        self.assertEqual(store.tickers()[store.spots()[0]['underlier']], 'GGAL')
+        self.assertEqual((store.books()[0]['bid'], store.books()[0]['bid_size']), (115., 10.))
+        self.assertGreaterEqual(store.books()[0]['time'], self.START_TIME)
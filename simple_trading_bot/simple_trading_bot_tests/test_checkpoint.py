@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+
+import pyRofex
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.replay as rpl
+from simple_trading_bot.lib.checkpoint import StateCheckpoint
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder
+
+
+class TestStateCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp_dir.name, 'checkpoint.bin')
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_latest_checkpoint_is_read_after_reopening(self):
+        checkpoint = StateCheckpoint(self._path)
+        self.assertIsNone(checkpoint.read())
+        self.assertTrue(checkpoint.write({'round': 1}))
+        self.assertTrue(checkpoint.write({'round': 2}))
+        self.assertFalse(checkpoint.write({'round': 2}))
+        checkpoint.close()
+        reopened = StateCheckpoint(self._path)
+        self.assertEqual(reopened.sequence(), 2)
+        self.assertEqual(reopened.read()[1], {'round': 2})
+        reopened.write({'round': 3})
+        self.assertEqual(reopened.read()[1], {'round': 3})
+        reopened.close()
+
+    def test_checkpoint_being_written_falls_back_to_previous_one(self):
+        checkpoint = StateCheckpoint(self._path)
+        checkpoint.write({'round': 1})
+        checkpoint.write({'round': 2})
+        #As left by a crash in the middle of the second write.
+        checkpoint._slot(0)['sequence'] = 0
+        self.assertEqual(checkpoint.read()[1], {'round': 1})
+        checkpoint.close()
+
+    def test_file_grows_for_larger_checkpoints(self):
+        checkpoint = StateCheckpoint(self._path, capacity=16)
+        checkpoint.write({'round': 1})
+        state = {'books': {f'GGALFeb{day}': [[[115., 10]], [[120., 10]]] for day in range(20)}}
+        checkpoint.write(state)
+        self.assertGreater(checkpoint.capacity(), 16)
+        checkpoint.close()
+        #The file grown keeps the previous checkpoint until the new one is written.
+        checkpoint = StateCheckpoint(self._path)
+        checkpoint._create(checkpoint.capacity() * 2)
+        self.assertEqual(checkpoint.read()[1], state)
+        checkpoint.close()
+        reopened = StateCheckpoint(self._path)
+        self.assertEqual(reopened.read()[1], state)
+        reopened.close()
+
+    def test_file_not_a_checkpoint_is_not_overwritten(self):
+        with open(self._path, 'wb') as checkpoint_file:
+            checkpoint_file.write(b'garbage')
+        with self.assertRaisesRegex(ValueError, 'not a checkpoint'):
+            StateCheckpoint(self._path)
+        with open(self._path, 'rb') as checkpoint_file:
+            self.assertEqual(checkpoint_file.read(), b'garbage')
+
+
+class TestWarmRestart(unittest.TestCase):
+    TODAY = "2021-01-01"
+    REFERENCE_DATA = {'instruments': [
+        {'instrumentId': {'symbol': 'GGALFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 100.},
+        {'instrumentId': {'symbol': 'DOFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 1000.}]}
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._checkpoint_path = os.path.join(self._tmp_dir.name, 'checkpoint.bin')
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _record(self, name, spot_prices=None, md_messages=()):
+        record_path = os.path.join(self._tmp_dir.name, name)
+        recorder = MarketDataRecorder(record_path)
+        recorder.record_reference_data(self.REFERENCE_DATA)
+        if spot_prices:
+            recorder.record_spot_prices(spot_prices)
+        for md_message in md_messages:
+            recorder.record_market_data(md_message)
+        recorder.close()
+        return record_path
+
+    @staticmethod
+    def _md_message(ticker, bid, ask):
+        return {
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [{'price': bid, 'size': 10}],
+                pyRofex.MarketDataEntry.OFFERS.value: [{'price': ask, 'size': 10}]}}
+
+    def _crashed_session(self):
+        record_path = self._record(
+            'session.jsonl.gz', {'GGAL.BA': 100., 'ARS=X': 100.},
+            [self._md_message('GGALFeb21', 115, 120), self._md_message('DOFeb21', 125, 130)])
+        bot = rpl.ReplayTradingBot(['GGAL', 'DO'], record_path, checkpoint_path=self._checkpoint_path)
+        self.assertFalse(bot.resumed())
+        bot.launch()
+        self.assertEqual(len(bot.sent_orders()), 2)
+        return bot.risk_engine().state()
+
+    @freeze_time(TODAY)
+    def test_restored_books_are_not_traded_until_refreshed(self):
+        risk_state = self._crashed_session()
+        #Only GGAL is quoted again, DO keeps its checkpointed book, which is stale.
+        record_path = self._record('restart.jsonl.gz', md_messages=[self._md_message('GGALFeb21', 115, 120)])
+        bot = rpl.ReplayTradingBot(['GGAL', 'DO'], record_path, checkpoint_path=self._checkpoint_path)
+        self.assertTrue(bot.resumed())
+        self.assertEqual(bot.risk_engine().state(), risk_state)
+        self.assertEqual(bot.book_cache().book_snapshot().stale, frozenset(('GGALFeb21', 'DOFeb21')))
+        bot.launch()
+        self.assertEqual(bot.sent_orders(), [])
+
+    @freeze_time(TODAY)
+    def test_refreshed_books_are_traded_with_restored_spot_prices(self):
+        self._crashed_session()
+        record_path = self._record(
+            'restart.jsonl.gz', md_messages=[self._md_message('GGALFeb21', 115, 120),
+                                             self._md_message('DOFeb21', 125, 130)])
+        bot = rpl.ReplayTradingBot(['GGAL', 'DO'], record_path, checkpoint_path=self._checkpoint_path)
+        bot.launch()
+        self.assertEqual([order['ticker'] for order in bot.sent_orders()], ['GGALFeb21', 'DOFeb21'])
+
+    def test_checkpoint_of_another_date_is_discarded(self):
+        with freeze_time(self.TODAY):
+            self._crashed_session()
+        with freeze_time('2021-01-04'):
+            bot = rpl.ReplayTradingBot(['GGAL', 'DO'], self._record('restart.jsonl.gz'),
+                                       checkpoint_path=self._checkpoint_path)
+            self.assertFalse(bot.resumed())
+            self.assertEqual(bot.book_cache().book_snapshot().stale, frozenset())
+            bot.journal().close()
@@ -0,0 +1,78 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pyRofex
+
+import simple_trading_bot.lib.conflation as cfl
+import simple_trading_bot.lib.market_data_feeds as mdf
+
+
+class TestConflatingBookCache(unittest.TestCase):
+
+    def setUp(self):
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.tradeable_rofex_tickers.return_value = ['GGALFeb21', 'DOFeb21']
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper'):
+            self._rofex_proxy = mdf.RofexProxy(instrument_expert_mock)
+
+    def _book_update(self, ticker, bid_price):
+        self._rofex_proxy._market_data_handler({
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [{'price': bid_price, 'size': 10}],
+                pyRofex.MarketDataEntry.OFFERS.value: []}})
+
+    def test_latest_only_merges_updates_not_picked_up(self):
+        book_cache = cfl.ConflatingBookCache(self._rofex_proxy, policy=cfl.ConflatingBookCache.LATEST_ONLY)
+        listener = MagicMock()
+        book_cache.add_update_listener(listener)
+        for bid_price in [115, 116, 117]:
+            self._book_update('GGALFeb21', bid_price)
+        self._book_update('DOFeb21', 125)
+        self.assertEqual(listener.call_count, 4)
+        self.assertEqual(book_cache.bids()['GGALFeb21'].price, 117)
+        self.assertEqual(book_cache.pop_updated_tickers(), {'GGALFeb21', 'DOFeb21'})
+        self.assertEqual(book_cache.dropped_updates(), 2)
+        self._book_update('GGALFeb21', 118)
+        #Released instruments are delivered along with their books, by either call.
+        self.assertEqual(book_cache.book_snapshot().bids['GGALFeb21'].price, 118)
+        self._book_update('DOFeb21', 126)
+        self.assertEqual(book_cache.pop_updated_tickers(), {'GGALFeb21', 'DOFeb21'})
+        self.assertEqual(book_cache.book_snapshot().bids['DOFeb21'].price, 126)
+        self.assertEqual(book_cache.dropped_updates(), 2)
+
+    def test_count_policy_releases_batches(self):
+        book_cache = cfl.ConflatingBookCache(self._rofex_proxy, policy=cfl.ConflatingBookCache.COUNT, count=3)
+        self._book_update('GGALFeb21', 115)
+        self._book_update('GGALFeb21', 116)
+        #Nothing released yet: the strategy still sees the books as of the last batch.
+        self.assertFalse(book_cache.bids())
+        self.assertEqual(book_cache.pop_updated_tickers(), set())
+        self._book_update('DOFeb21', 125)
+        self.assertEqual(book_cache.released_batches(), 1)
+        self.assertEqual(book_cache.last_update_sequence(), 1)
+        self.assertEqual(book_cache.bids()['GGALFeb21'].price, 116)
+        self.assertEqual(book_cache.pop_updated_tickers(), {'GGALFeb21', 'DOFeb21'})
+        self.assertEqual(book_cache.dropped_updates(), 1)
+
+    def test_time_window_policy_releases_batches_once_expired(self):
+        book_cache = cfl.ConflatingBookCache(self._rofex_proxy, policy=cfl.ConflatingBookCache.TIME_WINDOW,
+                                             window=0.05)
+        book_cache.start_listening()
+        self.addCleanup(book_cache.stop)
+        receipt_time = time.perf_counter()
+        self._book_update('GGALFeb21', 115)
+        self._book_update('GGALFeb21', 116)
+        self.assertEqual(book_cache.released_batches(), 0)
+        deadline = time.monotonic() + 5.
+        while not book_cache.released_batches() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertGreaterEqual(time.perf_counter() - receipt_time, 0.05)
+        self.assertEqual(book_cache.bids()['GGALFeb21'].price, 116)
+        self.assertEqual(book_cache.pop_updated_tickers(), {'GGALFeb21'})
+        self.assertGreaterEqual(book_cache.last_receipt_time(), receipt_time)
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            cfl.ConflatingBookCache(self._rofex_proxy, policy='fastest')
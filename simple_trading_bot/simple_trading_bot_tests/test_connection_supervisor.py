@@ -0,0 +1,42 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import simple_trading_bot.lib.connection_supervisor as cns
+
+
+class TestConnectionSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self._connected = True
+        self._attempts = []
+        self._reconnected = threading.Event()
+        self._on_lost = MagicMock()
+
+        def connect():
+            self._attempts.append(len(self._attempts))
+            #Only the third attempt succeeds.
+            self._connected = len(self._attempts) >= 3
+            if self._connected:
+                self._reconnected.set()
+            return self._connected
+
+        self._supervisor = cns.ConnectionSupervisor(
+            connect, lambda: self._connected, on_lost=self._on_lost, journal=MagicMock(),
+            check_period=0.01, min_backoff=0.01, max_backoff=0.02)
+        self._supervisor.start()
+        self.addCleanup(self._supervisor.stop)
+
+    def test_connection_is_recovered_with_backoff(self):
+        self._connected = False
+        self.assertTrue(self._reconnected.wait(5.))
+        self.assertEqual(len(self._attempts), 3)
+        self._on_lost.assert_called_once()
+        self.assertEqual(self._supervisor.reconnects(), 1)
+        self.assertEqual(self._supervisor.recovery_time().count(), 1)
+
+    def test_reported_loss_reconnects_live_connection(self):
+        self._attempts.extend([0, 1])
+        self._supervisor.connection_lost()
+        self.assertTrue(self._reconnected.wait(5.))
+        self.assertEqual(len(self._attempts), 3)
@@ -0,0 +1,41 @@
+import threading
+import time
+import unittest
+
+import simple_trading_bot.lib.data_update_watchman as duw
+import simple_trading_bot.lib.market_data_feeds as mdf
+
+
+class TestDataUpdateWatchman(unittest.TestCase):
+
+    def setUp(self):
+        self._rofex_feed = mdf.MarketDataFeed()
+        self._spot_feed = mdf.MarketDataFeed()
+        self._data_update_watchman = duw.DataUpdateWatchman(self._rofex_feed, self._spot_feed)
+
+    def test_wait_for_update_times_out_without_data(self):
+        self.assertFalse(self._data_update_watchman.wait_for_update(timeout=0.01))
+
+    def test_wait_for_update_wakes_up_on_feed_update(self):
+        timer = threading.Timer(0.01, self._rofex_feed._update_last_timestamp)
+        timer.start()
+        self.assertTrue(self._data_update_watchman.wait_for_update(timeout=5.))
+        timer.join()
+
+    def test_burst_of_updates_is_coalesced(self):
+        for _ in range(3):
+            self._rofex_feed._update_last_timestamp()
+        self._spot_feed._update_last_timestamp()
+        self.assertTrue(self._data_update_watchman.wait_for_update(timeout=0.))
+        self._data_update_watchman.set_last_processed_sequence()
+        self.assertFalse(self._data_update_watchman.should_update())
+        self.assertEqual(self._data_update_watchman.coalesced_updates(), 3)
+
+    def test_round_is_timed_from_oldest_update_receipt(self):
+        receipt_time = time.perf_counter()
+        self._rofex_feed._update_last_timestamp(('GGALFeb21',), receipt_time)
+        self._spot_feed._update_last_timestamp(('GGAL',))
+        self._data_update_watchman.set_last_processed_sequence()
+        self.assertEqual(self._data_update_watchman.round_receipt_time(), receipt_time)
+        self.assertEqual(self._data_update_watchman.detection_latency().count(), 1)
+        self.assertGreaterEqual(self._data_update_watchman.detection_latency().max(), 0.)
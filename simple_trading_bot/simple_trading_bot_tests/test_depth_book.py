@@ -0,0 +1,45 @@
+import unittest
+
+import pyRofex
+
+from simple_trading_bot.lib.depth_book import DepthBook, DepthLadder
+
+
+class TestDepthBook(unittest.TestCase):
+
+    def setUp(self):
+        self._depth_book = DepthBook(
+            bid_levels=[(99., 5), (100., 10), (98., 20)],
+            ask_levels=[(102., 20), (101., 10)])
+
+    def test_levels_are_sorted_best_first(self):
+        self.assertEqual(list(self._depth_book.bids()), [(100., 10), (99., 5), (98., 20)])
+        self.assertEqual(list(self._depth_book.asks()), [(101., 10), (102., 20)])
+
+    def test_sweep_price(self):
+        self.assertEqual(self._depth_book.sweep_price(pyRofex.Side.BUY, 10), 101.)
+        self.assertAlmostEqual(self._depth_book.sweep_price(pyRofex.Side.BUY, 20), 101.5)
+        self.assertAlmostEqual(self._depth_book.sweep_price(pyRofex.Side.SELL, 15), (1000. + 495.) / 15)
+        self.assertIsNone(self._depth_book.sweep_price(pyRofex.Side.BUY, 31))
+
+    def test_limit_price_and_max_qty_at_price(self):
+        self.assertEqual(self._depth_book.limit_price(pyRofex.Side.SELL, 12), 99.)
+        self.assertEqual(self._depth_book.max_qty_at_price(pyRofex.Side.SELL, 99.), 15)
+        self.assertEqual(self._depth_book.max_qty_at_price(pyRofex.Side.BUY, 101.5), 10)
+        self.assertEqual(self._depth_book.max_qty_at_price(pyRofex.Side.BUY, 100.), 0)
+
+    def test_incremental_updates(self):
+        ladder = DepthLadder(True)
+        ladder.update(100., 10)
+        ladder.update(101., 5)
+        ladder.update(100., 7)
+        self.assertEqual(list(ladder), [(101., 5), (100., 7)])
+        ladder.update(101., 0)
+        self.assertEqual(ladder.best(), (100., 7))
+
+    def test_levels_are_applied_as_deltas_on_a_copy(self):
+        bids = self._depth_book.bids()
+        ladder = bids.with_levels([(101., 5), (100., 12), (98., 20)])
+        self.assertEqual(list(ladder), [(101., 5), (100., 12), (98., 20)])
+        self.assertEqual(list(bids), [(100., 10), (99., 5), (98., 20)])
+        self.assertEqual(list(ladder.with_levels([(100., 0)])), [])
@@ -0,0 +1,58 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from types import MappingProxyType
+from unittest.mock import MagicMock, patch
+
+import simple_trading_bot.lib.event_journal as evj
+import simple_trading_bot.lib.market_data_feeds as mdf
+
+
+class TestEventJournal(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp_dir.name, 'journal.jsonl')
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_events_are_written_by_level(self):
+        console = io.StringIO()
+        journal = evj.EventJournal(self._path, level=evj.INFO, console_level=evj.WARNING)
+        with redirect_stdout(console):
+            journal.debug('market_data', payload={'ignored': True})
+            journal.info('rates', lambda: self.fail('Console message formatted'),
+                         taker_rates=MappingProxyType({'Feb21': {'GGALFeb21': 0.5}}))
+            journal.warning('spot_error', lambda: 'Spot prices not available', error='timeout')
+            journal.close()
+        events = list(evj.read_journal(self._path))
+        self.assertEqual([event['kind'] for event in events], ['rates', 'spot_error'])
+        self.assertEqual(events[0]['level'], 'INFO')
+        self.assertEqual(events[0]['taker_rates'], {'Feb21': {'GGALFeb21': 0.5}})
+        self.assertEqual(events[1]['error'], 'timeout')
+        self.assertEqual(console.getvalue(), 'Spot prices not available\n')
+
+    def test_full_queue_drops_events(self):
+        journal = evj.EventJournal(self._path, capacity=2, console_level=None)
+        #Events are only queued while the writer thread is not running.
+        journal._running = True
+        for sequence in range(3):
+            journal.info('market_data', sequence=sequence)
+        self.assertEqual(journal.dropped_events(), 1)
+        journal.close()
+        self.assertEqual([event['sequence'] for event in evj.read_journal(self._path)], [0, 1])
+
+    def test_market_data_is_journaled_off_the_handler(self):
+        journal = evj.EventJournal(self._path, console_level=None)
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.tradeable_rofex_tickers.return_value = ['GGALFeb21']
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper'):
+            rofex_proxy = mdf.RofexProxy(instrument_expert_mock, journal=journal)
+        message = {'instrumentId': {'symbol': 'GGALFeb21'}, 'marketData': {'BI': [{'price': 115, 'size': 10}], 'OF': []}}
+        rofex_proxy._market_data_handler(message)
+        journal.close()
+        event, = evj.read_journal(self._path)
+        self.assertEqual((event['kind'], event['level'], event['message']), ('market_data', 'DEBUG', message))
@@ -0,0 +1,34 @@
+import datetime as dt
+import unittest
+
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.exceptions as exc
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+class TestFuture(unittest.TestCase):
+    TODAY = "2021-01-01"
+
+    def setUp(self):
+        self._future = Future('DOFeb21', dt.datetime(2021, 2, 26), 'DO', 1000.)
+
+    def test_futures_are_slotted(self):
+        self.assertFalse(hasattr(self._future, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self._future.maturity = dt.datetime(2021, 3, 31)
+
+    def test_days_and_year_fraction_are_cached_until_the_date_rolls(self):
+        with freeze_time(self.TODAY):
+            self.assertEqual(self._future.days_to_maturity(), 56)
+            self.assertAlmostEqual(self._future.year_fraction(), 56 / 365)
+        with freeze_time("2021-01-02"):
+            self.assertAlmostEqual(self._future.year_fraction(), 55 / 365)
+            self.assertEqual(self._future.days_to_maturity(), 55)
+
+    def test_days_and_year_fraction_at_the_date_given(self):
+        self.assertEqual(self._future.days_to_maturity(today=dt.date(2021, 2, 1)), 25)
+        self.assertAlmostEqual(self._future.year_fraction(today=dt.date(2021, 2, 1)), 25 / 365)
+        self.assertAlmostEqual(self._future.year_fraction(start_date=dt.datetime(2021, 2, 16)), 10 / 365)
+        with self.assertRaises(exc.ExpiredInstrument):
+            self._future.year_fraction(today=dt.date(2021, 2, 28))
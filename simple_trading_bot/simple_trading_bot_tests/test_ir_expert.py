@@ -18,12 +18,14 @@ class TestIRExpert(unittest.TestCase):
         self._yfinance_md_feed_mock.last_prices.return_value = {
             'GGAL': self._current_underlier_price,
             'DO': self._current_underlier_price}
+        self._yfinance_md_feed_mock.pop_updated_tickers.return_value = set()
 
         self._rofex_proxy_mock = MagicMock()
-        self._rofex_proxy_mock.bids.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)}
-        self._rofex_proxy_mock.asks.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)})
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = set()
         self._instrument_expert_mock = MagicMock()
         self._maturity_date = dt.datetime(2021, 6, 30, 0, 0, 0, 0)
         self._instrument_expert_mock.tradeable_rofex_instruments_by_underlier_ticker.return_value = {
@@ -46,10 +48,10 @@ class TestIRExpert(unittest.TestCase):
 
     @freeze_time(TODAY)
     def test_update_rates_when_there_is_no_arb_opportunity(self):
-        self._rofex_proxy_mock.bids.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(120, 10)}
-        self._rofex_proxy_mock.asks.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(125, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(120, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(125, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)})
         self._ir_expert.update_rates()
         _, max_taker_rate = self._ir_expert.max_taker_rate('Feb21')
         _, min_offered_rate = self._ir_expert.min_offered_rate('Feb21')
@@ -65,12 +67,61 @@ class TestIRExpert(unittest.TestCase):
         min_offered_price = ((1 + fxd_min_offered_rate / self._ir_expert.DAYS_IN_A_YEAR) ** days_to_maturity
                            * self._current_underlier_price)
 
-        self._rofex_proxy_mock.bids.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(100, 10), 'DOFeb21': mdf.OrderbookLevel(max_taker_price, 10)}
-        self._rofex_proxy_mock.asks.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(min_offered_price, 10), 'DOFeb21': mdf.OrderbookLevel(500, 10)}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(100, 10), 'DOFeb21': mdf.OrderbookLevel(max_taker_price, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(min_offered_price, 10), 'DOFeb21': mdf.OrderbookLevel(500, 10)})
         self._ir_expert.update_rates()
         _, max_taker_rate = self._ir_expert.max_taker_rate('Feb21')
         _, min_offered_rate = self._ir_expert.min_offered_rate('Feb21')
         self.assertAlmostEqual(fxd_max_taker_rate, max_taker_rate, 10)
         self.assertAlmostEqual(fxd_min_offered_rate, min_offered_rate, 10)
+
+    @freeze_time(TODAY)
+    def test_update_rates_only_recomputes_updated_futures(self):
+        self._ir_expert.update_rates()
+        ggal_taker_rate = self._ir_expert.taker_rates()['Feb21']['GGALFeb21']
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            2,
+            {'GGALFeb21': mdf.OrderbookLevel(200, 10), 'DOFeb21': mdf.OrderbookLevel(200, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)})
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = {'DOFeb21'}
+        self._ir_expert.update_rates()
+        self.assertEqual(self._ir_expert.taker_rates()['Feb21']['GGALFeb21'], ggal_taker_rate)
+        ticker, _ = self._ir_expert.max_taker_rate('Feb21')
+        self.assertEqual(ticker, 'DOFeb21')
+
+    @freeze_time(TODAY)
+    def test_update_rates_fans_out_underlier_updates(self):
+        self._ir_expert.update_rates()
+        _, ggal_offered_rate = self._ir_expert.min_offered_rate('Feb21')
+        self._yfinance_md_feed_mock.last_prices.return_value = {'GGAL': 50., 'DO': self._current_underlier_price}
+        self._yfinance_md_feed_mock.pop_updated_tickers.return_value = {'GGAL'}
+        self._ir_expert.update_rates()
+        self.assertTrue(self._ir_expert.offered_rates()['Feb21']['GGALFeb21'] > ggal_offered_rate)
+        ticker, _ = self._ir_expert.max_taker_rate('Feb21')
+        self.assertEqual(ticker, 'GGALFeb21')
+
+    @freeze_time(TODAY)
+    def test_update_rates_reads_prices_received_while_popping(self):
+        self._ir_expert.update_rates()
+        _, ggal_offered_rate = self._ir_expert.min_offered_rate('Feb21')
+
+        def spot_update_arriving():
+            #The price is updated right after it is marked as updated.
+            self._yfinance_md_feed_mock.last_prices.return_value = {'GGAL': 50., 'DO': self._current_underlier_price}
+            return {'GGAL'}
+        self._yfinance_md_feed_mock.pop_updated_tickers.side_effect = spot_update_arriving
+        self._ir_expert.update_rates()
+        self.assertTrue(self._ir_expert.offered_rates()['Feb21']['GGALFeb21'] > ggal_offered_rate)
+
+    def test_rates_are_computed_at_the_clock_date(self):
+        today = [dt.date(2021, 1, 1)]
+        ir_expert = ire.IRExpert(
+            self._instrument_expert_mock, self._rofex_proxy_mock, self._yfinance_md_feed_mock, clock=lambda: today[0])
+        ir_expert.update_rates()
+        self.assertEqual(ir_expert.days_to_maturity('GGALFeb21'), 180)
+        #Days to maturity roll along with the clock, regardless of the system date.
+        today[0] = dt.date(2021, 1, 2)
+        ir_expert.update_rates()
+        self.assertEqual(ir_expert.days_to_maturity('GGALFeb21'), 179)
@@ -0,0 +1,52 @@
+import io
+import unittest
+from unittest.mock import MagicMock
+
+import simple_trading_bot.lib.ir_printer as irp
+
+
+class TestIRPrinter(unittest.TestCase):
+
+    def setUp(self):
+        self._taker_rates = {'Feb21': {'GGALFeb21': 0.3, 'DOFeb21': 0.4}, 'Abr21': {'GGALAbr21': 0.35}}
+        self._offered_rates = {'Feb21': {'GGALFeb21': 0.32, 'DOFeb21': 0.45}, 'Abr21': {'GGALAbr21': 0.37}}
+        self._ir_expert_mock = MagicMock()
+        self._ir_expert_mock.taker_rates.side_effect = lambda: {
+            maturity_tag: dict(rates) for maturity_tag, rates in self._taker_rates.items()}
+        self._ir_expert_mock.offered_rates.side_effect = lambda: {
+            maturity_tag: dict(rates) for maturity_tag, rates in self._offered_rates.items()}
+        self._stream = io.StringIO()
+        self._ir_printer = irp.IRPrinter(
+            self._ir_expert_mock, journal=MagicMock(), stream=self._stream, ansi_redraw=True)
+
+    def _pop_output(self):
+        output = self._stream.getvalue()
+        self._stream.seek(0)
+        self._stream.truncate()
+        return output
+
+    def test_rates_are_drawn_only_when_updated(self):
+        self.assertFalse(self._ir_printer.refresh())
+        self._ir_printer.print_rates()
+        self.assertTrue(self._ir_printer.refresh())
+        output = self._pop_output()
+        self.assertIn('Last Updated Rates:', output)
+        self.assertIn('DOFeb21      ->   0.400000', output)
+        self.assertFalse(self._ir_printer.refresh())
+        self.assertEqual(self._pop_output(), '')
+
+    def test_only_changed_lines_are_redrawn(self):
+        self._ir_printer.print_rates()
+        self._ir_printer.refresh()
+        self._pop_output()
+        sorted_abr_rates = self._ir_printer._sorted_rates[('taker', 'Abr21')][1]
+        self._taker_rates['Feb21']['DOFeb21'] = 0.41
+        self._ir_printer.print_rates()
+        self._ir_printer.refresh()
+        output = self._pop_output()
+        #A single line is rewritten in place, between cursor save and restore.
+        self.assertTrue(output.startswith('\x1b7') and output.endswith('\x1b8'))
+        self.assertEqual(output.count('\x1b[K'), 1)
+        self.assertIn('DOFeb21      ->   0.410000', output)
+        #Maturities without changes are not sorted again.
+        self.assertIs(self._ir_printer._sorted_rates[('taker', 'Abr21')][1], sorted_abr_rates)
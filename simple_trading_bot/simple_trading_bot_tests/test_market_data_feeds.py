@@ -0,0 +1,119 @@
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pyRofex
+
+import simple_trading_bot.lib.market_data_feeds as mdf
+from simple_trading_bot.lib.market_data_decoder import FastMarketDataDecoder
+
+
+class TestRofexProxy(unittest.TestCase):
+
+    def setUp(self):
+        self._instrument_expert_mock = MagicMock()
+        self._instrument_expert_mock.tradeable_rofex_tickers.return_value = ['GGALFeb21', 'DOFeb21']
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper'):
+            self._rofex_proxy = mdf.RofexProxy(self._instrument_expert_mock)
+
+    @staticmethod
+    def _md_message(ticker, bids, asks):
+        return {
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [{'price': price, 'size': size} for price, size in bids],
+                pyRofex.MarketDataEntry.OFFERS.value: [{'price': price, 'size': size} for price, size in asks]}}
+
+    def test_market_data_publishes_new_snapshot(self):
+        first_snapshot = self._rofex_proxy.book_snapshot()
+        self._rofex_proxy._market_data_handler(self._md_message('GGALFeb21', [(115, 10)], [(120, 5)]))
+        snapshot = self._rofex_proxy.book_snapshot()
+        self.assertEqual(snapshot.sequence, 1)
+        self.assertEqual(snapshot.sequence, self._rofex_proxy.last_update_sequence())
+        self.assertEqual(snapshot.bids['GGALFeb21'], mdf.OrderbookLevel(115, 10))
+        self.assertEqual(snapshot.asks['GGALFeb21'], mdf.OrderbookLevel(120, 5))
+        self.assertFalse(first_snapshot.bids)
+        self.assertEqual(self._rofex_proxy.pop_updated_tickers(), {'GGALFeb21'})
+
+    def test_snapshots_are_immutable_views(self):
+        self._rofex_proxy._market_data_handler(self._md_message('GGALFeb21', [(115, 10)], [(120, 5)]))
+        snapshot = self._rofex_proxy.book_snapshot()
+        self._rofex_proxy._market_data_handler(self._md_message('GGALFeb21', [(116, 10)], []))
+        self.assertEqual(snapshot.bids['GGALFeb21'].price, 115)
+        self.assertEqual(self._rofex_proxy.bids()['GGALFeb21'].price, 116)
+        self.assertIs(self._rofex_proxy.asks(), snapshot.asks)
+        with self.assertRaises(TypeError):
+            snapshot.bids['DOFeb21'] = mdf.OrderbookLevel(1, 1)
+
+    def test_snapshots_share_the_books_not_updated(self):
+        self._rofex_proxy._market_data_handler(self._md_message('GGALFeb21', [(115, 10)], [(120, 5)]))
+        snapshot = self._rofex_proxy.book_snapshot()
+        self._rofex_proxy._market_data_handler(self._md_message('DOFeb21', [(125, 10)], [(130, 5)]))
+        new_snapshot = self._rofex_proxy.book_snapshot()
+        self.assertIs(new_snapshot.depth['GGALFeb21'], snapshot.depth['GGALFeb21'])
+        self.assertIs(new_snapshot.bids['GGALFeb21'], snapshot.bids['GGALFeb21'])
+        self.assertNotIn('DOFeb21', snapshot.depth)
+        self.assertEqual(set(new_snapshot.depth), {'GGALFeb21', 'DOFeb21'})
+
+    def test_books_are_invalidated_on_disconnection_and_unanswered_refresh(self):
+        self._rofex_proxy._market_data_handler(self._md_message('GGALFeb21', [(115, 10)], [(120, 5)]))
+        self._rofex_proxy._market_data_handler(self._md_message('DOFeb21', [(125, 10)], [(130, 5)]))
+        self._rofex_proxy.pop_updated_tickers()
+        self._rofex_proxy._stale_quote_timeout = 60.
+        pyrofex_wrapper_mock = self._rofex_proxy.pyrofex_wrapper()
+        #Quiet books are valid, they are subscribed again to get their snapshot.
+        self._rofex_proxy._last_receipts['DOFeb21'] = time.perf_counter() - 61.
+        self._rofex_proxy._refresh_silent_books()
+        self.assertEqual(pyrofex_wrapper_mock.refresh_market_data.call_args.kwargs['tickers'], ['DOFeb21'])
+        self.assertIn('DOFeb21', self._rofex_proxy.bids())
+        self.assertFalse(self._rofex_proxy.pop_updated_tickers())
+        #Answered refreshes start over, unanswered ones invalidate the book.
+        self._rofex_proxy._refresh_requests['DOFeb21'] = time.perf_counter() - 62.
+        self._rofex_proxy._last_receipts['DOFeb21'] = time.perf_counter() - 61.
+        self._rofex_proxy._refresh_silent_books()
+        self.assertEqual(pyrofex_wrapper_mock.refresh_market_data.call_count, 2)
+        self._rofex_proxy._refresh_requests['DOFeb21'] = time.perf_counter() - 61.
+        self._rofex_proxy._refresh_silent_books()
+        self.assertEqual(pyrofex_wrapper_mock.refresh_market_data.call_count, 2)
+        snapshot = self._rofex_proxy.book_snapshot()
+        self.assertEqual(set(snapshot.bids), {'GGALFeb21'})
+        self.assertNotIn('DOFeb21', snapshot.depth)
+        #Invalidated books are flagged as updated, so their rates are dropped.
+        self.assertEqual(self._rofex_proxy.pop_updated_tickers(), {'DOFeb21'})
+        self._rofex_proxy._invalidate_all_books()
+        self.assertFalse(self._rofex_proxy.book_snapshot().bids)
+        self.assertFalse(self._rofex_proxy.book_snapshot().asks)
+        self.assertEqual(self._rofex_proxy.book_snapshot().sequence, self._rofex_proxy.last_update_sequence())
+        #Books come back with new data.
+        self._rofex_proxy._market_data_handler(self._md_message('DOFeb21', [(126, 10)], [(130, 5)]))
+        self.assertEqual(self._rofex_proxy.bids()['DOFeb21'].price, 126)
+
+    def test_fast_decoder_hands_levels_by_instrument_id(self):
+        market_data_handler = MagicMock()
+        decoder = FastMarketDataDecoder({'GGALFeb21': 7}, market_data_handler, MagicMock())
+        decoder.on_message(None, json.dumps({'type': 'Md', **self._md_message('GGALFeb21', [(115, 10)], [(120, 5)])}))
+        instrument_id, bid_levels, ask_levels, _, _ = market_data_handler.call_args.args
+        self.assertEqual((instrument_id, bid_levels, ask_levels), (7, [(115, 10)], [(120, 5)]))
+
+    def test_fast_decoder_updates_books_and_hands_other_messages(self):
+        pyrofex_wrapper_mock = MagicMock()
+        rofex_proxy = mdf.RofexProxy(
+            self._instrument_expert_mock, pyrofex_wrapper=pyrofex_wrapper_mock, fast_decoding=True)
+        decoder = rofex_proxy.market_data_decoder()
+        rofex_proxy.start_listening()
+        self.addCleanup(rofex_proxy.stop)
+        pyrofex_wrapper_mock.install_websocket_decoder.assert_called_once_with(decoder)
+        generic_handler = MagicMock()
+        decoder.set_generic_handler(generic_handler)
+        decoder.on_message(None, json.dumps({'type': 'Md', **self._md_message('GGALFeb21', [(115, 10)], [(120, 5)])}))
+        self.assertEqual(rofex_proxy.bids()['GGALFeb21'], mdf.OrderbookLevel(115, 10))
+        self.assertEqual(list(rofex_proxy.depth()['GGALFeb21'].asks()), [(120, 5)])
+        generic_handler.assert_not_called()
+        #Order reports, spot prices and malformed messages are left to pyRofex.
+        for raw_message in [json.dumps({'type': 'Or', 'orderReport': {}}),
+                            json.dumps({'type': 'Md', **self._md_message('DLR/SPOT', [(90, 1)], [])}),
+                            'not a json']:
+            decoder.on_message(None, raw_message)
+            generic_handler.assert_called_with(None, raw_message)
+        self.assertEqual(rofex_proxy.last_update_sequence(), 1)
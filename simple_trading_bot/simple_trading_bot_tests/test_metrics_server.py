@@ -0,0 +1,39 @@
+import unittest
+
+import requests
+
+import simple_trading_bot.lib.metrics_server as mts
+from simple_trading_bot.lib.latency_histogram import LatencyHistogram
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def setUp(self):
+        self._tick_to_detection = LatencyHistogram('Tick to detection')
+        self._rest_latencies = []
+        self._registry = mts.MetricsRegistry()
+        self._registry.register(self._tick_to_detection)
+        self._registry.register_source(lambda: self._rest_latencies)
+        self._metrics_server = mts.MetricsServer(self._registry, 0)
+        self._metrics_server.start()
+        self.addCleanup(self._metrics_server.stop)
+
+    def test_latencies_are_served_in_prometheus_format(self):
+        self._tick_to_detection.record(0.002)
+        self._tick_to_detection.record(0.004)
+        self._rest_latencies.append(LatencyHistogram('REST newSingleOrder'))
+        response = requests.get(self._metrics_server.url(), timeout=5.)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.text.splitlines()
+        self.assertIn('# TYPE simple_trading_bot_latency_seconds summary', lines)
+        self.assertIn('simple_trading_bot_latency_seconds_count{stage="tick_to_detection"} 2', lines)
+        self.assertIn('simple_trading_bot_latency_seconds_sum{stage="tick_to_detection"} 0.006000000', lines)
+        self.assertIn('simple_trading_bot_latency_seconds_count{stage="rest_newsingleorder"} 0', lines)
+        p99_line, = [line for line in lines
+                     if line.startswith('simple_trading_bot_latency_seconds{stage="tick_to_detection",quantile="0.99"}')]
+        self.assertAlmostEqual(float(p99_line.split()[-1]), 0.004, delta=0.0005)
+
+    def test_unknown_path_is_not_found(self):
+        response = requests.get(self._metrics_server.url() + 'x', timeout=5.)
+        self.assertEqual(response.status_code, 404)
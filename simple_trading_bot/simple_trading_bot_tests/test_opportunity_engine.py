@@ -0,0 +1,115 @@
+import datetime as dt
+import unittest
+from unittest.mock import MagicMock
+
+import pyRofex
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.ir_expert as ire
+import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.opportunity_engine as ope
+import simple_trading_bot.lib.order_gateway as org
+import simple_trading_bot.lib.trader as trd
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+class TestOpportunityEngine(unittest.TestCase):
+    TODAY = "2021-01-01"
+
+    def setUp(self):
+        self._yfinance_md_feed_mock = MagicMock()
+        last_prices = {'GGAL': 100., 'DO': 100.}
+        self._yfinance_md_feed_mock.last_prices.return_value = last_prices
+        self._yfinance_md_feed_mock.price.side_effect = lambda ticker: last_prices[ticker]
+        self._yfinance_md_feed_mock.pop_updated_tickers.return_value = set()
+
+        self._rofex_proxy_mock = MagicMock()
+        self._bids = {'GGALFeb21': mdf.OrderbookLevel(104, 10),
+                      'GGALAbr21': mdf.OrderbookLevel(110, 10),
+                      'DOAbr21': mdf.OrderbookLevel(115, 10)}
+        self._asks = {'GGALFeb21': mdf.OrderbookLevel(105, 10),
+                      'GGALAbr21': mdf.OrderbookLevel(112, 10),
+                      'DOAbr21': mdf.OrderbookLevel(117, 10)}
+        self._rofex_proxy_mock.book_snapshot.side_effect = lambda: mdf.BookSnapshot(1, self._bids, self._asks)
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = set()
+        self._rofex_proxy_mock.place_order.return_value = {'order': {'clientId': 'test_order_id'}}
+        self._rofex_proxy_mock.order_execution_status.return_value = 'THIS IS A TEST'
+
+        ggal_feb_future = Future('GGALFeb21', dt.datetime(2021, 2, 26), 'GGAL', 100.)
+        ggal_abr_future = Future('GGALAbr21', dt.datetime(2021, 4, 30), 'GGAL', 100.)
+        do_abr_future = Future('DOAbr21', dt.datetime(2021, 4, 30), 'DO', 1000.)
+        futures = [ggal_feb_future, ggal_abr_future, do_abr_future]
+        self._instrument_expert_mock = MagicMock()
+        self._instrument_expert_mock.tradeable_rofex_instruments.return_value = futures
+        self._instrument_expert_mock.tradeable_rofex_instruments_by_underlier_ticker.return_value = {
+            'GGAL': [ggal_feb_future, ggal_abr_future],
+            'DO': [do_abr_future]}
+        self._instrument_expert_mock.rofex_instruments_by_ticker.return_value = {
+            future.ticker(): future for future in futures}
+        self._instrument_expert_mock.maturities_of_tradeable_tickers.return_value = {
+            'GGALFeb21': 'Feb21',
+            'GGALAbr21': 'Abr21',
+            'DOAbr21': 'Abr21'}
+        self._instrument_expert_mock.tradeable_maturity_tags.return_value = ['Feb21', 'Abr21']
+        self._ir_expert = ire.IRExpert(
+            self._instrument_expert_mock,
+            self._rofex_proxy_mock,
+            self._yfinance_md_feed_mock)
+        self._opportunity_engine = ope.OpportunityEngine(
+            self._instrument_expert_mock, self._ir_expert, funding_rate=0.3)
+
+    def _update(self, updated_tickers=()):
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = set(updated_tickers)
+        self._ir_expert.update_rates()
+        self._opportunity_engine.update()
+
+    @freeze_time(TODAY)
+    def test_best_opportunity_across_maturity_dates(self):
+        self._update()
+        self.assertEqual(self._opportunity_engine.maturity_dates(), [dt.date(2021, 2, 26), dt.date(2021, 4, 30)])
+        opportunity = self._opportunity_engine.best_opportunity()
+        self.assertEqual(opportunity.ticker_to_buy, 'GGALFeb21')
+        self.assertEqual(opportunity.ticker_to_sell, 'DOAbr21')
+        self.assertEqual((opportunity.buy_days, opportunity.sell_days), (56, 119))
+        self.assertAlmostEqual(opportunity.excess, (
+            119 * (self._ir_expert.taker_rate('DOAbr21') - 0.3) -
+            56 * (self._ir_expert.offered_rate('GGALFeb21') - 0.3) - 0.01 * 119))
+
+    @freeze_time(TODAY)
+    def test_only_updated_tickers_are_rescored(self):
+        self._update()
+        self._asks['GGALFeb21'] = mdf.OrderbookLevel(120, 10)
+        #Same maturity date opportunities (DOAbr21 against GGALAbr21) are left to Trader.
+        self._update(['GGALFeb21'])
+        self.assertIsNone(self._opportunity_engine.best_opportunity())
+        self._asks['GGALFeb21'] = mdf.OrderbookLevel(105, 10)
+        self._update(['GGALFeb21'])
+        self.assertEqual(self._opportunity_engine.best_opportunity().ticker_to_buy, 'GGALFeb21')
+
+    @freeze_time(TODAY)
+    def test_trader_trades_cross_tenor_opportunity(self):
+        data_update_watchman_mock = MagicMock()
+        data_update_watchman_mock.should_update.return_value = False
+        data_update_watchman_mock.round_receipt_time.return_value = 0.
+        order_gateway = org.OrderGateway(self._rofex_proxy_mock)
+        self.addCleanup(order_gateway.shutdown)
+        trader = trd.Trader(
+            self._instrument_expert_mock,
+            self._ir_expert,
+            self._rofex_proxy_mock,
+            self._yfinance_md_feed_mock,
+            data_update_watchman_mock,
+            order_gateway,
+            self._opportunity_engine)
+        self._update()
+        trader.evaluate_and_trade_cross_tenor()
+        order_gateway.wait_for_pending()
+        orders = {call_args.kwargs['side']: call_args.kwargs
+                  for call_args in self._rofex_proxy_mock.place_order.call_args_list}
+        self.assertEqual(
+            (orders[pyRofex.Side.BUY]['ticker'], orders[pyRofex.Side.BUY]['size'], orders[pyRofex.Side.BUY]['price']),
+            ('GGALFeb21', 10, 105))
+        self.assertEqual(
+            (orders[pyRofex.Side.SELL]['ticker'], orders[pyRofex.Side.SELL]['size'],
+             orders[pyRofex.Side.SELL]['price']),
+            ('DOAbr21', 1, 115))
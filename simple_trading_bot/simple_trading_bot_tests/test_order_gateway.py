@@ -0,0 +1,54 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import simple_trading_bot.lib.order_gateway as org
+
+
+class TestOrderGateway(unittest.TestCase):
+
+    def setUp(self):
+        self._rofex_proxy_mock = MagicMock()
+        self._legs_barrier = threading.Barrier(2, timeout=5.)
+
+        def place_order(**kwargs):
+            #Both legs must be in flight at the same time to get through the barrier.
+            self._legs_barrier.wait()
+            return {'status': 'OK', 'order': {'clientId': kwargs['ticker'], 'proprietary': 'TEST'}}
+
+        self._rofex_proxy_mock.place_order.side_effect = place_order
+        self._order_gateway = org.OrderGateway(self._rofex_proxy_mock)
+        self._order_report_handler = self._rofex_proxy_mock.add_order_report_listener.call_args.args[0]
+
+    def tearDown(self):
+        self._order_gateway.shutdown()
+
+    def test_legs_are_sent_concurrently(self):
+        done = threading.Event()
+        futures = self._order_gateway.send_orders(
+            {'ticker': 'GGALFeb21'}, {'ticker': 'DOFeb21'}, on_all_done=lambda _: done.set())
+        self.assertEqual([future.result(timeout=5.)['order']['clientId'] for future in futures],
+                         ['GGALFeb21', 'DOFeb21'])
+        self.assertTrue(done.wait(5.))
+        self.assertEqual(self._order_gateway.ack_latency().count(), 2)
+        self.assertEqual(self._order_gateway.leg_skew().count(), 1)
+
+    def test_execution_is_tracked_from_order_reports(self):
+        futures = self._order_gateway.send_orders({'ticker': 'GGALFeb21'}, {'ticker': 'DOFeb21'})
+        self._order_gateway.wait_for_pending()
+        self.assertEqual(self._order_gateway.order_status('GGALFeb21'), org.OrderGateway.PENDING_STATUS)
+        self._order_report_handler({'type': 'or', 'orderReport': {'clOrdId': 'GGALFeb21', 'status': 'FILLED'}})
+        order_info, status = self._order_gateway.order_info(futures[0])
+        self.assertEqual(order_info['order']['clientId'], 'GGALFeb21')
+        self.assertEqual(status, 'FILLED')
+
+    def test_only_the_last_order_statuses_are_kept(self):
+        order_statuses = org.OrderStatuses(max_orders=2)
+        order_statuses.set('GGALFeb21', 'FILLED')
+        order_statuses.setdefault('DOFeb21', org.OrderGateway.PENDING_STATUS)
+        order_statuses.set('GGALFeb21', 'CANCELLED')
+        order_statuses.setdefault('YPFDFeb21', org.OrderGateway.PENDING_STATUS)
+        self.assertEqual(len(order_statuses), 2)
+        self.assertIsNone(order_statuses.get('GGALFeb21'))
+        self.assertEqual(order_statuses.get('DOFeb21'), org.OrderGateway.PENDING_STATUS)
+        self.assertEqual(order_statuses.get('YPFDFeb21'), org.OrderGateway.PENDING_STATUS)
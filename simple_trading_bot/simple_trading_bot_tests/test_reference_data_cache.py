@@ -0,0 +1,60 @@
+import datetime as dt
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.instrument_expert as ie
+import simple_trading_bot.lib.reference_data_cache as rdc
+
+
+class TestReferenceDataCache(unittest.TestCase):
+    TODAY = "2021-01-01"
+    REST_INSTRUMENTS = {'instruments': [
+        {'instrumentId': {'symbol': 'GGALFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 100.},
+        {'instrumentId': {'symbol': 'DOFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 1000.},
+        {'instrumentId': {'symbol': 'DOFeb21/Mar21'}, 'maturityDate': '20210226', 'contractMultiplier': 1000.},
+        {'instrumentId': {'symbol': 'YPFDFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 100.}]}
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._cache = rdc.ReferenceDataCache(os.path.join(self._directory.name, 'ref.json'), ttl=3600.)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    @freeze_time(TODAY)
+    def test_instruments_are_downloaded_once(self):
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper') as pyrofex_wrapper_mock:
+            pyrofex_wrapper_mock.return_value.get_detailed_instruments.return_value = self.REST_INSTRUMENTS
+            ie.InstrumentExpert(['GGAL', 'DO'], reference_data_cache=self._cache)
+            instrument_expert = ie.InstrumentExpert(['GGAL', 'DO'], reference_data_cache=self._cache)
+        self.assertEqual(pyrofex_wrapper_mock.return_value.get_detailed_instruments.call_count, 1)
+        self.assertEqual(sorted(instrument_expert.futures_ticker()), ['DOFeb21', 'GGALFeb21'])
+        self.assertEqual(instrument_expert.rofex_instruments_by_ticker()['DOFeb21'].maturity_date(),
+                         dt.datetime(2021, 2, 26))
+        self.assertEqual(list(instrument_expert.tradeable_rofex_intruments_by_maturity().keys()), ['Feb21'])
+
+    @freeze_time(TODAY)
+    def test_instruments_are_cached_immutable_views(self):
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper') as pyrofex_wrapper_mock:
+            pyrofex_wrapper_mock.return_value.get_detailed_instruments.return_value = self.REST_INSTRUMENTS
+            instrument_expert = ie.InstrumentExpert(['GGAL', 'DO'], reference_data_cache=self._cache)
+        self.assertIs(instrument_expert.tradeable_rofex_instruments(), instrument_expert.tradeable_rofex_instruments())
+        with self.assertRaises(TypeError):
+            instrument_expert.rofex_instruments_by_ticker()['DOFeb21'] = None
+
+    def test_cache_is_invalidated(self):
+        with freeze_time(self.TODAY):
+            self._cache.store(['GGAL', 'DO'], self.REST_INSTRUMENTS)
+            self.assertEqual(self._cache.load(['DO']), self.REST_INSTRUMENTS)
+            #Tickers not covered by the cached snapshot.
+            self.assertIsNone(self._cache.load(['GGAL', 'YPFD']))
+        with freeze_time("2021-01-01 00:59:00"):
+            self.assertIsNotNone(self._cache.load(['GGAL']))
+        with freeze_time("2021-01-01 01:01:00"):
+            self.assertIsNone(self._cache.load(['GGAL']))
+        with freeze_time("2021-01-02"):
+            self.assertIsNone(self._cache.load(['GGAL']))
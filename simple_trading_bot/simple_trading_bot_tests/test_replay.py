@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import pyRofex
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.replay as rpl
+from simple_trading_bot.lib.market_data_recorder import MarketDataRecorder, read_records
+
+
+class TestReplay(unittest.TestCase):
+    TODAY = "2021-01-01"
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._record_path = os.path.join(self._tmp_dir.name, 'session.jsonl.gz')
+        recorder = MarketDataRecorder(self._record_path)
+        recorder.record_reference_data({'instruments': [
+            {'instrumentId': {'symbol': 'GGALFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 100.},
+            {'instrumentId': {'symbol': 'DOFeb21'}, 'maturityDate': '20210226', 'contractMultiplier': 1000.}]})
+        recorder.record_spot_prices({'GGAL.BA': 100., 'ARS=X': 100.})
+        recorder.record_market_data(self._md_message('GGALFeb21', 115, 120))
+        recorder.record_market_data(self._md_message('DOFeb21', 125, 130))
+        recorder.close()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    @staticmethod
+    def _md_message(ticker, bid, ask):
+        return {
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [{'price': bid, 'size': 10}],
+                pyRofex.MarketDataEntry.OFFERS.value: [{'price': ask, 'size': 10}]}}
+
+    def test_recorded_session_is_read_back(self):
+        kinds = [kind for _, kind, _ in read_records(self._record_path)]
+        self.assertEqual(kinds, [MarketDataRecorder.REFERENCE_DATA, MarketDataRecorder.SPOT_PRICES,
+                                 MarketDataRecorder.MARKET_DATA, MarketDataRecorder.MARKET_DATA])
+
+    @freeze_time(TODAY)
+    def test_benchmark_replays_every_record(self):
+        report = rpl.ReplayBenchmark(self._record_path, ['GGAL', 'DO']).run()
+        self.assertEqual(report.messages, 3)
+        self.assertEqual(report.tick_latency.count(), 3)
+        self.assertEqual(report.orders, 2)
+
+    @freeze_time(TODAY)
+    def test_replay_bot_trades_against_stub_gateway(self):
+        bot = rpl.ReplayTradingBot(['GGAL', 'DO'], self._record_path)
+        bot.launch()
+        sent_orders = bot.sent_orders()
+        self.assertTrue(sent_orders)
+        self.assertEqual(sent_orders[0]['ticker'], 'GGALFeb21')
+        self.assertEqual(sent_orders[1]['ticker'], 'DOFeb21')
+
+    @freeze_time(TODAY)
+    def test_replay_bot_trades_on_asyncio_runtime(self):
+        bot = rpl.ReplayTradingBot(['GGAL', 'DO'], self._record_path)
+        asyncio.run(bot.launch_async())
+        self.assertEqual([order['ticker'] for order in bot.sent_orders()], ['GGALFeb21', 'DOFeb21'])
@@ -0,0 +1,130 @@
+import datetime as dt
+import unittest
+from unittest.mock import MagicMock
+
+import pyRofex
+
+import simple_trading_bot.lib.exceptions as exc
+import simple_trading_bot.lib.order_gateway as org
+import simple_trading_bot.lib.risk_engine as rke
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+class TestRiskEngine(unittest.TestCase):
+
+    def setUp(self):
+        ggal_feb_future = Future('GGALFeb21', dt.datetime(2021, 2, 26), 'GGAL', 100.)
+        do_feb_future = Future('DOFeb21', dt.datetime(2021, 2, 26), 'DO', 1000.)
+        self._instrument_expert_mock = MagicMock()
+        self._instrument_expert_mock.rofex_instruments_by_ticker.return_value = {
+            'GGALFeb21': ggal_feb_future, 'DOFeb21': do_feb_future}
+        self._instrument_expert_mock.rofex_instruments_by_maturity.return_value = {
+            'Feb21': [ggal_feb_future, do_feb_future]}
+        self._spot_feed_mock = MagicMock()
+        self._spot_feed_mock.last_prices.return_value = {'GGAL': 100., 'DO': 90.}
+        self._rofex_proxy_mock = MagicMock()
+        self._rofex_proxy_mock.place_order.side_effect = lambda **kwargs: {
+            'status': 'OK', 'order': {'clientId': f'{kwargs["ticker"]}-1', 'proprietary': 'TEST'}}
+        self._risk_engine = rke.RiskEngine(
+            self._instrument_expert_mock, self._rofex_proxy_mock, self._spot_feed_mock,
+            max_order_notional=200000., max_position=10, max_orders_per_second=1., order_burst=4)
+        self._order_report_handler = self._rofex_proxy_mock.add_order_report_listener.call_args.args[0]
+
+    @staticmethod
+    def _order(ticker, side, size, price):
+        return dict(ticker=ticker, side=side, size=size, price=price)
+
+    @staticmethod
+    def _report(client_id, ticker, side, status, cum_qty, last_px=None):
+        return {'type': 'or', 'orderReport': {
+            'clOrdId': client_id, 'instrumentId': {'symbol': ticker}, 'side': side, 'status': status,
+            'cumQty': cum_qty, 'lastPx': last_px}}
+
+    def test_positions_are_tracked_from_order_reports(self):
+        buy_order = self._order('GGALFeb21', pyRofex.Side.BUY, 6, 105.)
+        self._risk_engine.check_orders(buy_order)
+        self.assertEqual(self._risk_engine.reserved('GGALFeb21'), 6)
+        self._risk_engine.order_sent('GGAL-1', buy_order)
+        self._order_report_handler(self._report('GGAL-1', 'GGALFeb21', 'BUY', 'PARTIALLY_FILLED', 4, 105.))
+        #Repeated reports do not count the fills twice.
+        self._order_report_handler(self._report('GGAL-1', 'GGALFeb21', 'BUY', 'PARTIALLY_FILLED', 4, 105.))
+        self.assertEqual(self._risk_engine.position('GGALFeb21'), 4)
+        self.assertEqual(self._risk_engine.reserved('GGALFeb21'), 2)
+        self._order_report_handler(self._report('GGAL-1', 'GGALFeb21', 'BUY', 'CANCELLED', 4))
+        self.assertEqual(self._risk_engine.reserved('GGALFeb21'), 0)
+        #Reports may arrive before the order response.
+        sell_order = self._order('DOFeb21', pyRofex.Side.SELL, 1, 92.)
+        self._risk_engine.check_orders(sell_order)
+        self._order_report_handler(self._report('DO-1', 'DOFeb21', 'SELL', 'FILLED', 1, 92.))
+        self._risk_engine.order_sent('DO-1', sell_order)
+        self.assertEqual(self._risk_engine.reserved('DOFeb21'), 0)
+        self.assertEqual(self._risk_engine.positions(), {'GGALFeb21': 4, 'DOFeb21': -1})
+        self.assertEqual(self._risk_engine.underlier_position('GGAL'), 400.)
+        self.assertEqual(self._risk_engine.underlier_position('DO'), -1000.)
+        self.assertAlmostEqual(self._risk_engine.maturity_exposure('Feb21'), 4 * 100. * 105. - 1000. * 92.)
+        self.assertAlmostEqual(self._risk_engine.net_delta(), 400. * 100. - 1000. * 90.)
+
+    def test_replayed_reports_of_settled_orders_are_ignored(self):
+        buy_order = self._order('GGALFeb21', pyRofex.Side.BUY, 5, 105.)
+        self._risk_engine.check_orders(buy_order)
+        self._risk_engine.order_sent('GGAL-1', buy_order)
+        filled_report = self._report('GGAL-1', 'GGALFeb21', 'BUY', 'FILLED', 5, 105.)
+        self._order_report_handler(filled_report)
+        #Sent again when old reports are requested on reconnection.
+        self._order_report_handler(filled_report)
+        self.assertEqual(self._risk_engine.position('GGALFeb21'), 5)
+        self.assertEqual(self._risk_engine.reserved('GGALFeb21'), 0)
+        self.assertEqual(self._risk_engine.underlier_position('GGAL'), 500.)
+        self.assertAlmostEqual(self._risk_engine.maturity_exposure('Feb21'), 5 * 100. * 105.)
+
+    def test_restored_orders_are_settled_by_old_reports(self):
+        for client_id, size in (('GGAL-1', 5), ('GGAL-2', 3)):
+            order = self._order('GGALFeb21', pyRofex.Side.BUY, size, 105.)
+            self._risk_engine.check_orders(order)
+            self._risk_engine.order_sent(client_id, order)
+        self._order_report_handler(self._report('GGAL-1', 'GGALFeb21', 'BUY', 'FILLED', 5, 105.))
+        self._order_report_handler(self._report('GGAL-2', 'GGALFeb21', 'BUY', 'PARTIALLY_FILLED', 1, 105.))
+        state = self._risk_engine.state()
+        restored = rke.RiskEngine(self._instrument_expert_mock, self._rofex_proxy_mock, self._spot_feed_mock)
+        restored.restore(state)
+        order_report_handler = self._rofex_proxy_mock.add_order_report_listener.call_args.args[0]
+        self.assertEqual(restored.reserved('GGALFeb21'), 2)
+        #Old reports are received again after restarting, along with the ones sent while stopped.
+        order_report_handler(self._report('GGAL-1', 'GGALFeb21', 'BUY', 'FILLED', 5, 105.))
+        order_report_handler(self._report('GGAL-2', 'GGALFeb21', 'BUY', 'PARTIALLY_FILLED', 1, 105.))
+        order_report_handler(self._report('GGAL-2', 'GGALFeb21', 'BUY', 'CANCELLED', 1))
+        self.assertEqual(restored.position('GGALFeb21'), 6)
+        self.assertEqual(restored.reserved('GGALFeb21'), 0)
+
+    def test_reports_of_unknown_orders_without_side_are_skipped(self):
+        self._order_report_handler(self._report('GGAL-1', 'GGALFeb21', None, 'FILLED', 5, 105.))
+        self.assertEqual(self._risk_engine.positions(), {})
+        self.assertEqual(self._risk_engine.state()['orders'], {})
+
+    def test_orders_breaching_limits_are_rejected(self):
+        with self.assertRaisesRegex(exc.RiskLimitBreached, 'notional'):
+            self._risk_engine.check_orders(self._order('DOFeb21', pyRofex.Side.BUY, 3, 92.))
+        self._risk_engine.check_orders(self._order('GGALFeb21', pyRofex.Side.BUY, 8, 105.))
+        #Orders in flight count towards the position, and pairs are accepted or rejected as a whole.
+        with self.assertRaisesRegex(exc.RiskLimitBreached, 'position'):
+            self._risk_engine.check_orders(self._order('DOFeb21', pyRofex.Side.SELL, 1, 92.),
+                                           self._order('GGALFeb21', pyRofex.Side.BUY, 3, 105.))
+        self.assertEqual(self._risk_engine.reserved('DOFeb21'), 0)
+        self._risk_engine.check_orders(self._order('GGALFeb21', pyRofex.Side.SELL, 8, 105.),
+                                       self._order('GGALFeb21', pyRofex.Side.BUY, 2, 105.))
+        self._risk_engine.check_orders(self._order('GGALFeb21', pyRofex.Side.SELL, 1, 105.))
+        #Burst of 4 orders spent, rejected orders do not count.
+        with self.assertRaisesRegex(exc.RiskLimitBreached, 'rate'):
+            self._risk_engine.check_orders(self._order('GGALFeb21', pyRofex.Side.SELL, 1, 105.))
+
+    def test_order_gateway_checks_orders_before_sending(self):
+        order_gateway = org.OrderGateway(self._rofex_proxy_mock, risk_engine=self._risk_engine)
+        self.addCleanup(order_gateway.shutdown)
+        with self.assertRaises(exc.RiskLimitBreached):
+            order_gateway.send_orders(self._order('GGALFeb21', pyRofex.Side.BUY, 11, 105.))
+        order_gateway.send_orders(self._order('GGALFeb21', pyRofex.Side.BUY, 5, 105.))
+        order_gateway.wait_for_pending()
+        self._rofex_proxy_mock.place_order.assert_called_once()
+        self._order_report_handler(self._report('GGALFeb21-1', 'GGALFeb21', 'BUY', 'FILLED', 5, 105.))
+        self.assertEqual(self._risk_engine.position('GGALFeb21'), 5)
+        self.assertEqual(self._risk_engine.reserved('GGALFeb21'), 0)
@@ -0,0 +1,69 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pyRofex
+
+import simple_trading_bot.lib.rofex_rest_session as rrs
+
+
+class StubRemarketsHandler(BaseHTTPRequestHandler):
+    """Stands in for the remarkets rest api, replying with the queued (status, body) responses"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.client_address, self.path, self.headers.get('X-Auth-Token')))
+        status, body = self.server.responses.pop(0) if self.server.responses else (200, {'status': 'OK'})
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRofexRestSession(unittest.TestCase):
+
+    def setUp(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StubRemarketsHandler)
+        self._server.requests = []
+        self._server.responses = []
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._rest_session = rrs.RofexRestSession(
+            f'http://127.0.0.1:{self._server.server_port}/',
+            token='token',
+            token_refresher=lambda: 'new_token')
+
+    def tearDown(self):
+        self._rest_session.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _send_order(self):
+        return self._rest_session.send_order(
+            'GGALFeb21', 10, pyRofex.OrderType.LIMIT, pyRofex.Side.BUY, 'REM5584', pyRofex.Market.ROFEX, price=120)
+
+    def test_connection_is_reused(self):
+        for _ in range(3):
+            self.assertEqual(self._send_order(), {'status': 'OK'})
+        self.assertEqual(len(set(client_address for client_address, _, _ in self._server.requests)), 1)
+        self.assertIn('symbol=GGALFeb21', self._server.requests[0][1])
+        self.assertIn('price=120', self._server.requests[0][1])
+        self.assertEqual(self._rest_session.latency(rrs.RofexRestSession.SEND_ORDER).count(), 3)
+
+    def test_only_idempotent_calls_are_retried(self):
+        self._server.responses = [(503, {'status': 'ERROR'})]
+        self.assertEqual(self._send_order(), {'status': 'ERROR'})
+        self.assertEqual(len(self._server.requests), 1)
+        self._server.responses = [(503, {'status': 'ERROR'}), (200, {'status': 'OK', 'order': {'status': 'FILLED'}})]
+        self.assertEqual(self._rest_session.get_order_status('1', 'PBCP')['order']['status'], 'FILLED')
+        self.assertEqual(len(self._server.requests), 3)
+
+    def test_token_is_refreshed_when_rejected(self):
+        self._server.responses = [(401, {})]
+        self.assertEqual(self._rest_session.get_detailed_instruments(), {'status': 'OK'})
+        self.assertEqual([token for _, _, token in self._server.requests], ['token', 'new_token'])
@@ -0,0 +1,152 @@
+import datetime as dt
+import multiprocessing
+import os
+import queue
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+import pyRofex
+
+import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.risk_engine as rke
+import simple_trading_bot.lib.sharded_trading_bot as stb
+import simple_trading_bot.lib.shared_market_data as smd
+import simple_trading_bot.lib.sharding_benchmark as shb
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+class FailingWorkersFactory(shb.SyntheticShardingFactory):
+    """The worker of the first maturity fails its setup, and the one of the second maturity crashes"""
+
+    def setup_process(self):
+        super().setup_process()
+        sys.stderr = open(os.devnull, 'w')
+
+    def create_instrument_expert(self, rest_instruments=None, maturity_tags=None):
+        if maturity_tags == ['Ene20']:
+            raise RuntimeError('Reference data not available')
+        if maturity_tags == ['Feb20']:
+            os._exit(3)
+        return super().create_instrument_expert(rest_instruments=rest_instruments, maturity_tags=maturity_tags)
+
+
+class WithoutIngestShardedTradingBot(stb.ShardedTradingBot):
+
+    def _create_ingest_process(self):
+        return None
+
+
+class TestShardedTradingBot(unittest.TestCase):
+
+    def test_maturities_are_balanced_across_shards(self):
+        instruments_by_maturity = {'Feb21': [1, 2, 3, 4], 'Abr21': [1, 2, 3], 'Jun21': [1, 2], 'Ago21': [1, 2]}
+        self.assertEqual(stb.shard_maturity_tags(instruments_by_maturity, 2), [['Feb21', 'Ago21'], ['Abr21', 'Jun21']])
+        self.assertEqual(len(stb.shard_maturity_tags(instruments_by_maturity, 8)), 4)
+
+    def test_reader_gets_only_changed_rows(self):
+        shared_market_data = smd.SharedMarketData(
+            ['GGALFeb21', 'DOFeb21', 'GGALAbr21'], ['GGAL', 'DO'], multiprocessing.get_context('spawn').Condition())
+        self.addCleanup(shared_market_data.close)
+        reader = smd.SharedMarketDataReader(shared_market_data, ['GGALFeb21', 'DOFeb21'])
+        books_feed, spot_feed = reader.books_feed(), reader.spot_feed()
+        self.assertFalse(reader.wait_for_update(timeout=0.))
+        shared_market_data.publish_spot_prices({'GGAL': 100., 'DO': 90.})
+        shared_market_data.publish_books([
+            ('GGALFeb21', mdf.OrderbookLevel(115, 10), mdf.OrderbookLevel(120, 5)),
+            ('GGALAbr21', mdf.OrderbookLevel(121, 10), None)])
+        self.assertTrue(reader.wait_for_update(timeout=0.))
+        self.assertTrue(reader.refresh())
+        self.assertEqual(spot_feed.last_prices(), {'GGAL': 100., 'DO': 90.})
+        self.assertEqual(books_feed.bids(), {'GGALFeb21': mdf.OrderbookLevel(115, 10)})
+        self.assertEqual(books_feed.asks(), {'GGALFeb21': mdf.OrderbookLevel(120, 5)})
+        self.assertEqual(books_feed.pop_updated_tickers(), {'GGALFeb21'})
+        #Futures out of the reader slice are not read.
+        shared_market_data.publish_books([('GGALAbr21', None, None)])
+        self.assertFalse(reader.refresh())
+        shared_market_data.publish_books([('GGALFeb21', mdf.OrderbookLevel(116, 10), None)])
+        self.assertTrue(reader.refresh())
+        self.assertEqual(books_feed.asks(), {})
+        self.assertEqual(books_feed.pop_updated_tickers(), {'GGALFeb21'})
+        self.assertEqual(spot_feed.pop_updated_tickers(), {'GGAL', 'DO'})
+        self.assertEqual(reader.last_sequence(), shared_market_data.sequence())
+
+    def test_publisher_reads_prices_received_while_popping(self):
+        shared_market_data = smd.SharedMarketData(
+            ['GGALFeb21'], ['GGAL'], multiprocessing.get_context('spawn').Condition())
+        self.addCleanup(shared_market_data.close)
+        rofex_proxy_mock, spot_feed_mock = MagicMock(), MagicMock()
+        stb.MarketDataPublisher(shared_market_data, rofex_proxy_mock, spot_feed_mock)
+        publish_spot_prices, = spot_feed_mock.add_update_listener.call_args[0]
+        spot_feed_mock.last_prices.return_value = {'GGAL': 100.}
+
+        def spot_update_arriving():
+            #The price is updated right after it is marked as updated.
+            spot_feed_mock.last_prices.return_value = {'GGAL': 101.}
+            return {'GGAL'}
+        spot_feed_mock.pop_updated_tickers.side_effect = spot_update_arriving
+        publish_spot_prices()
+        _, _, spot_rows = shared_market_data.read()
+        self.assertEqual(list(spot_rows['price']), [101.])
+
+    def test_row_being_written_is_not_read(self):
+        shared_market_data = smd.SharedMarketData(
+            ['GGALFeb21'], ['GGAL'], multiprocessing.get_context('spawn').Condition())
+        self.addCleanup(shared_market_data.close)
+        shared_market_data.publish_books([('GGALFeb21', mdf.OrderbookLevel(115, 10), None)])
+        #As left by a writer in the middle of the row.
+        shared_market_data._book_rows['sequence'][0] += 1
+        shared_market_data._books.MAX_READ_RETRIES = 3
+        with self.assertRaisesRegex(TimeoutError, 'could not be read consistently'):
+            shared_market_data.read()
+        shared_market_data._book_rows['sequence'][0] += 1
+        _, book_rows, _ = shared_market_data.read()
+        self.assertEqual(book_rows[0].item()[1:3], (115, 10))
+        self.assertEqual(book_rows[0]['sequence'], 4)
+
+    def test_workers_process_every_update(self):
+        result, = shb.ShardingBenchmark(
+            underlier_counts=[2], maturity_count=2, worker_counts=[2], updates=50).run()
+        self.assertEqual(result.instruments, 4)
+        self.assertEqual(result.workers, 2)
+        self.assertGreater(result.decision_latency.count(), 0)
+
+    def test_failed_workers_do_not_block_join(self):
+        factory = FailingWorkersFactory(underlier_count=2, maturity_count=2)
+        bot = WithoutIngestShardedTradingBot(factory.create_instrument_expert().futures_ticker(), 0.,
+                                             workers=2, factory=factory)
+        self.assertEqual(bot.shards(), [['Ene20'], ['Feb20']])
+        bot.start()
+        worker_report, missing_report, gateway_report = bot.join()
+        self.assertEqual(worker_report.worker_id, 0)
+        self.assertEqual(worker_report.processed_sequence, 0)
+        self.assertIsInstance(missing_report, stb.MissingReport)
+        self.assertEqual(str(missing_report), 'Worker1 exited with code 3 without a report')
+        self.assertEqual(gateway_report.orders, 0)
+
+    def test_gateway_runs_the_risk_checks(self):
+        ggal_feb_future = Future('GGALFeb21', dt.datetime(2021, 2, 26), 'GGAL', 100.)
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.rofex_instruments_by_ticker.return_value = {'GGALFeb21': ggal_feb_future}
+        instrument_expert_mock.rofex_instruments_by_maturity.return_value = {'Feb21': [ggal_feb_future]}
+        order_proxy_mock = MagicMock()
+        order_proxy_mock.place_order.return_value = {'status': 'OK', 'order': {'clientId': 'GGAL-1'}}
+        factory_mock = MagicMock()
+        factory_mock.create_instrument_expert.return_value = instrument_expert_mock
+        factory_mock.create_order_proxy.return_value = order_proxy_mock
+        factory_mock.create_risk_engine.side_effect = lambda instrument_expert, order_proxy: rke.RiskEngine(
+            instrument_expert, order_proxy, max_position=10)
+        order_requests, order_responses, reports = queue.Queue(), [queue.Queue()], queue.Queue()
+        order = dict(ticker='GGALFeb21', side=pyRofex.Side.BUY, size=11, price=105.)
+        order_requests.put((0, 0, (order,), None))
+        order_requests.put((0, 1, (dict(order, size=5),), None))
+        order_requests.put(None)
+        stb._run_gateway(factory_mock, None, order_requests, order_responses, reports)
+        #Orders breaching the limits are not sent, and fail on the worker side.
+        request_id, ((order_info, _, error),) = order_responses[0].get_nowait()
+        self.assertEqual((request_id, order_info), (0, None))
+        self.assertIn('position', error)
+        request_id, ((order_info, _, error),) = order_responses[0].get_nowait()
+        self.assertEqual((request_id, order_info['order']['clientId'], error), (1, 'GGAL-1', None))
+        order_proxy_mock.place_order.assert_called_once()
+        self.assertEqual(reports.get().orders, 1)
@@ -0,0 +1,91 @@
+import datetime as dt
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pyRofex
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.ir_expert as ire
+import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.shared_book_store as sbs
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+def read_bids(path, results):
+    """Reads the store from another process"""
+    book_store = sbs.SharedBookStore(path)
+    results.put(book_store.bids())
+    book_store.close()
+
+
+class TestSharedBookStore(unittest.TestCase):
+    TODAY = "2021-01-01"
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp_dir.name, 'book_store.bin')
+        self._book_store = sbs.SharedBookStore(self._path, ['GGALFeb21', 'DOFeb21'])
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.tradeable_rofex_tickers.return_value = ['GGALFeb21', 'DOFeb21']
+        with patch('simple_trading_bot.lib.pyrofex_wrapper.PyRofexWrapper'):
+            self._rofex_proxy = mdf.RofexProxy(instrument_expert_mock, book_store=self._book_store)
+
+    def tearDown(self):
+        self._book_store.close()
+        self._tmp_dir.cleanup()
+
+    def _receive_market_data(self, ticker, bid, ask):
+        self._rofex_proxy._market_data_handler({
+            'instrumentId': {'symbol': ticker},
+            'marketData': {
+                pyRofex.MarketDataEntry.BIDS.value: [{'price': bid, 'size': 10}] if bid else [],
+                pyRofex.MarketDataEntry.OFFERS.value: [{'price': ask, 'size': 10}] if ask else []}})
+
+    def test_books_are_read_from_another_process(self):
+        self._receive_market_data('GGALFeb21', 115, 120)
+        self._receive_market_data('DOFeb21', 125, None)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        reader_process = context.Process(target=read_bids, args=(self._path, results))
+        reader_process.start()
+        bids = results.get(timeout=30.)
+        reader_process.join()
+        self.assertEqual(bids, {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)})
+        self.assertEqual(self._book_store.sequence(), 2)
+
+    @freeze_time(TODAY)
+    def test_ir_expert_runs_on_reader(self):
+        book_store_reader = sbs.SharedBookStoreReader(self._path)
+        self.addCleanup(book_store_reader.close)
+        spot_feed_mock = MagicMock()
+        spot_feed_mock.last_prices.return_value = {'GGAL': 100., 'DO': 100.}
+        spot_feed_mock.pop_updated_tickers.return_value = set()
+        instrument_expert_mock = MagicMock()
+        maturity_date = dt.datetime(2021, 6, 30)
+        instrument_expert_mock.tradeable_rofex_instruments_by_underlier_ticker.return_value = {
+            'GGAL': [Future('GGALFeb21', maturity_date, 'GGAL', 100.)],
+            'DO': [Future('DOFeb21', maturity_date, 'DO', 1000.)]}
+        instrument_expert_mock.maturities_of_tradeable_tickers.return_value = {
+            'GGALFeb21': 'Feb21', 'DOFeb21': 'Feb21'}
+        ir_expert = ire.IRExpert(instrument_expert_mock, book_store_reader, spot_feed_mock)
+        self._receive_market_data('GGALFeb21', 115, 120)
+        self._receive_market_data('DOFeb21', 125, 130)
+        ir_expert.update_rates()
+        self.assertEqual(ir_expert.max_taker_rate('Feb21')[0], 'DOFeb21')
+        self.assertEqual(ir_expert.min_offered_rate('Feb21')[0], 'GGALFeb21')
+        #Only the rows written since last read are picked up.
+        self._receive_market_data('DOFeb21', 110, 130)
+        self.assertEqual(book_store_reader.book_snapshot().bids['DOFeb21'], mdf.OrderbookLevel(110, 10))
+        self.assertEqual(book_store_reader.pop_updated_tickers(), {'DOFeb21'})
+
+    def test_row_being_written_is_not_read(self):
+        self._receive_market_data('GGALFeb21', 115, 120)
+        #Odd sequence: the writer is in the middle of the row.
+        self._book_store._rows['sequence'][0] += 1
+        with self.assertRaises(TimeoutError):
+            self._book_store.read('GGALFeb21')
+        self._book_store._rows['sequence'][0] += 1
+        self.assertEqual(self._book_store.read('GGALFeb21')[0], mdf.OrderbookLevel(115, 10))
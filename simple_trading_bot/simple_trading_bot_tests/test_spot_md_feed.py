@@ -0,0 +1,83 @@
+import asyncio
+import socket
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+import pyRofex
+
+import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.spot_sources as sps
+
+
+class TestSpotMDFeed(unittest.TestCase):
+
+    def setUp(self):
+        self._updated = threading.Semaphore(0)
+
+    def _create_feed(self, spot_source):
+        spot_md_feed = mdf.SpotMDFeed(spot_source)
+        spot_md_feed.add_update_listener(self._updated.release)
+        return spot_md_feed
+
+    def test_prices_are_pushed_from_socket(self):
+        server = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(server.close)
+        spot_md_feed = self._create_feed(sps.LineStreamSpotSource.from_socket(*server.getsockname()))
+        spot_md_feed.start_listening()
+        self.addCleanup(spot_md_feed.stop)
+        connection, _ = server.accept()
+        self.addCleanup(connection.close)
+        connection.sendall(b'{"GGAL": 100.0, "DO": 90.0}\n')
+        self.assertTrue(self._updated.acquire(timeout=5.))
+        self.assertEqual(spot_md_feed.last_prices(), {'GGAL': 100., 'DO': 90.})
+        self.assertEqual(spot_md_feed.pop_updated_tickers(), {'GGAL', 'DO'})
+        #Only the prices which changed are flagged as updated.
+        connection.sendall(b'{"GGAL": 100.0}\n{"DO": 91.0}\n')
+        self.assertTrue(self._updated.acquire(timeout=5.))
+        self.assertEqual(spot_md_feed.price('DO'), 91.)
+        self.assertEqual(spot_md_feed.pop_updated_tickers(), {'DO'})
+        self.assertEqual(spot_md_feed.last_update_sequence(), 2)
+
+    def test_prices_are_streamed_through_rofex_websocket(self):
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.rofex_spot_tickers_map.return_value = {'GGAL': 'MERV - XMEV - GGAL - 48hs'}
+        pyrofex_wrapper_mock = MagicMock()
+        spot_md_feed = self._create_feed(sps.RofexSpotSource(instrument_expert_mock, pyrofex_wrapper_mock))
+        spot_md_feed.start_listening()
+        market_data_handler = pyrofex_wrapper_mock.add_websocket_market_data_handler.call_args.args[0]
+        self.assertEqual(pyrofex_wrapper_mock.market_data_subscription.call_args.kwargs['tickers'],
+                         ['MERV - XMEV - GGAL - 48hs'])
+        market_data_handler({'instrumentId': {'symbol': 'GGALFeb21'}, 'marketData': {}})
+        market_data_handler({'instrumentId': {'symbol': 'MERV - XMEV - GGAL - 48hs'},
+                             'marketData': {pyRofex.MarketDataEntry.LAST.value: {'price': 101.5, 'size': 10}}})
+        self.assertEqual(spot_md_feed.last_prices(), {'GGAL': 101.5})
+        self.assertEqual(spot_md_feed.last_update_sequence(), 1)
+        spot_md_feed.stop()
+        pyrofex_wrapper_mock.remove_websocket_market_data_handler.assert_called_once_with(market_data_handler)
+
+    def test_prices_are_polled_from_event_loop(self):
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.tradeable_yfinance_tickers.return_value = ['GGAL.BA']
+        instrument_expert_mock.inverse_yfinance_tickers_map.return_value = {'GGAL.BA': 'GGAL'}
+        spot_md_feed = self._create_feed(sps.YfinanceSpotSource(instrument_expert_mock, update_frequency=0.01))
+        download_threads = []
+
+        def download(**kwargs):
+            download_threads.append(threading.current_thread())
+            return pd.DataFrame({('Close', 'GGAL.BA'): [99., 100. + len(download_threads)]})
+
+        async def poll_prices():
+            await spot_md_feed.start_listening_async()
+            while spot_md_feed.last_update_sequence() < 2:
+                await asyncio.sleep(0.001)
+            await spot_md_feed.stop_async()
+
+        with patch('simple_trading_bot.lib.spot_sources.yfinance.download', side_effect=download):
+            asyncio.run(poll_prices())
+        self.assertFalse(spot_md_feed.running())
+        self.assertEqual(spot_md_feed.price('GGAL'), 102.)
+        #Downloads block, so they are run in the loop executor.
+        self.assertNotIn(threading.main_thread(), download_threads)
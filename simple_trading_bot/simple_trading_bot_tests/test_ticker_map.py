@@ -0,0 +1,32 @@
+import unittest
+
+from simple_trading_bot.lib.ticker_map import TickerMap
+
+
+class TestTickerMap(unittest.TestCase):
+
+    def setUp(self):
+        self._tickers = [f'GGAL{day}' for day in range(TickerMap.CHUNK_SIZE + 8)]
+        self._ticker_map = TickerMap(self._tickers, {'GGAL0': 1, 'GGAL39': 2})
+
+    def test_map_reads_as_a_mapping(self):
+        self.assertEqual(self._ticker_map, {'GGAL0': 1, 'GGAL39': 2})
+        self.assertEqual(len(self._ticker_map), 2)
+        self.assertIn('GGAL39', self._ticker_map)
+        self.assertNotIn('GGAL1', self._ticker_map)
+        self.assertIsNone(self._ticker_map.get('DOFeb21'))
+        self.assertEqual(self._ticker_map.get_by_id(39), 2)
+        with self.assertRaises(KeyError):
+            self._ticker_map['GGAL1']
+
+    def test_updates_return_new_maps_sharing_the_other_chunks(self):
+        ticker_map = self._ticker_map.set('GGAL1', 3)
+        self.assertEqual(ticker_map, {'GGAL0': 1, 'GGAL1': 3, 'GGAL39': 2})
+        self.assertNotIn('GGAL1', self._ticker_map)
+        self.assertIs(ticker_map._chunks[1], self._ticker_map._chunks[1])
+        ticker_map = ticker_map.remove_by_id(ticker_map.ticker_id('GGAL0')).without(['GGAL39', 'DOFeb21'])
+        self.assertEqual(ticker_map, {'GGAL1': 3})
+        self.assertEqual(len(ticker_map), 1)
+        self.assertIs(ticker_map.remove_by_id(0), ticker_map)
+        with self.assertRaises(KeyError):
+            ticker_map.set('DOFeb21', 1)
@@ -7,7 +7,9 @@ from freezegun import freeze_time
 
 import simple_trading_bot.lib.ir_expert as ire
 import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.order_gateway as org
 import simple_trading_bot.lib.trader as trd
+from simple_trading_bot.lib.depth_book import DepthBook
 from simple_trading_bot.lib.instrument_expert import Future
 
 
@@ -22,10 +24,10 @@ class TestTrader(unittest.TestCase):
         self._yfinance_md_feed_mock.price.side_effect = lambda ticker: last_prices[ticker]
 
         self._rofex_proxy_mock = MagicMock()
-        self._rofex_proxy_mock.bids.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)}
-        self._rofex_proxy_mock.asks.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)})
         self._rofex_proxy_mock.place_order.return_value = {'order': {'clientId': 'test_order_id'}}
         self._rofex_proxy_mock.order_execution_status.return_value = 'THIS IS A TEST'
         self._instrument_expert_mock = MagicMock()
@@ -49,20 +51,32 @@ class TestTrader(unittest.TestCase):
 
         self._data_update_watchman_mock = MagicMock()
         self._data_update_watchman_mock.should_update.return_value = False
+        self._data_update_watchman_mock.round_receipt_time.return_value = 0.
 
+        self._order_gateway = org.OrderGateway(self._rofex_proxy_mock)
         self._trader = trd.Trader(
             self._instrument_expert_mock,
             self._ir_expert,
             self._rofex_proxy_mock,
             self._yfinance_md_feed_mock,
-            self._data_update_watchman_mock)
+            self._data_update_watchman_mock,
+            self._order_gateway)
+
+    def tearDown(self):
+        self._order_gateway.shutdown()
+
+    def _sent_orders_args(self):
+        """Waits for the orders sent concurrently, and returns them sorted as buy, sell"""
+        self._order_gateway.wait_for_pending()
+        return sorted(self._rofex_proxy_mock.place_order.call_args_list,
+                      key=lambda call_args: call_args.kwargs['side'] != pyRofex.Side.BUY)
 
     @freeze_time(TODAY)
     def test_trader_when_there_is_arb_opportunity(self):
         self._ir_expert.update_rates()
         self._trader.evaluate_and_trade_each_maturiry()
+        buy_order_args, sell_order_args = self._sent_orders_args()
         self.assertEqual(self._rofex_proxy_mock.place_order.call_count, 2)
-        buy_order_args, sell_order_args = self._rofex_proxy_mock.place_order.call_args_list
 
         self.assertEqual(buy_order_args.kwargs['ticker'], 'GGALFeb21')
         self.assertEqual(buy_order_args.kwargs['side'], pyRofex.Side.BUY)
@@ -80,10 +94,75 @@ class TestTrader(unittest.TestCase):
 
     @freeze_time(TODAY)
     def test_trader_when_there_is_no_arb_opportunity(self):
-        self._rofex_proxy_mock.bids.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(120, 10)}
-        self._rofex_proxy_mock.asks.return_value = {
-            'GGALFeb21': mdf.OrderbookLevel(125, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(120, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(125, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)})
         self._ir_expert.update_rates()
         self._trader.evaluate_and_trade_each_maturiry()
+        self._order_gateway.wait_for_pending()
         self.assertEqual(self._rofex_proxy_mock.place_order.call_count, 0)
+
+    @freeze_time(TODAY)
+    def test_trader_sizes_using_book_depth(self):
+        bids = {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10)}
+        asks = {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        depth = {
+            'GGALFeb21': DepthBook([(115, 10)], [(120, 10), (121, 10), (200, 10)]),
+            'DOFeb21': DepthBook([(125, 10), (110, 5)], [(130, 10)])}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(1, bids, asks, depth)
+        self._ir_expert.update_rates()
+        self._trader.evaluate_and_trade_each_maturiry()
+        buy_order_args, sell_order_args = self._sent_orders_args()
+        self.assertEqual(buy_order_args.kwargs['size'], 20)
+        self.assertEqual(buy_order_args.kwargs['price'], 121)
+        self.assertEqual(sell_order_args.kwargs['size'], 2)
+        self.assertEqual(sell_order_args.kwargs['price'], 125)
+
+    @freeze_time(TODAY)
+    def test_trader_rounds_sizes_down_within_the_depth_clearing_the_cost(self):
+        bids = {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 2)}
+        asks = {'GGALFeb21': mdf.OrderbookLevel(120, 15), 'DOFeb21': mdf.OrderbookLevel(130, 10)}
+        depth = {
+            'GGALFeb21': DepthBook([(115, 10)], [(120, 15), (200, 10)]),
+            'DOFeb21': DepthBook([(125, 2), (110, 5)], [(130, 10)])}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(1, bids, asks, depth)
+        self._ir_expert.update_rates()
+        self._trader.evaluate_and_trade_each_maturiry()
+        buy_order_args, sell_order_args = self._sent_orders_args()
+        #15 GGALFeb21 contracts hedge 1.5 DOFeb21 ones, which is not rounded up.
+        self.assertEqual((buy_order_args.kwargs['size'], buy_order_args.kwargs['price']), (15, 120))
+        self.assertEqual((sell_order_args.kwargs['size'], sell_order_args.kwargs['price']), (1, 125))
+
+    @freeze_time(TODAY)
+    def test_trader_falls_back_to_next_pair_when_best_can_not_be_sized(self):
+        ypfd_future = Future('YPFDFeb21', self._maturity_date, 'YPFD', 100.)
+        self._yfinance_md_feed_mock.last_prices.return_value['YPFD'] = self._current_underlier_price
+        self._instrument_expert_mock.tradeable_rofex_instruments_by_underlier_ticker.return_value['YPFD'] = [
+            ypfd_future]
+        self._instrument_expert_mock.rofex_instruments_by_ticker.return_value['YPFDFeb21'] = ypfd_future
+        self._instrument_expert_mock.maturities_of_tradeable_tickers.return_value['YPFDFeb21'] = 'Feb21'
+        #A single GGALFeb21 contract is too small against a DOFeb21 one, so YPFDFeb21 is sold instead.
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(125, 10),
+             'YPFDFeb21': mdf.OrderbookLevel(123, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 1), 'DOFeb21': mdf.OrderbookLevel(130, 10),
+             'YPFDFeb21': mdf.OrderbookLevel(135, 10)})
+        ir_expert = ire.IRExpert(
+            self._instrument_expert_mock,
+            self._rofex_proxy_mock,
+            self._yfinance_md_feed_mock)
+        trader = trd.Trader(
+            self._instrument_expert_mock,
+            ir_expert,
+            self._rofex_proxy_mock,
+            self._yfinance_md_feed_mock,
+            self._data_update_watchman_mock,
+            self._order_gateway)
+        ir_expert.update_rates()
+        trader.evaluate_and_trade_each_maturiry()
+        buy_order_args, sell_order_args = self._sent_orders_args()
+        self.assertEqual(self._rofex_proxy_mock.place_order.call_count, 2)
+        self.assertEqual((buy_order_args.kwargs['ticker'], buy_order_args.kwargs['size']), ('GGALFeb21', 1))
+        self.assertEqual((sell_order_args.kwargs['ticker'], sell_order_args.kwargs['size']), ('YPFDFeb21', 1))
@@ -0,0 +1,86 @@
+import datetime as dt
+import unittest
+from unittest.mock import MagicMock
+
+from freezegun import freeze_time
+
+import simple_trading_bot.lib.ir_expert as ire
+import simple_trading_bot.lib.market_data_feeds as mdf
+import simple_trading_bot.lib.vectorized_ir_expert as vire
+from simple_trading_bot.lib.instrument_expert import Future
+
+
+class TestVectorizedIRExpert(unittest.TestCase):
+    TODAY = "2021-01-01"
+
+    def setUp(self):
+        self._yfinance_md_feed_mock = MagicMock()
+        self._yfinance_md_feed_mock.last_prices.return_value = {'GGAL': 100., 'DO': 90., 'YPFD': 500.}
+        self._yfinance_md_feed_mock.pop_updated_tickers.return_value = set()
+
+        self._rofex_proxy_mock = MagicMock()
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            1,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(104, 10),
+             'GGALAbr21': mdf.OrderbookLevel(121, 10), 'DOAbr21': mdf.OrderbookLevel(111, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(106, 10),
+             'GGALAbr21': mdf.OrderbookLevel(130, 10), 'YPFDAbr21': mdf.OrderbookLevel(600, 10)})
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = set()
+        feb_maturity = dt.datetime(2021, 2, 26)
+        abr_maturity = dt.datetime(2021, 4, 30)
+        instrument_expert_mock = MagicMock()
+        instrument_expert_mock.tradeable_rofex_instruments_by_underlier_ticker.return_value = {
+            'GGAL': [Future('GGALFeb21', feb_maturity, 'GGAL', 100.), Future('GGALAbr21', abr_maturity, 'GGAL', 100.)],
+            'DO': [Future('DOFeb21', feb_maturity, 'DO', 1000.), Future('DOAbr21', abr_maturity, 'DO', 1000.)],
+            'YPFD': [Future('YPFDAbr21', abr_maturity, 'YPFD', 100.)]}
+        instrument_expert_mock.maturities_of_tradeable_tickers.return_value = {
+            'GGALFeb21': 'Feb21', 'DOFeb21': 'Feb21', 'GGALAbr21': 'Abr21', 'DOAbr21': 'Abr21', 'YPFDAbr21': 'Abr21'}
+        self._ir_expert = ire.IRExpert(
+            instrument_expert_mock, self._rofex_proxy_mock, self._yfinance_md_feed_mock)
+        self._vectorized_ir_expert = vire.VectorizedIRExpert(
+            instrument_expert_mock, self._rofex_proxy_mock, self._yfinance_md_feed_mock)
+
+    def _assert_same_rates(self):
+        self._ir_expert.update_rates()
+        self._vectorized_ir_expert.update_rates()
+        for maturity_tag in ['Feb21', 'Abr21']:
+            for expected, actual in [
+                    (self._ir_expert.max_taker_rate(maturity_tag),
+                     self._vectorized_ir_expert.max_taker_rate(maturity_tag)),
+                    (self._ir_expert.min_offered_rate(maturity_tag),
+                     self._vectorized_ir_expert.min_offered_rate(maturity_tag))]:
+                if expected is None:
+                    self.assertIsNone(actual)
+                    continue
+                self.assertEqual(expected[0], actual[0])
+                self.assertAlmostEqual(expected[1], actual[1], 12)
+            for count in [1, 3]:
+                for expected, actual in [
+                        (self._ir_expert.ranked_taker_rates(maturity_tag, count),
+                         self._vectorized_ir_expert.ranked_taker_rates(maturity_tag, count)),
+                        (self._ir_expert.ranked_offered_rates(maturity_tag, count),
+                         self._vectorized_ir_expert.ranked_offered_rates(maturity_tag, count))]:
+                    self.assertEqual([ticker for ticker, _ in expected], [ticker for ticker, _ in actual])
+        self.assertEqual(self._ir_expert.taker_rates().keys(), self._vectorized_ir_expert.taker_rates().keys())
+        self.assertEqual(self._ir_expert.offered_rates()['Abr21'].keys(),
+                         self._vectorized_ir_expert.offered_rates()['Abr21'].keys())
+
+    @freeze_time(TODAY)
+    def test_rates_match_ir_expert(self):
+        self._assert_same_rates()
+        self.assertTrue(self._vectorized_ir_expert.ready())
+        self.assertTrue(self._vectorized_ir_expert.maturiry_ready_to_trade('Abr21'))
+
+    @freeze_time(TODAY)
+    def test_rates_match_ir_expert_after_updates(self):
+        self._assert_same_rates()
+        self._yfinance_md_feed_mock.last_prices.return_value = {'GGAL': 110., 'DO': 90., 'YPFD': 500.}
+        self._yfinance_md_feed_mock.pop_updated_tickers.return_value = {'GGAL'}
+        self._rofex_proxy_mock.book_snapshot.return_value = mdf.BookSnapshot(
+            2,
+            {'GGALFeb21': mdf.OrderbookLevel(115, 10), 'DOFeb21': mdf.OrderbookLevel(104, 10)},
+            {'GGALFeb21': mdf.OrderbookLevel(120, 10), 'DOFeb21': mdf.OrderbookLevel(95, 10),
+             'GGALAbr21': mdf.OrderbookLevel(130, 10), 'YPFDAbr21': mdf.OrderbookLevel(600, 10)})
+        self._rofex_proxy_mock.pop_updated_tickers.return_value = {'DOFeb21', 'GGALAbr21', 'DOAbr21'}
+        self._assert_same_rates()
+        self.assertFalse(self._vectorized_ir_expert.maturiry_ready_to_trade('Abr21'))